@@ -10,3 +10,14 @@ class GraphExecutionError(Exception):
 
 class DbExecutionError(Exception):
     pass
+
+class UploadTooLargeError(Exception):
+    pass
+
+class JobQueueFullError(Exception):
+    pass
+
+class LLMRateLimitError(Exception):
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -6,21 +6,29 @@ this module defines routes to
 2. parse PDF using amazon textract or fetch a cached parse result basd on hash of file from dynamodb to
 prevent parsing same document multiple times
 4. run langchain graph on parsed text and return a structured resposne
+5. return the cached response straight away when the same document was already analysed,
+and let concurrent uploads of the same document share one analysis
 """
-from fastapi import FastAPI, UploadFile, File, APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List, Dict
-import boto3
-import time
-import re
-
-from exceptions import S3UploadError, TextractParseError, GraphExecutionError, DbExecutionError
-from src.dto.UploadPdfResponse import UploadPdfResponse
-from src.services.db import hash_text_sha256, get_parsed_text, item_exists, put_parsed_text
-from src.services.graph import create_graph
-from src.services.textract_client import parse_pdf_via_textract
-from src.utils.s3 import upload_pdf_to_s3
+from fastapi import UploadFile, File, Form, APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import List
+from botocore.exceptions import ClientError
+
+from exceptions import LLMRateLimitError
+import asyncio
+
+from src.core.config import settings
+from src.dto.JobResponse import JobResponse
+from src.dto.UploadPdfResponse import SectionRerunResponse
+from src.services.db import parsed_text_cache
+from src.services.graph import GRAPH_VARIANTS
+from src.services.batch import analyse_batch
+from src.services.ingest import stage_s3_object, stage_upload
+from src.services.jobs import job_store, job_workers
+from src.services.pipeline import analyse_document, rerun_section
+from src.services.result_cache import invalidate_cached_response
+from src.services.section_index import section_index_cache
+from src.utils.sse import SSE_HEADERS, format_event
 
 router = APIRouter()
 
@@ -31,21 +39,31 @@ async def ping():
     return {"message": "pong"}
 
 
+@router.get("/cache/stats")
+async def cache_stats():
+    """hit, miss and eviction counters of the in-process caches"""
+    return {"parsed_text": parsed_text_cache.stats(), "section_index": section_index_cache.stats()}
+
+
 @router.post("/upload-pdf")
-async def upload_pdf(file: UploadFile):
+async def upload_pdf(file: UploadFile, variant: str = "full"):
     """Endpoint to upload pdf file and return structured analysis using DTO
 
     **WorkFLow**
-    1. validate that the uploaded file is a pdf
-    2. upload file to s3
-    3. extract text using amazon textract or fetch the parsed text from db based on hash of content
+    1. validate that the uploaded file is a pdf and stream it to disk while hashing it,
+    rejecting uploads above MAX_UPLOAD_BYTES
+    2. return the cached analysis if this document was already processed
+    3. fetch the parsed text from db based on hash of content, or upload file to s3
+    (content addressed, skipped when already stored) and extract text using amazon textract
     4. run the langchain dag to analyse the pdf using langgraph
-    5. return a typed model to client
+    5. return a typed model to client and cache it
 
     Parameter
     ----
     file: uploadFile
         the pdf file send by put request
+    variant: str
+        name of the precompiled graph variant to run, see GRAPH_VARIANTS
 
     Returns
     ----
@@ -56,61 +74,178 @@ async def upload_pdf(file: UploadFile):
     # basic validation
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+    if variant not in GRAPH_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"Unknown graph variant: {variant}")
+
+    # stream the upload to disk while hashing it, never holding the whole pdf in memory
+    staged = await stage_upload(file)
 
     try:
-        # read entire file contnet
-        contents = await file.read()
+        # identical uploads in flight share one analysis
+        return await analyse_document(staged, variant)
 
-        # upload to s3 and return key and url necessary for textract
-        try:
-            s3_key, s3_url = upload_pdf_to_s3(contents, file.filename)
-        except Exception as e:
-            raise S3UploadError(f"Failed to upload to S3: {e}")
+    except LLMRateLimitError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/upload-pdf/stream")
+async def upload_pdf_stream(file: UploadFile, variant: str = "full"):
+    """Same analysis as /upload-pdf, streamed as server-sent events
+
+    **Events**
+    - stage: {"stage": ..., "status": ...} for the caches, s3 upload, textract and the
+    currency conversion
+    - section: {"node": ..., "section": "risk_percentage_s", "data": {...}} as soon as a
+    node completes, a section is sent once
+    - section_failed: {"node": ..., "sections": [...], "error": ...} when a node still
+    fails after its retries, the result then carries it in failed_sections
+    - result: the complete UploadPdfResponse, last event of a successful run
+    - error: {"detail": ...} when the analysis fails
+    """
+    if file.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+    if variant not in GRAPH_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"Unknown graph variant: {variant}")
 
+    staged = await stage_upload(file)
+    return StreamingResponse(
+        _analysis_events(staged, variant), media_type="text/event-stream", headers=SSE_HEADERS,
+    )
 
-        text = None
-        # get the hash of content for caching
-        digest = hash_text_sha256(contents)
 
-        if item_exists(digest):
-            # cache hit
-            text = get_parsed_text(digest)
-        else:
-            # cache miss and run textract
-            try:
-                text = parse_pdf_via_textract(s3_key)
-            except Exception as e:
-                raise TextractParseError(f"Textract failed on {s3_key}: {e}")
-            # persist parsed text into db for caching
-            try:
-                put_parsed_text(digest, text)
-            except  Exception as e:
-                raise DbExecutionError(f"Textract failed on {s3_key}: {e}")
-
-
-        # langchain graph for orchestrating the workflow
-        dag = await create_graph()
-
-        # initial state to feed into the graph
-        initial_state = {
-            "input_text": text,
-            "converted_text": "",
-            "property_valuations_s": {},
-            "risk_percentage_s": {},
-            "business_interruption_s": {},
-            "current_insurance_s": {},
-            "multi_currency_risk_s": {},
-            "insurance_recommendation_s": {},
-        }
-
-        # execute the DAG async and return final state
+async def _analysis_events(staged, variant: str):
+    """run the analysis in a task and relay its progress callbacks as sse frames"""
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def progress(event: str, data: dict) -> None:
+        await queue.put((event, data))
+
+    task = asyncio.create_task(analyse_document(staged, variant, progress))
+    # sentinel waking the relay loop once the analysis is over
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    sent = set()
+    try:
+        while (item := await queue.get()) is not None:
+            event, data = item
+            if event == "section":
+                sent.add(data["section"])
+            elif event == "section_failed":
+                sent.update(data["sections"])
+            yield format_event(event, data)
+
         try:
-            final_state = await dag.ainvoke(initial_state)
+            response = task.result()
         except Exception as e:
-            raise GraphExecutionError(f"Error while running graph: {e}")
+            yield format_event("error", {"detail": str(e)})
+            return
+        # cache hits and joined analyses produce no section events, send them now
+        for section, data in response.sections().items():
+            if section not in sent:
+                yield format_event("section", {"node": None, "section": section, "data": data})
+        yield format_event("result", response.model_dump())
+    finally:
+        # client went away, the shared analysis keeps running for the other callers
+        task.cancel()
+
+
+@router.post("/batch")
+async def upload_batch(
+    files: List[UploadFile] = File(default=[]),
+    s3_keys: List[str] = Form(default=[]),
+    variant: str = "full",
+):
+    """Analyse a portfolio of pdfs, uploaded and/or already stored in the bucket
+
+    documents are deduplicated by sha-256 and their results streamed as server-sent
+    events in completion order:
+    - batch: {"documents": n, "unique": m}
+    - document: {"digest": ..., "filenames": [...], "result": UploadPdfResponse}
+    - error: {"digest": ..., "filenames": [...], "detail": ...}
+    - done: counts and documents per minute of the batch
+
+    Parameter
+    ----
+    files: list of uploadFile
+        pdfs sent with the request
+    s3_keys: list of str
+        keys of pdfs already stored in the bucket
+    variant: str
+        name of the precompiled graph variant to run, see GRAPH_VARIANTS
+    """
+    if variant not in GRAPH_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"Unknown graph variant: {variant}")
+    if not files and not s3_keys:
+        raise HTTPException(status_code=400, detail="No documents given.")
+    if len(files) + len(s3_keys) > settings.BATCH_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.BATCH_MAX_DOCUMENTS} documents per batch."
+        )
+    if any(file.content_type != "application/pdf" for file in files):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
 
-        # enforce strict schema
-        return UploadPdfResponse(**final_state)
+    staged = []
+    try:
+        for file in files:
+            staged.append(await stage_upload(file))
+        for key in s3_keys:
+            try:
+                staged.append(await stage_s3_object(key))
+            except ClientError as e:
+                raise HTTPException(status_code=400, detail=f"Unable to read s3 object {key}: {e}")
+    except BaseException:
+        for document in staged:
+            document.cleanup()
+        raise
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    async def events():
+        async for event, data in analyse_batch(staged, variant):
+            yield format_event(event, data)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/jobs", status_code=202, response_model=JobResponse)
+async def create_job(file: UploadFile, variant: str = "full"):
+    """Queue a pdf for background analysis and return its job straight away
+
+    the client polls GET /jobs/{job_id} instead of holding the connection open through
+    s3, textract and the llm calls; 503 when the job queue is full
+    """
+    if file.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+    if variant not in GRAPH_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"Unknown graph variant: {variant}")
+
+    staged = await stage_upload(file)
+    job = await job_workers.submit(staged, variant)
+    return JobResponse.from_record(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_status(job_id: str):
+    """status, per stage progress and, once done, result or error of a job"""
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return JobResponse.from_record(job)
+
+
+@router.post("/results/{digest}/sections/{node}", response_model=SectionRerunResponse)
+async def rerun_failed_section(digest: str, node: str, variant: str = "full"):
+    """run one analysis node again for an already parsed document, typically a node
+    listed in the failed_sections of an upload response; the document is not re-read
+    and the other nodes are not called again. the degraded result of `variant` is
+    patched and cached once none of its nodes failed anymore"""
+    try:
+        return await rerun_section(digest, node, variant)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+
+@router.delete("/results/{digest}")
+async def invalidate_result(digest: str, variant: str = "full"):
+    """drop the cached analysis of a document so the next upload runs the dag again"""
+    await invalidate_cached_response(digest, variant)
+    return {"message": "invalidated", "digest": digest, "variant": variant}
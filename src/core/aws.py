@@ -0,0 +1,94 @@
+"""
+Shared async aws clients
+----
+holds one long lived aioboto3 client per service (s3, dynamodb, textract, sqs) for the
+whole worker process, so every request reuses the same connection pool instead of
+blocking the event loop on synchronous boto3 calls
+
+the clients are opened in the fastapi lifespan hook (see src/main.py) and closed
+on shutdown
+"""
+from contextlib import AsyncExitStack
+from typing import Any, Optional
+
+import aioboto3
+from botocore.config import Config
+
+from src.core.config import settings
+
+# dynamodb table holding the cached textract output
+PARSE_TEXT_TABLE = "parseText"
+# dynamodb table holding the cached analysis results, partition key resultID and
+# ttl attribute expires_at
+ANALYSIS_RESULT_TABLE = "analysisResult"
+# dynamodb table holding the single-flight leases, partition key leaseID and ttl
+# attribute expires_at
+PROCESSING_LEASE_TABLE = "processingLease"
+# dynamodb table holding the asynchronous analysis jobs, partition key jobID and ttl
+# attribute expires_at
+ANALYSIS_JOB_TABLE = "analysisJob"
+# dynamodb table holding the latest graph checkpoint of every in flight analysis and
+# its pending writes, partition key threadID, sort key entry and ttl attribute expires_at
+ANALYSIS_CHECKPOINT_TABLE = "analysisCheckpoint"
+
+# size of the http connection pool of every client, bounds the number of
+# concurrent aws calls a single worker can have in flight
+MAX_POOL_CONNECTIONS = 50
+
+
+class AWSClients:
+    """process wide container for the async aws clients"""
+
+    def __init__(self):
+        self._session = aioboto3.Session()
+        self._stack: Optional[AsyncExitStack] = None
+        self.s3: Any = None
+        self.textract: Any = None
+        self.sqs: Any = None
+        self.dynamodb: Any = None
+        self.parse_text_table: Any = None
+        self.analysis_result_table: Any = None
+        self.processing_lease_table: Any = None
+        self.analysis_job_table: Any = None
+        self.analysis_checkpoint_table: Any = None
+
+    async def start(self) -> None:
+        """open all clients, safe to call more than once"""
+        if self._stack is not None:
+            return
+
+        config = Config(max_pool_connections=MAX_POOL_CONNECTIONS)
+        stack = AsyncExitStack()
+        self.s3 = await stack.enter_async_context(
+            self._session.client("s3", region_name=settings.AWS_REGION, config=config)
+        )
+        self.textract = await stack.enter_async_context(
+            self._session.client("textract", region_name=settings.AWS_REGION, config=config)
+        )
+        self.sqs = await stack.enter_async_context(
+            self._session.client("sqs", region_name=settings.AWS_REGION, config=config)
+        )
+        # the parseText table lives in us-east-1 regardless of the bucket region
+        self.dynamodb = await stack.enter_async_context(
+            self._session.resource("dynamodb", region_name="us-east-1", config=config)
+        )
+        self.parse_text_table = await self.dynamodb.Table(PARSE_TEXT_TABLE)
+        self.analysis_result_table = await self.dynamodb.Table(ANALYSIS_RESULT_TABLE)
+        self.processing_lease_table = await self.dynamodb.Table(PROCESSING_LEASE_TABLE)
+        self.analysis_job_table = await self.dynamodb.Table(ANALYSIS_JOB_TABLE)
+        self.analysis_checkpoint_table = await self.dynamodb.Table(ANALYSIS_CHECKPOINT_TABLE)
+        self._stack = stack
+
+    async def close(self) -> None:
+        """close all clients and release their connection pools"""
+        if self._stack is None:
+            return
+        await self._stack.aclose()
+        self._stack = None
+        self.s3 = self.textract = self.sqs = self.dynamodb = None
+        self.parse_text_table = self.analysis_result_table = self.processing_lease_table = None
+        self.analysis_job_table = self.analysis_checkpoint_table = None
+
+
+# module level singleton like settings
+aws = AWSClients()
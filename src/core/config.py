@@ -3,13 +3,41 @@ Runtime config module
 ----
 centralises the retrieval of runtime configuration parameters from aws parameter store,
 ***explain in report pdf about infra
+
+nothing is fetched at import: the ssm backed settings are loaded on first access, all
+parameters under SSM_PARAMETER_PATH at once with a batched get_parameters_by_path, and
+kept in a local owner-only cache file for SSM_CACHE_TTL_SECONDS so worker boots and
+restarts skip ssm altogether. the exchange rates can be refreshed at runtime, see
+refresh_exchange_rates and the background exchange_rate_refresher
 """
+import json
+import logging
+import os
+import tempfile
+import time
+from functools import cached_property
+from typing import Dict, Optional
+
 import boto3
 
-ssm = boto3.client("ssm", region_name="us-east-1")  # static or dynamic region
+logger = logging.getLogger(__name__)
+
+# every parameter of the service lives directly under this path
+SSM_PARAMETER_PATH = os.getenv("SSM_PARAMETER_PATH", "/ai-reporter/prod/")
+
+_ssm = None
+
+
+def ssm_client():
+    """ssm client created on first use, so importing the config needs no network"""
+    global _ssm
+    if _ssm is None:
+        _ssm = boto3.client("ssm", region_name="us-east-1")  # static or dynamic region
+    return _ssm
+
 
 def get_parameter(name: str, with_decryption: bool = True) -> str:
-    """retrieve a parameter from ssm
+    """retrieve a single parameter from ssm
     Parameter
     ---
     name: str
@@ -17,23 +45,248 @@ def get_parameter(name: str, with_decryption: bool = True) -> str:
     with_decryption:
         if true, kms encrypted secure string params
     """
-    return ssm.get_parameter(Name=name, WithDecryption=with_decryption)["Parameter"]["Value"]
+    return ssm_client().get_parameter(Name=name, WithDecryption=with_decryption)["Parameter"]["Value"]
+
+
+def get_parameters_by_path(path: str, with_decryption: bool = True) -> Dict[str, str]:
+    """retrieve every parameter directly under `path` in as few calls as ssm allows,
+    keyed by the last segment of their name"""
+    parameters = {}
+    pages = ssm_client().get_paginator("get_parameters_by_path").paginate(
+        Path=path, Recursive=False, WithDecryption=with_decryption
+    )
+    for page in pages:
+        for parameter in page["Parameters"]:
+            parameters[parameter["Name"].rsplit("/", 1)[-1]] = parameter["Value"]
+    return parameters
+
+
+class ParameterStore:
+    """parameters of one ssm path, fetched in a single batch and cached in a local file
+
+    the cache file holds secrets, it is written owner read/write only (0600) and
+    replaced atomically; a ttl of 0 disables it
+    """
+
+    def __init__(self, path: str, cache_path: str, ttl_seconds: int):
+        self.path = path
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self._values: Optional[Dict[str, str]] = None
+
+    def get(self, name: str) -> str:
+        """value of the parameter `name`, loading the store on first use"""
+        if self._values is None:
+            self._values = self._read_cache()
+            if self._values is None:
+                self.refresh()
+        if name not in self._values:
+            raise KeyError(f"Missing ssm parameter {self.path}{name}")
+        return self._values[name]
+
+    def refresh(self) -> Dict[str, str]:
+        """fetch every parameter from ssm again and rewrite the cache file"""
+        values = get_parameters_by_path(self.path)
+        self._values = values
+        self._write_cache(values)
+        return values
+
+    def _read_cache(self) -> Optional[Dict[str, str]]:
+        if self.ttl_seconds <= 0:
+            return None
+        try:
+            if time.time() - os.stat(self.cache_path).st_mtime > self.ttl_seconds:
+                return None
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached.get("parameters") if cached.get("path") == self.path else None
+
+    def _write_cache(self, values: Dict[str, str]) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.cache_path) or ".")
+            with os.fdopen(fd, "w") as f:
+                os.chmod(tmp, 0o600)
+                json.dump({"path": self.path, "parameters": values}, f)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            # the cache only saves boot time, the values are in memory either way
+            logger.warning("Unable to write the parameter cache %s: %s", self.cache_path, e)
+
+
+def parse_limits(raw: str) -> dict[str, int]:
+    """parse a `name=limit,name=limit` string into a dict"""
+    limits = {}
+    for pair in filter(None, (p.strip() for p in raw.split(","))):
+        name, _, value = pair.rpartition("=")
+        limits[name.strip()] = int(value)
+    return limits
 
 class Settings:
-    """load critical run-time settings from ssm on instantiation"""
+    """run-time settings: environment values on instantiation, ssm values lazily on
+    first access"""
     def __init__(self):
-        # api key for groq
-        self.GROQ_API_KEY = get_parameter("/ai-reporter/prod/groq_api_key")
-        # s3 config
-        self.S3_BUCKET = get_parameter("/ai-reporter/prod/s3_bucket")
-        # aws region
-        self.AWS_REGION = get_parameter("/ai-reporter/prod/aws_region")
-        # pre fetch the rate
-        self.EXCHANGE_RATES = {
-            "EUR": float(get_parameter("/ai-reporter/prod/exchange_rate_eur")),
-            "USD": float(get_parameter("/ai-reporter/prod/exchange_rate_usd")),
-            "GBP": float(get_parameter("/ai-reporter/prod/exchange_rate_gbp")),
+        self.parameters = ParameterStore(
+            SSM_PARAMETER_PATH,
+            os.getenv("SSM_CACHE_PATH") or os.path.join(tempfile.gettempdir(), "risk-mgmt-ssm-cache.json"),
+            int(os.getenv("SSM_CACHE_TTL_SECONDS", "900")),
+        )
+        # seconds between two background refreshes of the exchange rates, 0 disables
+        self.EXCHANGE_RATE_REFRESH_SECONDS = float(os.getenv("EXCHANGE_RATE_REFRESH_SECONDS", "3600"))
+        # llm tuning, not secret so it comes from the environment with sane defaults
+        self.LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+        # "groq" or "openai" for any openai compatible backend, the latter is sent a
+        # per document prompt_cache_key so the six node calls hit the same prompt cache
+        self.LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")
+        self.OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+        self.LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+        # size of the shared keep-alive http pool used by every llm client
+        self.LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+        # default number of in flight calls per model, override per model with
+        # LLM_MODEL_CONCURRENCY="llama-3.3-70b-versatile=4,other-model=2"
+        self.LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self.LLM_MODEL_CONCURRENCY = parse_limits(os.getenv("LLM_MODEL_CONCURRENCY", ""))
+        # provider rate limits per model shared by every worker of the host, 0 disables
+        self.LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+        self.LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+        # completion tokens budgeted per call before it is sent
+        self.LLM_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKENS_ESTIMATE", "1024"))
+        # retries of a call answered with 429, and the back off when no header says how long
+        self.LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+        self.LLM_RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("LLM_RATE_LIMIT_BACKOFF_SECONDS", "10"))
+        # file holding the shared bucket state, defaults to one in the system temp dir
+        self.LLM_RATE_LIMIT_STATE_PATH = os.getenv("LLM_RATE_LIMIT_STATE_PATH") or None
+        # per analysis node: timeout of one provider call (time queued for the rate limits
+        # and call slots is not counted), retries and the first retry's backoff (doubled
+        # on every retry) before the node's sections are returned as failed
+        self.NODE_TIMEOUT_SECONDS = float(os.getenv("NODE_TIMEOUT_SECONDS", "180"))
+        self.NODE_RETRIES = int(os.getenv("NODE_RETRIES", "2"))
+        self.NODE_RETRY_BACKOFF_SECONDS = float(os.getenv("NODE_RETRY_BACKOFF_SECONDS", "2"))
+        # "local" converts amounts with the regex engine, "llm" sends the whole text to the model
+        self.CURRENCY_CONVERSION_MODE = os.getenv("CURRENCY_CONVERSION_MODE", "local")
+        # in local mode, let the llm rewrite the lines the regex engine could not convert
+        self.CURRENCY_LLM_FALLBACK = os.getenv("CURRENCY_LLM_FALLBACK", "true").lower() == "true"
+        # cache of the converted text per parsed text, rates and conversion settings
+        self.CONVERTED_TEXT_CACHE_ENABLED = os.getenv("CONVERTED_TEXT_CACHE_ENABLED", "true").lower() == "true"
+        # cache of the complete analysis output, keyed by document + prompt/model version
+        self.RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+        self.RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+        # bump to drop every cached result without touching the prompts
+        self.RESULT_CACHE_VERSION = os.getenv("RESULT_CACHE_VERSION", "1")
+        # in-process front cache of parsed texts, bounded by bytes
+        self.PARSED_TEXT_CACHE_MAX_BYTES = int(os.getenv("PARSED_TEXT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.PARSED_TEXT_CACHE_TTL_SECONDS = int(os.getenv("PARSED_TEXT_CACHE_TTL_SECONDS", "3600"))
+        # parsed texts above this size are stored compressed, or in s3 if still too large
+        self.PARSED_TEXT_INLINE_MAX_BYTES = int(os.getenv("PARSED_TEXT_INLINE_MAX_BYTES", str(300 * 1024)))
+        # cross-worker single-flight through a dynamodb lease, off by default
+        self.SINGLE_FLIGHT_LEASE_ENABLED = os.getenv("SINGLE_FLIGHT_LEASE_ENABLED", "false").lower() == "true"
+        # lease lifetime, renewed every third of it while the holder analyses the document
+        self.SINGLE_FLIGHT_LEASE_SECONDS = int(os.getenv("SINGLE_FLIGHT_LEASE_SECONDS", "900"))
+        self.SINGLE_FLIGHT_POLL_SECONDS = float(os.getenv("SINGLE_FLIGHT_POLL_SECONDS", "2"))
+        # streaming ingest: uploads larger than this are rejected with 413
+        self.MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+        # bytes read from the client per chunk while hashing and staging to disk
+        self.UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+        # size of one s3 multipart part (s3 minimum is 5 MiB), only one part is held in memory
+        self.S3_MULTIPART_PART_BYTES = max(
+            5 * 1024 * 1024, int(os.getenv("S3_MULTIPART_PART_BYTES", str(8 * 1024 * 1024)))
+        )
+        # directory holding the staged uploads, defaults to the system temp dir
+        self.UPLOAD_STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR") or None
+        # textract job polling: exponential backoff with jitter up to a deadline
+        self.TEXTRACT_TIMEOUT_SECONDS = float(os.getenv("TEXTRACT_TIMEOUT_SECONDS", "600"))
+        self.TEXTRACT_POLL_INITIAL_SECONDS = float(os.getenv("TEXTRACT_POLL_INITIAL_SECONDS", "1"))
+        self.TEXTRACT_POLL_MAX_SECONDS = float(os.getenv("TEXTRACT_POLL_MAX_SECONDS", "15"))
+        # textract completion notifications through sns -> sqs, polling is used when unset
+        self.TEXTRACT_SNS_TOPIC_ARN = os.getenv("TEXTRACT_SNS_TOPIC_ARN", "")
+        self.TEXTRACT_SNS_ROLE_ARN = os.getenv("TEXTRACT_SNS_ROLE_ARN", "")
+        self.TEXTRACT_SQS_QUEUE_URL = os.getenv("TEXTRACT_SQS_QUEUE_URL", "")
+        # local pdf text layer extraction in front of textract
+        self.LOCAL_PDF_EXTRACTION_ENABLED = os.getenv("LOCAL_PDF_EXTRACTION_ENABLED", "true").lower() == "true"
+        self.PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+        self.PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "20"))
+        # pages scoring below this are sent to textract
+        self.PDF_TEXT_MIN_QUALITY = float(os.getenv("PDF_TEXT_MIN_QUALITY", "0.6"))
+        # split pdfs with at least this many pages into concurrent per page-range textract jobs
+        self.TEXTRACT_FANOUT_ENABLED = os.getenv("TEXTRACT_FANOUT_ENABLED", "true").lower() == "true"
+        self.TEXTRACT_FANOUT_MIN_PAGES = int(os.getenv("TEXTRACT_FANOUT_MIN_PAGES", "50"))
+        self.TEXTRACT_PAGES_PER_JOB = int(os.getenv("TEXTRACT_PAGES_PER_JOB", "25"))
+        # textract jobs in flight per worker, shared by every document
+        self.TEXTRACT_MAX_CONCURRENT_JOBS = int(os.getenv("TEXTRACT_MAX_CONCURRENT_JOBS", "10"))
+        # texts above this many (estimated) tokens are split into overlapping sections
+        # that every analysis node maps over concurrently before reducing the results
+        self.CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "24000"))
+        self.CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "400"))
+        # send every node only the bm25 top passages for its marker phrases, off by default;
+        # filtered texts differ per node, so they give up the shared prompt cache prefix
+        self.RELEVANCE_FILTER_ENABLED = os.getenv("RELEVANCE_FILTER_ENABLED", "false").lower() == "true"
+        # (estimated) tokens of passages routed to one node, shorter texts are sent whole
+        self.RELEVANCE_TOKEN_BUDGET = int(os.getenv("RELEVANCE_TOKEN_BUDGET", "4000"))
+        self.RELEVANCE_PASSAGE_TOKENS = int(os.getenv("RELEVANCE_PASSAGE_TOKENS", "150"))
+        # asynchronous job api: "dynamodb" (analysisJob table) or "sqlite" for local runs
+        self.JOB_STORE = os.getenv("JOB_STORE", "dynamodb")
+        self.JOB_SQLITE_PATH = os.getenv("JOB_SQLITE_PATH", "jobs.sqlite3")
+        self.JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+        # documents analysed concurrently by the job workers and jobs waiting for one
+        self.JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+        self.JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+        # queued or running jobs not updated for this long are failed on startup, the
+        # worker that held them is gone
+        self.JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "3600"))
+        # graph checkpoints so a failed run resumes after its last completed node:
+        # "dynamodb" (analysisCheckpoint table, large states offloaded to s3), "sqlite"
+        # for local runs or "off"; needs SINGLE_FLIGHT_LEASE_ENABLED so a single worker
+        # at a time runs (and resumes) the thread of a document
+        self.CHECKPOINT_STORE = os.getenv("CHECKPOINT_STORE", "off")
+        self.CHECKPOINT_SQLITE_PATH = os.getenv("CHECKPOINT_SQLITE_PATH", "checkpoints.sqlite3")
+        self.CHECKPOINT_TTL_SECONDS = int(os.getenv("CHECKPOINT_TTL_SECONDS", str(24 * 3600)))
+        # compressed checkpoints above this size go to s3 instead of the 400 KB dynamodb item
+        self.CHECKPOINT_INLINE_MAX_BYTES = int(os.getenv("CHECKPOINT_INLINE_MAX_BYTES", str(300 * 1024)))
+        # batch endpoint: documents accepted per request and analysed at once per worker
+        self.BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "200"))
+        self.BATCH_MAX_CONCURRENT_DOCUMENTS = int(os.getenv("BATCH_MAX_CONCURRENT_DOCUMENTS", "8"))
+
+    # api key for groq
+    @cached_property
+    def GROQ_API_KEY(self) -> str:
+        return self.parameters.get("groq_api_key")
+
+    # s3 config
+    @cached_property
+    def S3_BUCKET(self) -> str:
+        return self.parameters.get("s3_bucket")
+
+    # aws region
+    @cached_property
+    def AWS_REGION(self) -> str:
+        return self.parameters.get("aws_region")
+
+    # only read when the openai compatible provider is selected
+    @cached_property
+    def OPENAI_API_KEY(self) -> str:
+        return self.parameters.get("openai_api_key") if self.LLM_PROVIDER == "openai" else ""
+
+    # EUR value of one unit per currency
+    @cached_property
+    def EXCHANGE_RATES(self) -> Dict[str, float]:
+        return self._exchange_rates()
+
+    def _exchange_rates(self) -> Dict[str, float]:
+        return {
+            "EUR": float(self.parameters.get("exchange_rate_eur")),
+            "USD": float(self.parameters.get("exchange_rate_usd")),
+            "GBP": float(self.parameters.get("exchange_rate_gbp")),
         }
 
+    def refresh_exchange_rates(self) -> Dict[str, float]:
+        """fetch the parameters from ssm again and swap in the new rates, the result
+        and converted text caches are keyed by the rates so they follow on their own"""
+        self.parameters.refresh()
+        self.EXCHANGE_RATES = self._exchange_rates()
+        return self.EXCHANGE_RATES
+
 # module level singleton like singleton pattern
 settings = Settings()
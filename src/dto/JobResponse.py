@@ -0,0 +1,41 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+from src.dto.UploadPdfResponse import FailedSection, UploadPdfResponse
+
+class JobResponse(BaseModel):
+    job_id: str
+    # queued, running, succeeded or failed
+    status: str
+    variant: str
+    digest: str
+    filename: Optional[str] = None
+    # pipeline stage -> last reported status, e.g. {"textract": "started"}
+    stages: Dict[str, str] = {}
+    # analysis sections produced so far
+    sections: List[str] = []
+    # nodes degraded after their retries
+    failed_sections: List[FailedSection] = []
+    error: Optional[str] = None
+    # set once the job succeeded
+    result: Optional[UploadPdfResponse] = None
+    created_at: int
+    updated_at: int
+
+    @classmethod
+    def from_record(cls, job: dict) -> "JobResponse":
+        """build the response from a stored job record"""
+        return cls(
+            job_id=job["jobID"],
+            status=job["status"],
+            variant=job["variant"],
+            digest=job["digest"],
+            filename=job.get("filename"),
+            stages=job.get("stages") or {},
+            sections=job.get("sections") or [],
+            failed_sections=job.get("failed_sections") or [],
+            error=job.get("error"),
+            result=UploadPdfResponse.model_validate_json(job["result"]) if job.get("result") else None,
+            created_at=int(job["created_at"]),
+            updated_at=int(job["updated_at"]),
+        )
@@ -1,5 +1,13 @@
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+
+class FailedSection(BaseModel):
+    """an analysis node that still failed after its retries, its sections are empty"""
+    node: str
+    sections: List[str]
+    error: str
+
 
 class UploadPdfResponse(BaseModel):
     # input_text: str
@@ -10,3 +18,21 @@ class UploadPdfResponse(BaseModel):
     current_insurance_s: Dict[str, Any]
     multi_currency_risk_s: Dict[str, Any]
     insurance_recommendation_s: Dict[str, Any]
+    # degraded nodes, re-run them with POST /results/{digest}/sections/{node}
+    failed_sections: List[FailedSection] = []
+
+    def sections(self) -> Dict[str, Any]:
+        """the analysis sections without the failure report"""
+        return self.model_dump(exclude={"failed_sections"})
+
+
+class SectionRerunResponse(BaseModel):
+    """sections produced by re-running a single analysis node"""
+    digest: str
+    node: str
+    sections: Dict[str, Dict[str, Any]]
+    failed_sections: List[FailedSection] = []
+    variant: str = "full"
+    # the stored degraded result patched with these sections, none if there was none;
+    # cached once it has no failed sections left
+    result: Optional[UploadPdfResponse] = None
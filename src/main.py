@@ -1,21 +1,45 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from langchain_core.runnables import Runnable
-from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-import re
-import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import HTTPException as StarletteHTTPException
 
-from exceptions import TextractParseError, S3UploadError, GraphExecutionError
+from exceptions import (
+    TextractParseError, S3UploadError, GraphExecutionError, UploadTooLargeError, JobQueueFullError, LLMRateLimitError,
+)
 from src.api.endpoint import router
-from src.core.config import settings
-from src.services.textract_client import parse_pdf_via_textract
-from src.utils.s3 import upload_pdf_to_s3
-from fastapi import FastAPI, Request
+from src.services.textract_client import textract_notifications
+from src.core.aws import aws
+from src.services.graph import compile_graphs
+from src.services.llm import llm_registry
+from src.services.pdf_text import shutdown_pool
+from src.services.jobs import job_workers
+from src.services.exchange_rates import exchange_rate_refresher
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """open the shared async aws clients and compile the graphs once per worker"""
+    await aws.start()
+    compile_graphs()
+    # consume textract completion notifications when a queue is configured
+    textract_notifications.start()
+    # background workers of the job api
+    job_workers.start()
+    # pick up new exchange rates from ssm without a restart
+    exchange_rate_refresher.start()
+    try:
+        yield
+    finally:
+        await exchange_rate_refresher.stop()
+        await job_workers.stop()
+        await textract_notifications.stop()
+        shutdown_pool()
+        await llm_registry.aclose()
+        await aws.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
@@ -47,6 +71,41 @@ async def s3_exception_handler(request: Request, exc: S3UploadError):
     )
 
 
+@app.exception_handler(UploadTooLargeError)
+async def upload_too_large_handler(request: Request, exc: UploadTooLargeError):
+    return JSONResponse(
+        status_code=413,
+        content={
+            "error": "Upload too large",
+            "detail": str(exc),
+        },
+    )
+
+
+@app.exception_handler(JobQueueFullError)
+async def job_queue_full_handler(request: Request, exc: JobQueueFullError):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "30"},
+        content={
+            "error": "Job queue full",
+            "detail": str(exc),
+        },
+    )
+
+
+@app.exception_handler(LLMRateLimitError)
+async def llm_rate_limit_handler(request: Request, exc: LLMRateLimitError):
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+        content={
+            "error": "LLM provider rate limit",
+            "detail": str(exc),
+        },
+    )
+
+
 @app.exception_handler(GraphExecutionError)
 async def graph_exception_handler(request: Request, exc: GraphExecutionError):
     return JSONResponse(
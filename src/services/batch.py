@@ -0,0 +1,107 @@
+"""
+Batch Analysis
+----
+analyses a portfolio of staged pdfs in one request: documents are deduplicated by
+sha-256, run through the regular pipeline with a worker wide bound on the documents in
+flight, and every result is handed back as soon as its document finishes
+
+textract jobs and llm calls of all documents (and of every other request) already go
+through the shared textract_job_slots and llm_registry slots, the document bound keeps
+a large batch from staging every document's local extraction and conversion at once
+
+Key Responsibility
+---
+batch_document_slots: worker wide semaphore bounding the batch documents in flight
+analyse_batch: async iterator of (event, data) tuples for a list of staged pdfs
+"""
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from src.core.config import settings
+from src.services.ingest import StagedUpload
+from src.services.pipeline import analyse_document
+from src.services.rate_limit import BATCH, llm_priority
+
+logger = logging.getLogger(__name__)
+
+_document_slots: Optional[asyncio.Semaphore] = None
+
+
+def batch_document_slots() -> asyncio.Semaphore:
+    """semaphore of BATCH_MAX_CONCURRENT_DOCUMENTS slots shared by every batch"""
+    global _document_slots
+    if _document_slots is None:
+        _document_slots = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENT_DOCUMENTS)
+    return _document_slots
+
+
+async def _run(staged: StagedUpload, variant: str) -> Tuple[str, Optional[dict], Optional[str]]:
+    """analyse one document inside a batch slot, returning (digest, result, error)"""
+    # interactive uploads get their llm calls admitted first
+    llm_priority.set(BATCH)
+    try:
+        async with batch_document_slots():
+            response = await analyse_document(staged, variant)
+        return staged.digest, response.model_dump(), None
+    except Exception as e:
+        logger.error("Batch document %s failed: %s", staged.digest, e)
+        return staged.digest, None, str(e)
+    finally:
+        # cancelled while waiting for a slot, the pipeline never took the file over
+        if not staged.claimed:
+            staged.cleanup()
+
+
+async def analyse_batch(documents: List[StagedUpload], variant: str = "full") -> AsyncIterator[Tuple[str, dict]]:
+    """analyse `documents` concurrently and yield their results in completion order
+
+    Parameter
+    ---
+    documents: list of StagedUpload
+        staged pdfs, owned by the batch from now on
+    variant: str
+        graph variant to run, see GRAPH_VARIANTS
+
+    Yields
+    ---
+    (event, data)
+        "batch" once with the counts, "document" or "error" per unique document and
+        "done" with the throughput of the batch
+    """
+    started = time.monotonic()
+    unique: Dict[str, StagedUpload] = {}
+    filenames: Dict[str, List[str]] = {}
+    for staged in documents:
+        filenames.setdefault(staged.digest, []).append(staged.filename)
+        if staged.digest in unique:
+            # same content uploaded twice, analysed once
+            staged.cleanup()
+        else:
+            unique[staged.digest] = staged
+    yield "batch", {"documents": len(documents), "unique": len(unique)}
+
+    tasks = [asyncio.create_task(_run(staged, variant)) for staged in unique.values()]
+    succeeded = failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            digest, result, error = await next_done
+            if error is None:
+                succeeded += 1
+                yield "document", {"digest": digest, "filenames": filenames[digest], "result": result}
+            else:
+                failed += 1
+                yield "error", {"digest": digest, "filenames": filenames[digest], "detail": error}
+    finally:
+        # client went away, drop the documents that did not finish yet
+        for task in tasks:
+            task.cancel()
+
+    seconds = time.monotonic() - started
+    per_minute = round(60 * len(unique) / seconds, 2) if seconds else None
+    logger.info("Batch of %d documents (%d unique) done in %.1fs, %s documents/minute",
+                len(documents), len(unique), seconds, per_minute)
+    yield "done", {
+        "succeeded": succeeded, "failed": failed, "seconds": round(seconds, 2), "documents_per_minute": per_minute,
+    }
@@ -10,40 +10,35 @@ This module defines two public callables:
 import logging
 
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import JsonOutputParser
-from src.core.config import settings
+from src.services.chunking import map_reduce, merge_keyed
+from src.services.llm import llm_registry
+from src.services.prompts import build_node_prompt
+from src.services.section_index import relevant_text
 
 logger = logging.getLogger(__name__)
 
-def build_business_interruption_prompt() -> PromptTemplate:
-    """Construct the BI‑extraction prompt
+# marker phrases of the prompt, used to route only the matching passages to this node
+RELEVANCE_MARKERS = (
+    "lost revenue", "revenue impact", "business interruption", "closure", "postponement",
+    "disruption", "alternate venue costs", "training facility costs", "per match", "per week",
+    "per season", "EUR",
+)
 
-       The prompt:
-        Explains the analyst's goal
-        Provides marker phrases to look for
-        Embeds the report text via cleaned_text
-        Specifies a JSON schema for the output
-       """
-    prompt_str = r"""
+# node instructions, placed after the shared document prefix so the report
+# tokens form a prompt prefix common to every node
+BUSINESS_INTERRUPTION_INSTRUCTIONS = r"""
 You are a professional insurance BI analyst.
 
 GOAL  
-Scan the plain-English risk-assessment report below and extract **every statement that quantifies a Business Interruption (BI) exposure**—i.e., any figure representing lost revenue, extra expense, or cost impact arising from disrupted football operations (matches, training, maintenance overruns, alternate venues, etc.).
+Scan the plain-English risk-assessment report above and extract **every statement that quantifies a Business Interruption (BI) exposure**—i.e., any figure representing lost revenue, extra expense, or cost impact arising from disrupted football operations (matches, training, maintenance overruns, alternate venues, etc.).
 
 MARKERS to watch for  
 - Phrases containing **“lost revenue,” “revenue impact,” “business interruption,” “closure,” “postponement,” “disruption,” “alternate-venue costs,” “training facility costs,”** etc.  
 - Any money amount linked to a timeframe (per match, per week, per season, total during closure, etc.).  
 - Words indicating BI magnitude even if the term “business interruption” isn’t used explicitly.
 
----
-
-Here is the extracted report text:
-
-{cleaned_text}
-----------------
-
 OUTPUT  
 For each BI figure you find, create **one entry** in a JSON object whose keys are the *BI labels* and whose values are dictionaries with exactly these fields:
 
@@ -72,7 +67,26 @@ _Excerpt (illustration only)_
   }}
 }}
 """
-    return PromptTemplate(input_variables=["cleaned_text"], template=prompt_str)
+
+BUSINESS_INTERRUPTION_PROMPT = build_node_prompt(BUSINESS_INTERRUPTION_INSTRUCTIONS)
+
+
+def build_business_interruption_prompt() -> PromptTemplate:
+    """Construct the BI‑extraction prompt
+
+       The prompt:
+        Explains the analyst's goal
+        Provides marker phrases to look for
+        Follows the shared document prefix holding cleaned_text
+        Specifies a JSON schema for the output
+
+       compiled once at import, every call returns the same template
+       """
+    return BUSINESS_INTERRUPTION_PROMPT
+
+def build_business_interruption_chain() -> Runnable:
+    """compose prompt | shared llm | json parser, built once per process"""
+    return build_business_interruption_prompt() | llm_registry.llm() | JsonOutputParser()
 
 async def run_business_interruption(state: dict) -> dict:
     """LangGraph node to extract BI exposures.
@@ -94,22 +108,14 @@ async def run_business_interruption(state: dict) -> dict:
         logger.error("Missing 'converted_text' in state")
         raise ValueError("Missing 'converted_text' key in state dict")
 
-    prompt = build_business_interruption_prompt()
-    parser = JsonOutputParser()
-
-    # LLM configuration
-    llm = ChatGroq(
-        model="llama-3.3-70b-versatile",
-        temperature=0.2,
-        groq_api_key=settings.GROQ_API_KEY
-    )
-
-    # Compose LangChain Runnable
-    chain: Runnable = prompt | llm | parser
+    # reuse the pre-built chain and its pooled llm client
+    chain: Runnable = llm_registry.chain("business_interruption", build_business_interruption_chain)
 
     try:
         # Asynchronously invoke the node execution
-        result = await chain.ainvoke({"cleaned_text": cleaned_text})
+        # only the passages matching the markers when the relevance filter is on
+        cleaned_text = relevant_text(cleaned_text, RELEVANCE_MARKERS, "business_interruption")
+        result = await map_reduce(chain, cleaned_text, merge_keyed)
         return {"business_interruption_s": result}
     except Exception as e:
         logger.error("Chain invocation failed: %s", e)
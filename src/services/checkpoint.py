@@ -0,0 +1,401 @@
+"""
+Graph Checkpoints
+----
+langgraph checkpoint savers letting a failed analysis resume after its last completed
+node: the currency conversion and every analysis node that finished are not paid for
+again when the same document (and variant) is retried
+
+a thread is one analysis, keyed by its result cache key (document digest, variant,
+prompt and model version), and only its latest checkpoint is read back together with
+the pending writes of the nodes that completed within the failed step, which is all
+langgraph needs to resume. the thread is dropped once the analysis completed
+
+checkpoints live in the dynamodb `analysisCheckpoint` table, compressed and offloaded
+to s3 when too large for an item since they hold the document text, or in a local
+sqlite file with CHECKPOINT_STORE=sqlite. they are off by default and need the
+single-flight lease, the thread id is shared by every worker analysing the document
+
+checkpoints are best effort: a failing store is logged and the analysis runs on as if
+checkpoints were off, it is never failed because of them
+
+Key Responsibility
+---
+DynamoCheckpointSaver / SqliteCheckpointSaver: async only checkpoint savers
+checkpointer: saver selected by CHECKPOINT_STORE, none when checkpoints are off
+"""
+import abc
+import asyncio
+import logging
+import sqlite3
+import time
+import zlib
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from src.core.aws import aws
+from src.core.config import settings
+from src.services.db import (
+    delete_checkpoint_entries, get_checkpoint_entries, hash_text_sha256, put_checkpoint_entry,
+)
+
+logger = logging.getLogger(__name__)
+
+# s3 prefix of the checkpoints too large for a dynamodb item
+CHECKPOINT_PREFIX = "checkpoints"
+
+
+class LatestCheckpointSaver(BaseCheckpointSaver, abc.ABC):
+    """base saver keeping the latest checkpoint of a thread and its pending writes
+
+    a record is {"checkpoint_id", "parent_id", "checkpoint": (type, bytes),
+    "metadata": (type, bytes), "writes": {key: (task_id, channel, type, bytes, task_path)}},
+    subclasses only load, store and delete records; writes are stored apart from the
+    checkpoint and only the ones of the latest checkpoint are loaded
+    """
+
+    @abc.abstractmethod
+    async def _load(self, thread_id: str, checkpoint_ns: str) -> Optional[dict]:
+        """latest record of the thread, none if there is none"""
+
+    @abc.abstractmethod
+    async def _store(self, thread_id: str, checkpoint_ns: str, record: dict) -> None:
+        """replace the latest record of the thread"""
+
+    @abc.abstractmethod
+    async def _store_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, writes: dict, overwrite: bool,
+    ) -> None:
+        """add pending writes of a checkpoint, replacing existing keys when `overwrite`"""
+
+    @abc.abstractmethod
+    async def _delete_thread(self, thread_id: str) -> None:
+        """drop every record and write of the thread"""
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        try:
+            await self._delete_thread(thread_id)
+        except Exception as e:
+            logger.warning("Unable to delete checkpoint thread %s: %s", thread_id, e)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        try:
+            record = await self._load(thread_id, checkpoint_ns)
+        except Exception as e:
+            logger.warning("Unable to load checkpoint %s, starting over: %s", thread_id, e)
+            return None
+        if record is None:
+            return None
+        wanted = get_checkpoint_id(config)
+        if wanted and wanted != record["checkpoint_id"]:
+            # older checkpoints are not kept
+            return None
+
+        def target(checkpoint_id: str) -> RunnableConfig:
+            return {"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            }}
+
+        return CheckpointTuple(
+            config=target(record["checkpoint_id"]),
+            checkpoint=self.serde.loads_typed(record["checkpoint"]),
+            metadata=self.serde.loads_typed(record["metadata"]),
+            parent_config=target(record["parent_id"]) if record["parent_id"] else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((kind, value)))
+                for task_id, channel, kind, value, _ in record["writes"].values()
+            ],
+        )
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        # a thread has a single checkpoint, threads are not enumerated
+        if config is None or (limit is not None and limit <= 0):
+            return
+        found = await self.aget_tuple(config)
+        if found is None:
+            return
+        before_id = get_checkpoint_id(before) if before else None
+        if before_id and found.config["configurable"]["checkpoint_id"] >= before_id:
+            return
+        if filter and not all(found.metadata.get(k) == v for k, v in filter.items()):
+            return
+        yield found
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        try:
+            await self._store(thread_id, checkpoint_ns, {
+                "checkpoint_id": checkpoint["id"],
+                "parent_id": config["configurable"].get("checkpoint_id"),
+                "checkpoint": self.serde.dumps_typed(checkpoint),
+                "metadata": self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+                "writes": {},
+            })
+        except Exception as e:
+            # a retry resumes from an older checkpoint, or starts over
+            logger.warning("Unable to store checkpoint %s: %s", thread_id, e)
+        return {"configurable": {
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"],
+        }}
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        # regular writes are kept once stored, the special channels (error, interrupt,
+        # ...) have negative indices and are replaced
+        regular, special = {}, {}
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            (special if idx < 0 else regular)[f"{task_id}:{idx}"] = (
+                task_id, channel, *self.serde.dumps_typed(value), task_path,
+            )
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        try:
+            if regular:
+                await self._store_writes(thread_id, checkpoint_ns, checkpoint_id, regular, overwrite=False)
+            if special:
+                await self._store_writes(thread_id, checkpoint_ns, checkpoint_id, special, overwrite=True)
+        except Exception as e:
+            logger.warning("Unable to store checkpoint writes of %s: %s", thread_id, e)
+
+
+class DynamoCheckpointSaver(LatestCheckpointSaver):
+    """checkpoints in the analysisCheckpoint table: per thread one "checkpoint" item and
+    one "write#<checkpoint id>#<task>#<idx>" item per pending write
+
+    langgraph saves writes concurrently with the checkpoint they belong to, so writes
+    are separate items matched to the checkpoint on read, the ones of older checkpoints
+    go with the thread. payloads are compressed and offloaded to s3 beyond
+    CHECKPOINT_INLINE_MAX_BYTES
+    """
+
+    @staticmethod
+    def _key(thread_id: str, checkpoint_ns: str) -> str:
+        return f"{thread_id}|{checkpoint_ns}"
+
+    @staticmethod
+    async def _pack(thread_key: str, entry: str, value: bytes) -> dict:
+        compressed = zlib.compress(value)
+        if len(compressed) <= settings.CHECKPOINT_INLINE_MAX_BYTES:
+            return {"payload": compressed}
+        key = f"{CHECKPOINT_PREFIX}/{hash_text_sha256(thread_key)}/{hash_text_sha256(entry)}"
+        await aws.s3.put_object(Bucket=settings.S3_BUCKET, Key=key, Body=compressed)
+        return {"payloadS3Key": key}
+
+    @staticmethod
+    async def _unpack(item: dict) -> bytes:
+        if not item.get("payloadS3Key"):
+            return zlib.decompress(bytes(item["payload"]))
+        response = await aws.s3.get_object(Bucket=settings.S3_BUCKET, Key=item["payloadS3Key"])
+        body = response["Body"]
+        try:
+            return zlib.decompress(await body.read())
+        finally:
+            body.close()
+
+    async def _load(self, thread_id: str, checkpoint_ns: str) -> Optional[dict]:
+        items = await get_checkpoint_entries(self._key(thread_id, checkpoint_ns))
+        checkpoint = next((item for item in items if item["entry"] == "checkpoint"), None)
+        if checkpoint is None:
+            return None
+        checkpoint_id = checkpoint["checkpointID"]
+        writes = {}
+        for item in items:
+            if item["entry"] != "checkpoint" and item["checkpointID"] == checkpoint_id:
+                writes[item["entry"]] = (
+                    item["taskID"], item["channel"], item["type"], await self._unpack(item), item["taskPath"],
+                )
+        return {
+            "checkpoint_id": checkpoint_id,
+            "parent_id": checkpoint.get("parentID"),
+            "checkpoint": (checkpoint["type"], await self._unpack(checkpoint)),
+            "metadata": (checkpoint["metadataType"], bytes(checkpoint["metadata"])),
+            "writes": writes,
+        }
+
+    async def _store(self, thread_id: str, checkpoint_ns: str, record: dict) -> None:
+        thread_key = self._key(thread_id, checkpoint_ns)
+        kind, value = record["checkpoint"]
+        await put_checkpoint_entry({
+            "threadID": thread_key,
+            "entry": "checkpoint",
+            "checkpointID": record["checkpoint_id"],
+            "parentID": record["parent_id"],
+            "type": kind,
+            "metadataType": record["metadata"][0],
+            "metadata": record["metadata"][1],
+            **await self._pack(thread_key, "checkpoint", value),
+        }, settings.CHECKPOINT_TTL_SECONDS)
+
+    async def _store_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, writes: dict, overwrite: bool,
+    ) -> None:
+        thread_key = self._key(thread_id, checkpoint_ns)
+        for key, (task_id, channel, kind, value, task_path) in writes.items():
+            entry = f"write#{checkpoint_id}#{key}"
+            await put_checkpoint_entry({
+                "threadID": thread_key,
+                "entry": entry,
+                "checkpointID": checkpoint_id,
+                "taskID": task_id,
+                "channel": channel,
+                "type": kind,
+                "taskPath": task_path,
+                **await self._pack(thread_key, entry, value),
+            }, settings.CHECKPOINT_TTL_SECONDS, if_absent=not overwrite)
+
+    async def _delete_thread(self, thread_id: str) -> None:
+        # the graphs have no subgraphs, the root namespace is the only one
+        thread_key = self._key(thread_id, "")
+        items = await get_checkpoint_entries(thread_key)
+        for item in items:
+            if item.get("payloadS3Key"):
+                await aws.s3.delete_object(Bucket=settings.S3_BUCKET, Key=item["payloadS3Key"])
+        await delete_checkpoint_entries(thread_key, [item["entry"] for item in items])
+
+
+class SqliteCheckpointSaver(LatestCheckpointSaver):
+    """checkpoints in a local sqlite file, for running without aws"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints (thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, "
+            "checkpoint_id TEXT NOT NULL, parent_id TEXT, type TEXT NOT NULL, checkpoint BLOB NOT NULL, "
+            "metadata_type TEXT NOT NULL, metadata BLOB NOT NULL, expires_at INTEGER NOT NULL, "
+            "PRIMARY KEY (thread_id, checkpoint_ns))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS writes (thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, "
+            "checkpoint_id TEXT NOT NULL, key TEXT NOT NULL, task_id TEXT NOT NULL, channel TEXT NOT NULL, "
+            "type TEXT NOT NULL, value BLOB NOT NULL, task_path TEXT NOT NULL, "
+            "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, key))"
+        )
+        return conn
+
+    def _load_sync(self, thread_id: str, checkpoint_ns: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND expires_at >= ?",
+                (thread_id, checkpoint_ns, int(time.time())),
+            ).fetchone()
+            if row is None:
+                return None
+            writes = conn.execute(
+                "SELECT key, task_id, channel, type, value, task_path FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, row[0]),
+            ).fetchall()
+        return {
+            "checkpoint_id": row[0],
+            "parent_id": row[1],
+            "checkpoint": (row[2], zlib.decompress(row[3])),
+            "metadata": (row[4], row[5]),
+            "writes": {w[0]: tuple(w[1:]) for w in writes},
+        }
+
+    def _store_sync(self, thread_id: str, checkpoint_ns: str, record: dict) -> None:
+        kind, value = record["checkpoint"]
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id, checkpoint_ns, record["checkpoint_id"], record["parent_id"], kind,
+                    zlib.compress(value), *record["metadata"], int(time.time()) + settings.CHECKPOINT_TTL_SECONDS,
+                ),
+            )
+            # expired threads of crashed runs are never resumed, clear them on the way
+            expired = conn.execute(
+                "SELECT thread_id FROM checkpoints WHERE expires_at < ?", (int(time.time()),)
+            ).fetchall()
+            for (expired_thread,) in expired:
+                self._delete_sync(conn, expired_thread)
+
+    def _store_writes_sync(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, writes: dict, overwrite: bool,
+    ) -> None:
+        verb = "INSERT OR REPLACE" if overwrite else "INSERT OR IGNORE"
+        with self._connect() as conn:
+            conn.executemany(
+                f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(thread_id, checkpoint_ns, checkpoint_id, key, *write) for key, write in writes.items()],
+            )
+
+    @staticmethod
+    def _delete_sync(conn: sqlite3.Connection, thread_id: str) -> None:
+        conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+        conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    def _delete_thread_sync(self, thread_id: str) -> None:
+        with self._connect() as conn:
+            self._delete_sync(conn, thread_id)
+
+    async def _load(self, thread_id: str, checkpoint_ns: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._load_sync, thread_id, checkpoint_ns)
+
+    async def _store(self, thread_id: str, checkpoint_ns: str, record: dict) -> None:
+        await asyncio.to_thread(self._store_sync, thread_id, checkpoint_ns, record)
+
+    async def _store_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, writes: dict, overwrite: bool,
+    ) -> None:
+        await asyncio.to_thread(self._store_writes_sync, thread_id, checkpoint_ns, checkpoint_id, writes, overwrite)
+
+    async def _delete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self._delete_thread_sync, thread_id)
+
+
+def build_checkpointer() -> Optional[LatestCheckpointSaver]:
+    """saver selected by CHECKPOINT_STORE, none when checkpoints are off or the
+    single-flight lease is, without it two workers would share a thread"""
+    if settings.CHECKPOINT_STORE == "off":
+        return None
+    if not settings.SINGLE_FLIGHT_LEASE_ENABLED:
+        logger.warning("CHECKPOINT_STORE=%s ignored, it needs SINGLE_FLIGHT_LEASE_ENABLED", settings.CHECKPOINT_STORE)
+        return None
+    if settings.CHECKPOINT_STORE == "sqlite":
+        return SqliteCheckpointSaver(settings.CHECKPOINT_SQLITE_PATH)
+    if settings.CHECKPOINT_STORE == "dynamodb":
+        return DynamoCheckpointSaver()
+    return None
+
+
+# module level singleton shared by the compiled graphs
+checkpointer = build_checkpointer()
@@ -0,0 +1,155 @@
+"""
+Token Aware Chunking & Map-Reduce
+----
+long reports do not fit one prompt, so converted_text is split into token budgeted,
+overlapping sections, every section runs through a node's chain concurrently and the
+per section json results are merged back by a node specific reducer
+
+Key Responsibility
+---
+split_text: paragraph aware split into sections of at most CHUNK_MAX_TOKENS
+map_reduce: run a chain over every section and reduce the results
+merge_keyed / merge_lists: generic reducers used by the analysis nodes
+"""
+import asyncio
+import json
+import logging
+import re
+from typing import Any, Callable, Iterable, List, Optional
+
+from langchain_core.runnables import Runnable
+
+from src.core.config import settings
+from src.services.llm import llm_registry
+from src.utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _pieces(text: str, max_tokens: int) -> List[str]:
+    """paragraphs of `text`, oversized ones cut at sentence then character level"""
+    pieces = []
+    for paragraph in text.split("\n"):
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            step = max_tokens * CHARS_PER_TOKEN
+            pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+    return pieces
+
+
+def split_text(text: str, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None) -> List[str]:
+    """split `text` into sections of at most `max_tokens`, consecutive sections sharing
+    up to `overlap_tokens` of trailing paragraphs so statements on a boundary are seen whole
+
+    Parameter
+    ---
+    text: str
+        document text
+    max_tokens: int
+        section budget, defaults to settings.CHUNK_MAX_TOKENS
+    overlap_tokens: int
+        overlap budget, defaults to settings.CHUNK_OVERLAP_TOKENS
+    """
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    sections: List[str] = []
+    current: List[str] = []
+    used = 0
+    for piece in _pieces(text, max_tokens):
+        cost = estimate_tokens(piece) + 1
+        if current and used + cost > max_tokens:
+            sections.append("\n".join(current))
+            # carry the tail of the section over as overlap
+            carried, carried_tokens = [], 0
+            for previous in reversed(current):
+                previous_cost = estimate_tokens(previous) + 1
+                if carried_tokens + previous_cost > overlap_tokens or carried_tokens + previous_cost + cost > max_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous_cost
+            current, used = carried, carried_tokens
+        current.append(piece)
+        used += cost
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
+async def map_reduce(
+    chain: Runnable,
+    text: str,
+    reducer: Callable[[List[Any]], Any],
+    input_key: str = "cleaned_text",
+) -> Any:
+    """run `chain` over every section of `text` concurrently and merge with `reducer`
+
+    a text that fits one section is sent as is and its result returned unreduced
+    """
+    sections = split_text(text)
+    if len(sections) == 1:
+        return await llm_registry.ainvoke(chain, {input_key: text})
+
+    logger.info(
+        "Map-reduce over %d sections (~%d input tokens)",
+        len(sections), sum(estimate_tokens(s) for s in sections),
+    )
+    results = await asyncio.gather(*(llm_registry.ainvoke(chain, {input_key: s}) for s in sections))
+    return reducer(list(results))
+
+
+def _same_entry(a: Any, b: Any) -> bool:
+    """true when two entries of one label are the same finding repeated by overlapping sections"""
+    if a == b:
+        return True
+    if isinstance(a, dict) and isinstance(b, dict) and a.get("quote") and b.get("quote"):
+        return str(a["quote"]).strip().lower() == str(b["quote"]).strip().lower()
+    return False
+
+
+def merge_keyed(results: Iterable[Any]) -> dict:
+    """merge `{label: entry}` results; a label repeated with the same entry or quote is
+    kept once, a different finding under the same label is kept as `label (2)`, ..."""
+    merged: dict = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        for label, entry in result.items():
+            key, n = label, 1
+            while key in merged:
+                if _same_entry(merged[key], entry):
+                    break
+                n += 1
+                key = f"{label} ({n})"
+            else:
+                merged[key] = entry
+    return merged
+
+
+def merge_lists(results: Iterable[Any], list_key: str, dedupe_on: Iterable[str] = ("quote",)) -> dict:
+    """merge results that are lists, single objects or `{list_key: [...]}` into
+    `{list_key: [...]}`, dropping entries repeated by overlapping sections"""
+    dedupe_on = tuple(dedupe_on)
+    entries, seen = [], set()
+    for result in results:
+        if isinstance(result, dict):
+            items = result.get(list_key, [result])
+        elif isinstance(result, list):
+            items = result
+        else:
+            continue
+        for item in items:
+            if isinstance(item, dict) and any(item.get(f) for f in dedupe_on):
+                fingerprint = tuple(str(item.get(f, "")).strip().lower() for f in dedupe_on)
+            else:
+                fingerprint = json.dumps(item, sort_keys=True, default=str)
+            if fingerprint not in seen:
+                seen.add(fingerprint)
+                entries.append(item)
+    return {list_key: entries}
@@ -5,13 +5,28 @@ This module defines two public callables:
     1. build_currency_conversion_prompt: return a parametrised prompt Template
     instructing an llm to detect & convert every monetary amount in a text block
    from USD/GBP/EUR
-    2. run_currency_conversion: LangGraph compatible async node that feeds
-   converted_text through the prompt
+    2. run_currency_conversion: LangGraph compatible async node that normalises
+   input_text with the local regex engine (see currency_normalisation) and only
+   sends the lines it could not convert through the prompt
+    3. conversion_version: fingerprint of the rates and conversion settings, the
+   converted text of a parsed text is cached per version next to it (see db)
 """
+import asyncio
+import json
+import logging
+
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
 from langchain_core.runnables import Runnable
+from langchain_core.output_parsers import StrOutputParser
 from src.core.config import settings
+from src.services.currency_normalisation import MoneySpan, format_rates, normalise_currency
+from src.services.db import get_converted_text, hash_text_sha256, put_converted_text
+from src.services.llm import llm_registry
+
+logger = logging.getLogger(__name__)
+
+# bump when the local normalisation engine changes its output
+CONVERSION_VERSION = "2"
 
 
 def build_currency_conversion_prompt() -> PromptTemplate:
@@ -21,8 +36,7 @@ You are a financial assistant. The following text contains monetary values in US
 Your task:
 1. Detect all monetary values, including those with multipliers such as "million", "m", "thousand", or "k".
 2. Convert each amount to EUR using the following fixed rates:
-   - 1 USD = 0.91 EUR
-   - 1 GBP = 1.18 EUR
+{rates}
 3. Multiply values accordingly before conversion:
    - "million" or "m" = ×1,000,000
    - "thousand" or "k" = ×1,000
@@ -40,21 +54,83 @@ Only return the modified version of the original text.
 Original Text:
 {input_text}
 """
-    return PromptTemplate(input_variables=["input_text"], template=prompt_str)
+    return PromptTemplate(input_variables=["input_text", "rates"], template=prompt_str)
 
 
-def run_currency_conversion(state: dict) -> dict:
-    input_text = state["input_text"]  # consume input_text
-    prompt = build_currency_conversion_prompt()
-    print("settings.GROQ_API_KEY", settings.GROQ_API_KEY)
-    llm = ChatGroq(
-        model="llama-3.3-70b-versatile",
-        temperature=0.2,
-        groq_api_key=settings.GROQ_API_KEY
+def build_currency_conversion_chain() -> Runnable:
+    """compose prompt | shared llm | string parser, built once per process"""
+    return build_currency_conversion_prompt() | llm_registry.llm() | StrOutputParser()
+
+
+def conversion_version() -> str:
+    """fingerprint of everything besides the text that shapes the converted text: the
+    rates, the conversion mode and fallback, the prompt and the model; new rates in ssm
+    give a new version, so cached conversions at old rates are never read again"""
+    parts = (
+        CONVERSION_VERSION,
+        json.dumps(settings.EXCHANGE_RATES, sort_keys=True),
+        settings.CURRENCY_CONVERSION_MODE,
+        str(settings.CURRENCY_LLM_FALLBACK),
+        build_currency_conversion_prompt().template,
+        settings.LLM_MODEL,
     )
+    return hash_text_sha256("\n".join(parts))[:16]
+
+
+async def _convert_lines_with_llm(text: str, spans: list[MoneySpan]) -> str:
+    """send only the lines holding `spans` through the llm and splice them back"""
+    lines = text.split("\n")
+    line_numbers = sorted({text.count("\n", 0, span.start) for span in spans})
+    chain: Runnable = llm_registry.chain("currency_conversion", build_currency_conversion_chain)
+    rates = format_rates(settings.EXCHANGE_RATES)
+
+    converted = await asyncio.gather(*(
+        llm_registry.ainvoke(chain, {"input_text": lines[n], "rates": rates}) for n in line_numbers
+    ))
+    for n, line in zip(line_numbers, converted):
+        lines[n] = line.strip()
+    return "\n".join(lines)
+
+
+async def run_currency_conversion(state: dict) -> dict:
+    """LangGraph entry node converting every amount of input_text to EUR
+
+    amounts are converted locally; the llm is only awaited for ambiguous spans, or
+    for the whole text when CURRENCY_CONVERSION_MODE is "llm". the result is cached
+    by text digest and conversion_version when CONVERTED_TEXT_CACHE_ENABLED is set
+
+    Returns
+    -------
+    dict
+        New state fragment `{ "converted_text": <str> }`.
+    """
+    input_text = state["input_text"]  # consume input_text
+
+    if settings.CONVERTED_TEXT_CACHE_ENABLED:
+        text_id, version = hash_text_sha256(input_text), conversion_version()
+        cached = await get_converted_text(text_id, version)
+        if cached is not None:
+            logger.info("Converted text cache hit for %s", text_id)
+            return {"converted_text": cached}
+
+    try:
+        if settings.CURRENCY_CONVERSION_MODE == "llm":
+            chain: Runnable = llm_registry.chain("currency_conversion", build_currency_conversion_chain)
+            converted_text = await llm_registry.ainvoke(
+                chain, {"input_text": input_text, "rates": format_rates(settings.EXCHANGE_RATES)}
+            )
+        else:
+            result = normalise_currency(input_text, settings.EXCHANGE_RATES)
+            converted_text = result.text
+            if result.unresolved and settings.CURRENCY_LLM_FALLBACK:
+                logger.info("Falling back to llm for %d ambiguous amounts", len(result.unresolved))
+                converted_text = await _convert_lines_with_llm(converted_text, result.unresolved)
+    except Exception as e:
+        logger.error("Chain invocation failed: %s", e)
+        raise
 
-    chain: Runnable = prompt | llm
-    converted_text = chain.invoke({"input_text": input_text})
+    if settings.CONVERTED_TEXT_CACHE_ENABLED:
+        await put_converted_text(text_id, version, converted_text)
 
     return {
         "converted_text": converted_text  # only add converted_text
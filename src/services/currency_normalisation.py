@@ -0,0 +1,205 @@
+"""
+Deterministic Currency Normalisation
+---
+local replacement for the llm currency pre-pass. money amounts are detected with a
+regex tokenizer and rewritten to EUR using settings.EXCHANGE_RATES, so a document
+is normalised in milliseconds without a model round-trip
+
+Key Responsibility
+---
+find_amounts: detect every money span (symbols, ISO codes, currency words and
+"k"/"thousand"/"m"/"million"/"bn"/"billion" multipliers, ranges included)
+normalise_currency: rewrite every convertible span to `1,200.50 EUR` and report the
+spans it could not convert so the caller can fall back to the llm
+format_rates: render the rate table for prompts
+
+IMPORTANT:
+rates are read as the EUR value of one unit of the currency (1 USD = 0.91 EUR) and
+are divided by the EUR entry so the table stays correct if EUR is not stored as 1
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# prefix markers, longest first so "US$" wins over "$"
+SYMBOLS = {"US$": "USD", "€": "EUR", "£": "GBP", "$": "USD"}
+
+# currency words written after the amount
+WORDS = {
+    "euro": "EUR", "euros": "EUR",
+    "pound": "GBP", "pounds": "GBP", "pounds sterling": "GBP", "sterling": "GBP",
+    "dollar": "USD", "dollars": "USD",
+}
+
+# iso codes we recognise, codes without a rate are reported as unresolved
+ISO_CODES = ("EUR", "USD", "GBP", "CHF", "JPY", "AUD", "CAD", "SEK", "NOK", "DKK", "CNY", "AED", "SAR", "QAR")
+
+MULTIPLIERS = {
+    "k": 1_000, "thousand": 1_000,
+    "m": 1_000_000, "mn": 1_000_000, "million": 1_000_000,
+    "bn": 1_000_000_000, "billion": 1_000_000_000,
+}
+
+_SYMBOL = "|".join(re.escape(s) for s in SYMBOLS)
+_ISO = "|".join(ISO_CODES)
+_WORD = "|".join(re.escape(w) for w in sorted(WORDS, key=len, reverse=True))
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+_MULT = "|".join(sorted(MULTIPLIERS, key=len, reverse=True))
+
+MONEY_RE = re.compile(
+    rf"""
+    (?:(?P<symbol>{_SYMBOL})\s?|(?P<prefix_code>\b(?:{_ISO}))\s?)?
+    (?P<low>{_NUMBER})
+    (?:\s?(?P<low_mult>(?i:{_MULT}))\b)?
+    (?:\s?(?P<sep>-|–|to)\s?(?P<high_symbol>{_SYMBOL})?(?P<high>{_NUMBER}))?
+    (?:\s?(?P<mult>(?i:{_MULT}))\b)?
+    (?:\s?(?P<suffix_code>\b(?:{_ISO})\b)|\s(?P<word>(?i:{_WORD}))\b)?
+    """,
+    re.VERBOSE,
+)
+
+
+@dataclass
+class MoneySpan:
+    """a detected money amount"""
+    start: int
+    end: int
+    text: str
+    currency: Optional[str]
+    low: float
+    high: Optional[float] = None
+    separator: str = ""
+
+
+@dataclass
+class NormalisationResult:
+    """output of normalise_currency"""
+    text: str
+    converted: List[MoneySpan] = field(default_factory=list)
+    # spans left untouched, offsets point into `text`
+    unresolved: List[MoneySpan] = field(default_factory=list)
+
+
+def _to_number(raw: str, multiplier: Optional[str]) -> float:
+    value = float(raw.replace(",", ""))
+    if multiplier:
+        value *= MULTIPLIERS[multiplier.lower()]
+    return value
+
+
+def _currency(match: re.Match) -> tuple[Optional[str], bool]:
+    """return (currency, conflict) from all the markers of the match"""
+    markers = {
+        SYMBOLS.get(match["symbol"]) if match["symbol"] else None,
+        match["prefix_code"],
+        match["suffix_code"],
+        WORDS.get(match["word"].lower()) if match["word"] else None,
+    } - {None}
+    if len(markers) == 1:
+        return markers.pop(), False
+    return None, len(markers) > 1
+
+
+def _is_range(match: re.Match) -> bool:
+    """whether the number after the separator belongs to the amount: it has to carry a
+    marker of its own ("£5m to £8m", "5-8 million", "5 to 8 EUR") or touch the dash
+    ("£5-8"), so "£5 million to 10 sites" stays a single amount"""
+    if match["high_symbol"] or match["mult"] or match["suffix_code"] or match["word"]:
+        return True
+    gap = match.string[match.end("low_mult") if match["low_mult"] else match.end("low"):match.start("high")]
+    return gap in ("-", "–")
+
+
+def find_amounts(text: str) -> List[MoneySpan]:
+    """detect every money span of `text`, bare numbers without a currency marker are skipped"""
+    spans = []
+    for match in MONEY_RE.finditer(text):
+        currency, conflict = _currency(match)
+        if currency is None and not conflict:
+            # plain number, percentage, year, etc.
+            continue
+        if match["high"] and not _is_range(match):
+            # the trailing number is not money, keep the amount before the separator
+            end = match.end("low_mult") if match["low_mult"] else match.end("low")
+            spans.append(MoneySpan(
+                start=match.start(),
+                end=end,
+                text=text[match.start():end],
+                currency=currency,
+                low=_to_number(match["low"], match["low_mult"]),
+            ))
+            continue
+        # "£2m-3m" carries a multiplier on each side, "£2-3m" shares the trailing one
+        low_mult = match["low_mult"] or match["mult"]
+        spans.append(MoneySpan(
+            start=match.start(),
+            end=match.end(),
+            text=match.group(0),
+            currency=currency,
+            low=_to_number(match["low"], low_mult),
+            high=_to_number(match["high"], match["mult"]) if match["high"] else None,
+            separator=match["sep"] or "",
+        ))
+    return spans
+
+
+def _format_eur(value: float) -> str:
+    return f"{value:,.2f}"
+
+
+def normalise_currency(text: str, rates: Dict[str, float]) -> NormalisationResult:
+    """rewrite every money amount of `text` as EUR using `rates`
+
+    Parameter
+    ---
+    text: str
+        plain text of the report
+    rates: dict
+        EUR value of one unit per currency, normally settings.EXCHANGE_RATES
+
+    Return
+    ---
+    NormalisationResult
+        converted text plus the converted and the unresolved spans
+    """
+    eur_rate = rates.get("EUR") or 1.0
+    result = NormalisationResult(text="")
+    pieces = []
+    cursor = 0
+    offset = 0
+    for span in find_amounts(text):
+        pieces.append(text[cursor:span.start])
+        offset += span.start - cursor
+        cursor = span.end
+
+        rate = rates.get(span.currency) if span.currency else None
+        if rate is None:
+            # unknown or conflicting currency, keep the original wording
+            result.unresolved.append(MoneySpan(
+                start=offset, end=offset + len(span.text), text=span.text, currency=span.currency,
+                low=span.low, high=span.high, separator=span.separator,
+            ))
+            replacement = span.text
+        else:
+            factor = rate / eur_rate
+            replacement = _format_eur(span.low * factor)
+            if span.high is not None:
+                sep = f" {span.separator} " if span.separator == "to" else span.separator
+                replacement += sep + _format_eur(span.high * factor)
+            replacement += " EUR"
+            result.converted.append(span)
+
+        pieces.append(replacement)
+        offset += len(replacement)
+
+    pieces.append(text[cursor:])
+    result.text = "".join(pieces)
+    return result
+
+
+def format_rates(rates: Dict[str, float]) -> str:
+    """render `rates` as prompt lines such as `- 1 USD = 0.91 EUR`"""
+    eur_rate = rates.get("EUR") or 1.0
+    return "\n".join(
+        f"   - 1 {code} = {rate / eur_rate:g} EUR" for code, rate in rates.items() if code != "EUR"
+    )
@@ -10,21 +10,28 @@ This module exposes two public callables:
 """
 import logging
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import JsonOutputParser
-from src.core.config import settings
+from src.services.chunking import map_reduce, merge_lists
+from src.services.llm import llm_registry
+from src.services.prompts import build_node_prompt
+from src.services.section_index import relevant_text
 
 logger = logging.getLogger(__name__)
 
-def build_current_insurance_prompt() -> PromptTemplate:
-    """Construct the coverage‑gap extraction prompt."""
+# marker phrases of the prompt, used to route only the matching passages to this node
+RELEVANCE_MARKERS = (
+    "insufficient", "inadequate", "does not account", "excludes", "exclusion", "lacks", "gap",
+    "mismatch", "not addressed", "coverage limits", "policy", "insurance", "cover",
+)
 
-    prompt_str = """
+# node instructions, placed after the shared document prefix so the report
+# tokens form a prompt prefix common to every node
+CURRENT_INSURANCE_INSTRUCTIONS = """
 You are a professional insurance coverage analyst.
 
 GOAL  
-Scan the plain-English risk-assessment report below and extract **every statement that indicates an inadequacy, exclusion, or gap in the EXISTING insurance programme**.
+Scan the plain-English risk-assessment report above and extract **every statement that indicates an inadequacy, exclusion, or gap in the EXISTING insurance programme**.
 
 MARKERS to watch for  
 - Words or phrases such as **“insufficient,” “inadequate,” “does not account,” “excludes,” “lacks,” “gap,” “mismatch,” “not addressed,”** “currently lacks,” “coverage limits appear…,” etc.  
@@ -40,13 +47,6 @@ Whenever you spot such a gap, create **one** JSON object with **exactly** these
 
 Wrap **all** gap objects inside a single top-level key named **"current_insurance_gaps"** and return **only the JSON**—no headings or commentary.
 
----
-
-Here is the extracted report text:
-
-{cleaned_text}
-----------------
-
 ### Example output  
 _Excerpt (for illustration only)_:  
 > “Current property limits appear insufficient when considering the full replacement timeline … particularly given the €12.8 million EUR revenue impact during closure periods.”
@@ -59,7 +59,21 @@ _Excerpt (for illustration only)_:
       "notes": ""
 }}
 """
-    return PromptTemplate(input_variables=["cleaned_text"], template=prompt_str)
+
+CURRENT_INSURANCE_PROMPT = build_node_prompt(CURRENT_INSURANCE_INSTRUCTIONS)
+
+
+def build_current_insurance_prompt() -> PromptTemplate:
+    """Construct the coverage‑gap extraction prompt, compiled once at import"""
+    return CURRENT_INSURANCE_PROMPT
+
+def build_current_insurance_chain() -> Runnable:
+    """compose prompt | shared llm | json parser, built once per process"""
+    return build_current_insurance_prompt() | llm_registry.llm() | JsonOutputParser()
+
+def reduce_current_insurance(results: list) -> dict:
+    """concatenate the gaps found in every section, dropping the ones quoted twice"""
+    return merge_lists(results, "current_insurance_gaps", dedupe_on=("quote",))
 
 async def run_current_insurance(state: dict) -> dict:
     """LangGraph node to extract current insurance gaps"""
@@ -69,21 +83,14 @@ async def run_current_insurance(state: dict) -> dict:
         logger.error("Missing 'converted_text' in state")
         raise ValueError("Missing 'converted_text' key in state dict")
 
-    prompt = build_current_insurance_prompt()
-    parser = JsonOutputParser()
-    print("GROQ_API_KEY", settings.GROQ_API_KEY)
-    # Instantiate Groq LLM once per invocation
-    llm = ChatGroq(
-        model="llama-3.3-70b-versatile",
-        temperature=0.2,
-        groq_api_key=settings.GROQ_API_KEY
-    )
-
-    chain: Runnable = prompt | llm | parser
+    # reuse the pre-built chain and its pooled llm client
+    chain: Runnable = llm_registry.chain("current_insurance", build_current_insurance_chain)
 
     try:
         # Asynchronously invoke the node execution
-        result = await chain.ainvoke({"cleaned_text": cleaned_text})
+        # only the passages matching the markers when the relevance filter is on
+        cleaned_text = relevant_text(cleaned_text, RELEVANCE_MARKERS, "current_insurance")
+        result = await map_reduce(chain, cleaned_text, reduce_current_insurance)
         return {"current_insurance_s": result}
     except Exception as e:
         logger.error("Chain invocation failed: %s", e)
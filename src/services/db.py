@@ -2,28 +2,100 @@
 DynamoDB Persistence and Utility functions
 ----
 this module centralises DynamoDB read/write helpers and generic sha-256 hash function used
-in application. all interactions target the `parsedText` table
+in application. parsed text lives in the `parsedText` table, complete analysis
+results in the `analysisResult` table
+
+parsed texts are served from an in-process LRU (parsed_text_cache) before dynamodb
+is asked, so a hot document costs no network round-trip at all. texts above
+PARSED_TEXT_INLINE_MAX_BYTES are stored zlib compressed, and in s3 when even the
+compressed text would not fit the 400 KB item limit
 
 Key Responsibility
 ---
-get_parsed_text: fetch previously parsed text by its textId
-put_parsed_text: persist a new textID
+get_parsed_text: fetch previously parsed text by its textId, none on a miss
+put_parsed_text: persist a new textID, best effort
+get_parsed_texts: batched get_parsed_text for many textIDs (e.g. per-page ocr results)
+put_parsed_texts: batched put_parsed_text
+get_converted_text / put_converted_text: currency converted text of a parsed text,
+stored next to it in the parseText table per conversion version
 item_exists: constant cost existence check
+get_cached_result: fetch a non expired analysis result by its resultID
+put_cached_result: persist an analysis result with an expiry
+delete_cached_result: drop an analysis result
+acquire_lease: conditional write claiming a unit of work across workers
+renew_lease: push back the expiry of a lease held by the caller
+release_lease: drop a lease held by the caller
+put_job / update_job / get_job / get_stale_jobs: analysis job records of the job api
+get_checkpoint_entries / put_checkpoint_entry / delete_checkpoint_entries: latest graph
+checkpoint of a thread and its pending writes
 hash_text_sha256: asset agnostic hashing
 """
 import hashlib
-from typing import Union
+import json
+import logging
+import time
+import zlib
+from typing import Optional, Union
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import BotoCoreError, ClientError
+
+from exceptions import DbExecutionError
+from src.core.aws import PARSE_TEXT_TABLE, aws
+from src.core.config import settings
+from src.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# textID prefix of the currency converted texts
+CONVERTED_TEXT_PREFIX = "converted#"
+# s3 prefix of the texts too large for a dynamodb item
+TEXT_S3_PREFIX = "texts"
+
+# front cache of parsed texts, shared by every request of the worker
+parsed_text_cache = LRUCache(
+    max_bytes=settings.PARSED_TEXT_CACHE_MAX_BYTES,
+    ttl_seconds=settings.PARSED_TEXT_CACHE_TTL_SECONDS,
+)
+
+
+async def _pack_text(text_id: str, attribute: str, text: str) -> dict:
+    """
+    item attributes storing text under attribute, inline when small, else compressed
+    (attribute + "Z") or offloaded to s3 (attribute + "S3Key")
+    """
+    encoded = text.encode()
+    if len(encoded) <= settings.PARSED_TEXT_INLINE_MAX_BYTES:
+        return {attribute: text}
+    compressed = zlib.compress(encoded)
+    if len(compressed) <= settings.PARSED_TEXT_INLINE_MAX_BYTES:
+        return {f"{attribute}Z": compressed}
+    key = f"{TEXT_S3_PREFIX}/{hash_text_sha256(text_id)}/{attribute}.z"
+    await aws.s3.put_object(Bucket=settings.S3_BUCKET, Key=key, Body=compressed)
+    return {f"{attribute}S3Key": key}
 
-import boto3
-from botocore.exceptions import ClientError
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')  # adjust region as needed
-table = dynamodb.Table('parseText')
+async def _unpack_text(item: dict, attribute: str) -> Optional[str]:
+    """
+    text stored under attribute by _pack_text, none when the item has none
+    """
+    if attribute in item:
+        return item[attribute]
+    if f"{attribute}Z" in item:
+        return zlib.decompress(bytes(item[f"{attribute}Z"])).decode()
+    if f"{attribute}S3Key" in item:
+        response = await aws.s3.get_object(Bucket=settings.S3_BUCKET, Key=item[f"{attribute}S3Key"])
+        async with response["Body"] as body:
+            return zlib.decompress(await body.read()).decode()
+    return None
 
-def get_parsed_text(text_id):
+
+async def get_parsed_text(text_id):
     """
     return the *parsed text* for a given textId or none if absent
 
+    doubles as the existence check, hits are served from parsed_text_cache
+
     Parameter
     ---
     text_id: str
@@ -34,62 +106,385 @@ def get_parsed_text(text_id):
     optional str
         the parseText of the dynamoDb item
     """
+    cached = parsed_text_cache.get(text_id)
+    if cached is not None:
+        return cached
+
     try:
-        response = table.get_item(
+        response = await aws.parse_text_table.get_item(
             Key={
                 'textID': text_id
             }
         )
-    except ClientError as e:
-        print(f"Unable to fetch item: {e.response['Error']['Message']}")
-        return None
+        # The returned dict will contain 'Item' if the key was found
+        item = response.get('Item')
+        if not item:
+            logger.debug("No item found with textID=%s", text_id)
+            return None
 
-    # The returned dict will contain 'Item' if the key was found
-    item = response.get('Item')
-    if not item:
-        print(f"No item found with textID={text_id}")
+        # Return the parseText attribute
+        parsed_text = await _unpack_text(item, 'parseText')
+    except ClientError as e:
+        logger.error("Unable to fetch item: %s", e.response['Error']['Message'])
         return None
 
-    # Return the parseText attribute
-    return item.get('parseText')
+    if parsed_text is not None:
+        parsed_text_cache.set(text_id, parsed_text)
+    return parsed_text
 
-def put_parsed_text(text_id, parsed_text):
+async def put_parsed_text(text_id, parsed_text):
     """
     Inserts an item into DynamoDB with partition key textID
     and attribute parseText.
+
+    best effort: the text is already paid for, a failed write is logged and the
+    analysis goes on with the in-process cache
     """
+    parsed_text_cache.set(text_id, parsed_text)
     try:
-        response = table.put_item(
+        response = await aws.parse_text_table.put_item(
             Item={
                 'textID': text_id,        # Partition key
-                'parseText': parsed_text  # Additional attribute
-                # You can add more attributes here as needed
+                **await _pack_text(text_id, 'parseText', parsed_text),
             }
         )
-        print(f"Item inserted (textID={text_id})")
+        logger.debug("Item inserted (textID=%s)", text_id)
         return response
+    except (BotoCoreError, ClientError) as e:
+        logger.error("Failed to insert item %s: %s", text_id, e)
+        return None
+
+
+async def get_parsed_texts(text_ids: list[str]) -> dict[str, str]:
+    """
+    return {textID: parsed text} for the given textIDs that exist, front cache first
+    then dynamodb batch_get_item in batches of 100 keys
+    """
+    found = {}
+    missing = []
+    for text_id in dict.fromkeys(text_ids):
+        cached = parsed_text_cache.get(text_id)
+        if cached is not None:
+            found[text_id] = cached
+        else:
+            missing.append(text_id)
+
+    for start in range(0, len(missing), 100):
+        request = {PARSE_TEXT_TABLE: {'Keys': [{'textID': t} for t in missing[start:start + 100]]}}
+        try:
+            while request:
+                response = await aws.dynamodb.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(PARSE_TEXT_TABLE, []):
+                    parsed_text = await _unpack_text(item, 'parseText')
+                    if parsed_text is None:
+                        continue
+                    found[item['textID']] = parsed_text
+                    parsed_text_cache.set(item['textID'], parsed_text)
+                # throttled keys come back unprocessed, retry them
+                request = response.get('UnprocessedKeys') or None
+        except ClientError as e:
+            logger.error("Unable to fetch items: %s", e.response['Error']['Message'])
+    return found
+
+
+async def put_parsed_texts(parsed_texts: dict[str, str]):
+    """
+    Inserts many textID -> parseText items with a batch writer.
+    """
+    try:
+        async with aws.parse_text_table.batch_writer() as batch:
+            for text_id, parsed_text in parsed_texts.items():
+                await batch.put_item(
+                    Item={'textID': text_id, **await _pack_text(text_id, 'parseText', parsed_text)}
+                )
+        for text_id, parsed_text in parsed_texts.items():
+            parsed_text_cache.set(text_id, parsed_text)
+    except ClientError as e:
+        logger.error("Failed to insert items: %s", e.response['Error']['Message'])
+
+
+def converted_text_id(text_id: str, version: str) -> str:
+    return f"{CONVERTED_TEXT_PREFIX}{text_id}#{version}"
+
+
+async def get_converted_text(text_id: str, version: str) -> Optional[str]:
+    """
+    return the converted text of the parsed text text_id for a conversion version,
+    none on a miss; hits are served from parsed_text_cache
+    """
+    converted_id = converted_text_id(text_id, version)
+    cached = parsed_text_cache.get(converted_id)
+    if cached is not None:
+        return cached
+
+    try:
+        response = await aws.parse_text_table.get_item(Key={'textID': converted_id})
+        converted_text = await _unpack_text(response.get('Item') or {}, 'convertedText')
+    except ClientError as e:
+        logger.error("Unable to fetch converted text: %s", e.response['Error']['Message'])
+        return None
+
+    if converted_text is not None:
+        parsed_text_cache.set(converted_id, converted_text)
+    return converted_text
+
+
+async def put_converted_text(text_id: str, version: str, converted_text: str):
+    """
+    Inserts the converted text of the parsed text text_id for a conversion version.
+    """
+    converted_id = converted_text_id(text_id, version)
+    try:
+        await aws.parse_text_table.put_item(
+            Item={
+                'textID': converted_id,
+                'sourceTextID': text_id,
+                **await _pack_text(converted_id, 'convertedText', converted_text),
+            }
+        )
+        parsed_text_cache.set(converted_id, converted_text)
     except ClientError as e:
-        print(f"Failed to insert item: {e.response['Error']['Message']}")
+        logger.error("Failed to insert converted text: %s", e.response['Error']['Message'])
 
 
-def item_exists(text_id: str) -> bool:
+async def item_exists(text_id: str) -> bool:
     """
     Returns True if an item with partition key 'textID' == text_id exists in the table;
     otherwise returns False.
     """
+    if parsed_text_cache.get(text_id) is not None:
+        return True
+
     try:
-        response = table.get_item(
+        response = await aws.parse_text_table.get_item(
             Key={'textID': text_id},
             ProjectionExpression='textID'  # only fetch the key itself to minimize read cost
         )
     except ClientError as e:
-        # Log the error or re‐raise as needed
-        print(f"Unable to check existence: {e.response['Error']['Message']}")
+        logger.error("Unable to check existence: %s", e.response['Error']['Message'])
         return False
 
     # If the key was found, 'Item' will be present in the response
     return 'Item' in response
 
+
+async def get_cached_result(result_id: str) -> Optional[dict]:
+    """
+    return the cached analysis result for result_id or none if absent or expired
+
+    dynamodb ttl deletion is lazy, so the expiry is checked on read as well
+    """
+    try:
+        response = await aws.analysis_result_table.get_item(Key={'resultID': result_id})
+    except ClientError as e:
+        logger.error("Unable to fetch result: %s", e.response['Error']['Message'])
+        return None
+
+    item = response.get('Item')
+    if not item or int(item.get('expires_at', 0)) < time.time():
+        return None
+    return json.loads(item['result'])
+
+
+async def put_cached_result(result_id: str, text_id: str, result: dict, ttl_seconds: int):
+    """
+    Inserts an analysis result keyed by resultID, expiring after ttl_seconds.
+    """
+    try:
+        return await aws.analysis_result_table.put_item(
+            Item={
+                'resultID': result_id,
+                'textID': text_id,
+                'result': json.dumps(result),
+                'expires_at': int(time.time()) + ttl_seconds,  # dynamodb ttl attribute
+            }
+        )
+    except ClientError as e:
+        logger.error("Failed to insert result: %s", e.response['Error']['Message'])
+
+
+async def delete_cached_result(result_id: str):
+    """
+    Deletes the analysis result keyed by resultID, if any.
+    """
+    try:
+        await aws.analysis_result_table.delete_item(Key={'resultID': result_id})
+    except ClientError as e:
+        logger.error("Failed to delete result: %s", e.response['Error']['Message'])
+
+async def acquire_lease(lease_id: str, owner: str, ttl_seconds: int) -> bool:
+    """
+    Returns True if the caller now holds the lease lease_id, False if another owner
+    holds a lease that has not expired yet.
+    """
+    now = int(time.time())
+    try:
+        await aws.processing_lease_table.put_item(
+            Item={
+                'leaseID': lease_id,
+                'owner': owner,
+                'expires_at': now + ttl_seconds,  # dynamodb ttl attribute
+            },
+            ConditionExpression='attribute_not_exists(leaseID) OR expires_at < :now',
+            ExpressionAttributeValues={':now': now},
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+
+async def renew_lease(lease_id: str, owner: str, ttl_seconds: int) -> bool:
+    """
+    Extends the lease lease_id to expire ttl_seconds from now. Returns False if owner
+    no longer holds it; other errors are logged and the lease is assumed still held.
+    """
+    try:
+        await aws.processing_lease_table.update_item(
+            Key={'leaseID': lease_id},
+            UpdateExpression='SET expires_at = :expires_at',
+            ConditionExpression='#owner = :owner',
+            ExpressionAttributeNames={'#owner': 'owner'},
+            ExpressionAttributeValues={':owner': owner, ':expires_at': int(time.time()) + ttl_seconds},
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        logger.error("Failed to renew lease: %s", e.response['Error']['Message'])
+        return True
+
+
+async def release_lease(lease_id: str, owner: str):
+    """
+    Deletes the lease lease_id if it is still held by owner.
+    """
+    try:
+        await aws.processing_lease_table.delete_item(
+            Key={'leaseID': lease_id},
+            ConditionExpression='#owner = :owner',
+            ExpressionAttributeNames={'#owner': 'owner'},
+            ExpressionAttributeValues={':owner': owner},
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.error("Failed to release lease: %s", e.response['Error']['Message'])
+
+async def put_job(job: dict, ttl_seconds: int):
+    """
+    Inserts a new job record keyed by jobID, expiring after ttl_seconds.
+    """
+    try:
+        await aws.analysis_job_table.put_item(
+            Item={**job, 'expires_at': int(time.time()) + ttl_seconds}  # dynamodb ttl attribute
+        )
+    except ClientError as e:
+        raise DbExecutionError(f"Failed to insert job: {e.response['Error']['Message']}")
+
+
+async def update_job(job_id: str, fields: dict) -> bool:
+    """
+    Sets the given top level attributes of the job job_id, false when the write
+    failed (e.g. a result above the 400 KB item limit).
+    """
+    names = {f'#f{i}': name for i, name in enumerate(fields)}
+    values = {f':v{i}': value for i, value in enumerate(fields.values())}
+    try:
+        await aws.analysis_job_table.update_item(
+            Key={'jobID': job_id},
+            UpdateExpression='SET ' + ', '.join(f'#f{i} = :v{i}' for i in range(len(fields))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except ClientError as e:
+        logger.error("Failed to update job: %s", e.response['Error']['Message'])
+        return False
+    return True
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    """
+    return the job record of job_id or none if absent
+    """
+    try:
+        response = await aws.analysis_job_table.get_item(Key={'jobID': job_id}, ConsistentRead=True)
+    except ClientError as e:
+        logger.error("Unable to fetch job: %s", e.response['Error']['Message'])
+        return None
+    return response.get('Item')
+
+
+async def get_stale_jobs(statuses: tuple[str, ...], updated_before: int) -> list[dict]:
+    """
+    return the jobs in one of statuses last updated before updated_before, scanning
+    the whole table, meant for the rare startup recovery only
+    """
+    jobs = []
+    params = {
+        'FilterExpression': Attr('status').is_in(list(statuses)) & Attr('updated_at').lt(updated_before),
+        'ProjectionExpression': 'jobID',
+    }
+    try:
+        while True:
+            response = await aws.analysis_job_table.scan(**params)
+            jobs.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return jobs
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except ClientError as e:
+        logger.error("Unable to scan jobs: %s", e.response['Error']['Message'])
+        return jobs
+
+async def get_checkpoint_entries(thread_key: str) -> list[dict]:
+    """
+    return the non expired items of the checkpoint thread thread_key, the checkpoint
+    itself and its pending writes
+    """
+    items, kwargs = [], {}
+    try:
+        while True:
+            response = await aws.analysis_checkpoint_table.query(
+                KeyConditionExpression=Key('threadID').eq(thread_key), ConsistentRead=True, **kwargs
+            )
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except ClientError as e:
+        logger.error("Unable to fetch checkpoint: %s", e.response['Error']['Message'])
+        return []
+    now = time.time()
+    return [item for item in items if int(item.get('expires_at', 0)) >= now]
+
+
+async def put_checkpoint_entry(item: dict, ttl_seconds: int, if_absent: bool = False):
+    """
+    Inserts a checkpoint thread item keyed by threadID + entry, expiring after
+    ttl_seconds. With if_absent an existing item is kept.
+    """
+    kwargs = {'ConditionExpression': 'attribute_not_exists(threadID)'} if if_absent else {}
+    try:
+        await aws.analysis_checkpoint_table.put_item(
+            Item={**item, 'expires_at': int(time.time()) + ttl_seconds},  # dynamodb ttl attribute
+            **kwargs,
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise DbExecutionError(f"Failed to insert checkpoint: {e.response['Error']['Message']}")
+
+
+async def delete_checkpoint_entries(thread_key: str, entries: list[str]):
+    """
+    Deletes the given entries of the checkpoint thread thread_key.
+    """
+    try:
+        async with aws.analysis_checkpoint_table.batch_writer() as batch:
+            for entry in entries:
+                await batch.delete_item(Key={'threadID': thread_key, 'entry': entry})
+    except ClientError as e:
+        logger.error("Failed to delete checkpoint: %s", e.response['Error']['Message'])
+
 #%%
 
 def hash_text_sha256(data: Union[str, bytes]) -> str:
@@ -0,0 +1,57 @@
+"""
+Exchange Rate Refresh
+----
+background task re-reading the exchange rates from ssm every
+EXCHANGE_RATE_REFRESH_SECONDS, so new rates are picked up without restarting the
+workers; the result and converted text caches are keyed by the rates and move to
+the new rates on their own
+
+Key Responsibility
+---
+exchange_rate_refresher: start() / stop() called from the app lifespan
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangeRateRefresher:
+    """periodic settings.refresh_exchange_rates in a background task"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """start the refresh loop, no-op when EXCHANGE_RATE_REFRESH_SECONDS is 0"""
+        if settings.EXCHANGE_RATE_REFRESH_SECONDS > 0 and self._task is None:
+            self._task = asyncio.create_task(self._refresh())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh(self) -> None:
+        while True:
+            await asyncio.sleep(settings.EXCHANGE_RATE_REFRESH_SECONDS)
+            previous = settings.EXCHANGE_RATES
+            try:
+                rates = await asyncio.to_thread(settings.refresh_exchange_rates)
+            except Exception as e:
+                # keep serving with the current rates, retried on the next tick
+                logger.error("Exchange rate refresh failed: %s", e)
+                continue
+            if rates != previous:
+                logger.info("Exchange rates changed from %s to %s", previous, rates)
+
+
+# module level singleton, started in the app lifespan
+exchange_rate_refresher = ExchangeRateRefresher()
@@ -0,0 +1,137 @@
+"""
+Fused Analysis Extraction Service
+----
+single call alternative to the six analysis nodes: one json mode completion returns
+every section at once, so the report's input tokens are paid once instead of six times
+
+the output is validated against FusedAnalysis and split back into the GraphState keys
+with the same shapes the fan-out nodes produce, selected per request with the "fused"
+graph variant
+
+This module defines:
+    1. build_fused_analysis_prompt: prompt asking for all six sections in one json object
+    2. run_fused_analysis: LangGraph compatible async node filling all six *_s keys
+"""
+import logging
+from typing import Any, Dict, List
+
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel, Field, ValidationError
+
+from src.services.chunking import map_reduce, merge_keyed
+from src.services.current_insurance import reduce_current_insurance
+from src.services.llm import llm_registry
+from src.services.prompts import build_node_prompt
+from src.services.property_valudation import reduce_property_valuation
+from src.services.risk_percentages import reduce_risk_percentage
+
+logger = logging.getLogger(__name__)
+
+
+class FusedAnalysis(BaseModel):
+    """schema of the fused completion, one field per analysis section"""
+    executive_summary: str = ""
+    risk_percentages: List[Dict[str, Any]] = Field(default_factory=list)
+    business_interruption: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+    current_insurance_gaps: List[Dict[str, Any]] = Field(default_factory=list)
+    multi_currency_risk: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+    insurance_recommendations: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+
+
+# node instructions, placed after the shared document prefix so the report
+# tokens form a prompt prefix common to every node
+FUSED_ANALYSIS_INSTRUCTIONS = r"""
+You are a professional insurance risk analyst with experience in commercial property, public liability, business interruption, coverage and treasury risk.
+
+All amounts in the report text above are already expressed in EUR; keep every currency value in **EUR**.
+
+Produce **one JSON object** with exactly these six top-level keys:
+
+1. **"executive_summary"** → a string summarising total property valuation, business interruption exposure, annual operating costs and historical / forecasted damage costs.
+
+2. **"risk_percentages"** → a list with one object per risk factor that mentions a percentage, probability, "X-in-Y-year" frequency, per-timeframe frequency or correlation, with keys:
+   "risk_name" (concise label), "probability" (exact numeric expression, e.g. "23%", "1-in-25-year"), "context" (time or scope qualifier), "notes".
+
+3. **"business_interruption"** → an object whose keys are BI labels, one entry per statement quantifying lost revenue, extra expense, closure, postponement, disruption or alternate-venue costs, each with keys:
+   "amount_eur" (numeric only), "timeframe", "quote" (verbatim sentence), "notes".
+
+4. **"current_insurance_gaps"** → a list with one object per inadequacy, exclusion or gap of the EXISTING insurance programme ("insufficient", "inadequate", "excludes", "lacks", "gap", "mismatch", "not addressed", ...), with keys:
+   "gap_name" (≤ 8 words), "issue", "quote" (verbatim sentence), "notes".
+
+5. **"multi_currency_risk"** → an object whose keys are multi-currency risk names, one per factor with a percentage, probability, frequency or quantified FX exposure, each with keys:
+   "probability", "context", "notes".
+
+6. **"insurance_recommendations"** → an object whose keys are snake_cased recommendation names, one per distinct insurance recommendation, each with keys:
+   "coverage", "rationale", "timeline", "financial_impact".
+
+Use an empty list or object for a section with no findings. Return **only** the JSON object—no headings and no commentary.
+"""
+
+FUSED_ANALYSIS_PROMPT = build_node_prompt(FUSED_ANALYSIS_INSTRUCTIONS)
+
+
+def build_fused_analysis_prompt() -> PromptTemplate:
+    """return the prompt compiled at import"""
+    return FUSED_ANALYSIS_PROMPT
+
+
+def build_fused_analysis_chain() -> Runnable:
+    """compose prompt | shared llm in json mode | json parser, built once per process"""
+    llm = llm_registry.llm().bind(response_format={"type": "json_object"})
+    return build_fused_analysis_prompt() | llm | JsonOutputParser()
+
+
+def reduce_fused_analysis(results: list) -> dict:
+    """merge per section fused results field by field with the fan-out node reducers"""
+    parsed = [FusedAnalysis.model_validate(result) for result in results]
+    return FusedAnalysis(
+        executive_summary=reduce_property_valuation(
+            [{"executive_summary": p.executive_summary} for p in parsed]
+        )["executive_summary"],
+        risk_percentages=reduce_risk_percentage([p.risk_percentages for p in parsed])["risks"],
+        business_interruption=merge_keyed(p.business_interruption for p in parsed),
+        current_insurance_gaps=reduce_current_insurance(
+            [p.current_insurance_gaps for p in parsed]
+        )["current_insurance_gaps"],
+        multi_currency_risk=merge_keyed(p.multi_currency_risk for p in parsed),
+        insurance_recommendations=merge_keyed(p.insurance_recommendations for p in parsed),
+    ).model_dump()
+
+
+async def run_fused_analysis(state: dict) -> dict:
+    """LangGraph node filling every analysis section with a single llm call
+
+        Returns
+        -------
+        dict
+            the six *_s state keys, shaped like the outputs of the fan-out nodes
+    """
+    logger.info("Current state at logger_node: %s", state)
+    cleaned_text = state.get("converted_text")
+    if not cleaned_text:
+        logger.error("Missing 'converted_text' in state")
+        raise ValueError("Missing 'converted_text' key in state dict")
+
+    # reuse the pre-built chain and its pooled llm client
+    chain: Runnable = llm_registry.chain("fused_analysis", build_fused_analysis_chain)
+
+    try:
+        result = await map_reduce(chain, cleaned_text, reduce_fused_analysis)
+        analysis = FusedAnalysis.model_validate(result)
+    except ValidationError as e:
+        logger.error("Fused analysis output does not match the schema: %s", e)
+        raise
+    except Exception as e:
+        logger.error("Chain invocation failed: %s", e)
+        raise
+
+    return {
+        "property_valuations_s": {"executive_summary": analysis.executive_summary},
+        "risk_percentage_s": {"risks": analysis.risk_percentages},
+        "business_interruption_s": analysis.business_interruption,
+        "current_insurance_s": {"current_insurance_gaps": analysis.current_insurance_gaps},
+        "multi_currency_risk_s": analysis.multi_currency_risk,
+        "insurance_recommendation_s": analysis.insurance_recommendations,
+    }
@@ -8,6 +8,14 @@ Key point
 2. nodes: individual service function
 3. edges: define the workflow between the nodes
 4. end: indicate the end of workflow
+5. variants: named subsets of the analysis nodes, compiled once per worker by
+compile_graphs and shared across requests through get_graph; the "fused" variant
+replaces the six calls with a single one returning every section
+6. resilience: every analysis node runs under a timeout with bounded retries, a node
+still failing after that degrades to empty sections listed in `failed_sections`
+instead of failing the whole run, see resilient_node
+7. checkpoints: the graphs are compiled with the shared checkpointer (see checkpoint),
+a run that failed resumes after its last completed node when retried on the same thread
 
 IMPORTANT:
 first thing I did here is to unify the currency in the report then
@@ -21,8 +29,17 @@ from src.services.current_insurance import run_current_insurance
 from src.services.business_interruption import run_business_interruption
 from src.services.property_valudation import run_property_valuation
 from src.services.risk_percentages import run_risk_percentage
-from typing import TypedDict, Annotated, List, Any
+from src.services.fused_analysis import run_fused_analysis
+from src.services.checkpoint import checkpointer
+from src.core.config import settings
+from exceptions import LLMRateLimitError
+from typing import TypedDict, Annotated, List, Any, Awaitable, Callable
 from langgraph.graph import StateGraph, END
+import asyncio
+import logging
+import operator
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -36,38 +53,129 @@ class GraphState(TypedDict):
     current_insurance_s: str
     multi_currency_risk_s: str
     insurance_recommendation_s: str
+    # one entry per degraded node, concatenated across the parallel branches
+    failed_sections: Annotated[List[dict], operator.add]
 
-async def create_graph() -> Any:
-    """compile and return a Langchian DAG"""
+# analysis nodes fanned out after the currency conversion, keyed by node id
+ANALYSIS_NODES = {
+    "property_valuation": run_property_valuation,
+    "risk_percentage": run_risk_percentage,
+    "business_interruption": run_business_interruption,
+    "current_insurance": run_current_insurance,
+    "multi_currency_risk": run_multy_currency_risk,
+    "insurance_recommendation": run_insurance_recommendation,
+    # single call producing the state keys of all the nodes above
+    "fused_analysis": run_fused_analysis,
+}
+
+# state keys written by every analysis node
+NODE_SECTIONS = {
+    "property_valuation": ("property_valuations_s",),
+    "risk_percentage": ("risk_percentage_s",),
+    "business_interruption": ("business_interruption_s",),
+    "current_insurance": ("current_insurance_s",),
+    "multi_currency_risk": ("multi_currency_risk_s",),
+    "insurance_recommendation": ("insurance_recommendation_s",),
+    "fused_analysis": (
+        "property_valuations_s", "risk_percentage_s", "business_interruption_s",
+        "current_insurance_s", "multi_currency_risk_s", "insurance_recommendation_s",
+    ),
+}
+
+# named graph variants, each one runs the conversion and a subset of the analysis nodes
+GRAPH_VARIANTS = {
+    "full": (
+        "property_valuation", "risk_percentage", "business_interruption",
+        "current_insurance", "multi_currency_risk", "insurance_recommendation",
+    ),
+    "financial": ("property_valuation", "business_interruption", "multi_currency_risk"),
+    "coverage": ("current_insurance", "insurance_recommendation"),
+    "risk": ("risk_percentage",),
+    "fused": ("fused_analysis",),
+}
+
+
+def variant_sections(variant: str) -> list[str]:
+    """state keys of the sections produced by a graph variant, in node order"""
+    return list(dict.fromkeys(s for name in GRAPH_VARIANTS[variant] for s in NODE_SECTIONS[name]))
+
+
+# compiled graphs shared by all requests of the worker, filled by compile_graphs
+_compiled_graphs: dict[str, Any] = {}
+
+
+def resilient_node(name: str, run: Callable[[dict], Awaitable[dict]]) -> Callable[[dict], Awaitable[dict]]:
+    """wrap an analysis node with a timeout, retries and a degraded result
+
+    every attempt is retried NODE_RETRIES times with exponential backoff, including the
+    ones whose provider call ran past NODE_TIMEOUT_SECONDS (enforced by the llm
+    registry, so waiting for the rate limits does not time a node out); after the last
+    failure the node returns empty sections
+    and a `failed_sections` entry so the other branches' results are kept. provider
+    rate limits are not retried here, the llm registry already did and the request
+    is answered with 429
+    """
+    async def node(state: dict) -> dict:
+        for attempt in range(settings.NODE_RETRIES + 1):
+            try:
+                return await run(state)
+            except LLMRateLimitError:
+                raise
+            except Exception as e:
+                error = str(e)
+                if isinstance(e, asyncio.TimeoutError):
+                    error = f"timed out after {settings.NODE_TIMEOUT_SECONDS}s"
+                if attempt < settings.NODE_RETRIES:
+                    delay = settings.NODE_RETRY_BACKOFF_SECONDS * 2 ** attempt
+                    logger.warning("Node %s failed (%s), retry %d in %.1fs", name, error, attempt + 1, delay)
+                    await asyncio.sleep(delay)
+        logger.error("Node %s failed after %d attempts, degrading: %s", name, settings.NODE_RETRIES + 1, error)
+        return {
+            **{section: {} for section in NODE_SECTIONS[name]},
+            "failed_sections": [{"node": name, "sections": list(NODE_SECTIONS[name]), "error": error}],
+        }
+
+    return node
+
+
+def build_graph(nodes: tuple[str, ...] = GRAPH_VARIANTS["full"]) -> Any:
+    """compile and return a Langchian DAG running `nodes` after the conversion"""
     graph = StateGraph(GraphState)
 
     # define the add and its related id that should match the id used in edge
     graph.add_node("convert_currency", run_currency_conversion)
-    graph.add_node("property_valuation", run_property_valuation)
-    graph.add_node("risk_percentage", run_risk_percentage)
-    graph.add_node("business_interruption", run_business_interruption)
-    graph.add_node("current_insurance", run_current_insurance)
-    graph.add_node("multi_currency_risk", run_multy_currency_risk)
-    graph.add_node("insurance_recommendation", run_insurance_recommendation)
+    for name in nodes:
+        graph.add_node(name, resilient_node(name, ANALYSIS_NODES[name]))
 
     # entry point to graph
     graph.set_entry_point("convert_currency")
 
     # define the relation between nodes and make the workflow parallel to reduce latency
-    graph.add_edge("convert_currency", "property_valuation")
-    graph.add_edge("convert_currency", "risk_percentage")
-    graph.add_edge("convert_currency", "business_interruption")
-    graph.add_edge("convert_currency", "current_insurance")
-    graph.add_edge("convert_currency", "multi_currency_risk")
-    graph.add_edge("convert_currency", "insurance_recommendation")
-
-    graph.add_edge("property_valuation", END)
-    graph.add_edge("risk_percentage", END)
-    graph.add_edge("business_interruption", END)
-    graph.add_edge("current_insurance", END)
-    graph.add_edge("multi_currency_risk", END)
-    graph.add_edge("insurance_recommendation", END)
-
-    # Compile and return
-    dag = graph.compile()
-    return dag
\ No newline at end of file
+    for name in nodes:
+        graph.add_edge("convert_currency", name)
+        graph.add_edge(name, END)
+
+    # Compile and return, checkpointing every step when a store is configured
+    return graph.compile(checkpointer=checkpointer)
+
+
+async def create_graph() -> Any:
+    """compile and return the full Langchian DAG"""
+    return build_graph()
+
+
+def compile_graphs() -> dict[str, Any]:
+    """precompile every graph variant once, called from the app lifespan"""
+    for variant, nodes in GRAPH_VARIANTS.items():
+        if variant not in _compiled_graphs:
+            _compiled_graphs[variant] = build_graph(nodes)
+    return _compiled_graphs
+
+
+def get_graph(variant: str = "full") -> Any:
+    """return the shared compiled graph of `variant`, compiling it on first use"""
+    if variant not in GRAPH_VARIANTS:
+        raise KeyError(f"Unknown graph variant: {variant}")
+    if variant not in _compiled_graphs:
+        _compiled_graphs[variant] = build_graph(GRAPH_VARIANTS[variant])
+    return _compiled_graphs[variant]
@@ -0,0 +1,105 @@
+"""
+Streaming Upload Ingest
+----
+stages an uploaded pdf to a local temp file chunk by chunk while hashing it, so the
+request never holds the whole document in memory
+
+Key Responsibility
+---
+StagedUpload: a pdf staged on local disk with its sha-256 digest and size
+stage_upload: stream an UploadFile to disk, hashing incrementally and enforcing a
+maximum size
+stage_s3_object: same for an object already stored in settings.S3_BUCKET
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from fastapi import UploadFile
+
+from exceptions import UploadTooLargeError
+from src.core.aws import aws
+from src.core.config import settings
+
+
+@dataclass
+class StagedUpload:
+    """a pdf staged on local disk"""
+    path: str
+    digest: str
+    size: int
+    filename: str
+    # set once a shared pipeline task took over the file and its cleanup
+    claimed: bool = False
+
+    def cleanup(self) -> None:
+        """delete the staged file, safe to call more than once"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def stage_upload(file: UploadFile, max_bytes: Optional[int] = None) -> StagedUpload:
+    """stream `file` to a temp file in UPLOAD_CHUNK_BYTES chunks and hash it on the way
+
+    Parameter
+    ----
+    file: UploadFile
+        the multipart upload
+    max_bytes: int
+        reject the upload with UploadTooLargeError beyond this size, defaults to
+        settings.MAX_UPLOAD_BYTES
+
+    Returns
+    ----
+    StagedUpload
+        the staged file, the caller owns it and must clean it up
+    """
+    async def chunks():
+        while chunk := await file.read(settings.UPLOAD_CHUNK_BYTES):
+            yield chunk
+
+    return await _stage(chunks(), file.filename, max_bytes or settings.MAX_UPLOAD_BYTES)
+
+
+async def stage_s3_object(key: str, max_bytes: Optional[int] = None) -> StagedUpload:
+    """stream the object `key` of settings.S3_BUCKET to a temp file and hash it, see
+    stage_upload; the object key is used as filename"""
+    max_bytes = max_bytes or settings.MAX_UPLOAD_BYTES
+    response = await aws.s3.get_object(Bucket=settings.S3_BUCKET, Key=key)
+    body = response["Body"]
+    try:
+        if response.get("ContentLength", 0) > max_bytes:
+            raise UploadTooLargeError(f"{key} exceeds the {max_bytes} bytes upload limit")
+
+        async def chunks():
+            while chunk := await body.read(settings.UPLOAD_CHUNK_BYTES):
+                yield chunk
+
+        return await _stage(chunks(), key, max_bytes)
+    finally:
+        body.close()
+
+
+async def _stage(chunks: AsyncIterator[bytes], filename: str, max_bytes: int) -> StagedUpload:
+    """write `chunks` to a new temp file, hashing them and enforcing `max_bytes`"""
+    sha256 = hashlib.sha256()
+    size = 0
+
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=settings.UPLOAD_STAGING_DIR)
+    try:
+        with os.fdopen(fd, "wb") as staged:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"{filename} exceeds the {max_bytes} bytes upload limit")
+                sha256.update(chunk)
+                staged.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return StagedUpload(path=path, digest=sha256.hexdigest(), size=size, filename=filename)
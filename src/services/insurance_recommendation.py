@@ -9,19 +9,28 @@ This module exposes two callables:
 """
 import logging
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import JsonOutputParser
-from src.core.config import settings
+from src.services.chunking import map_reduce, merge_keyed, merge_lists
+from src.services.llm import llm_registry
+from src.services.prompts import build_node_prompt
+from src.services.section_index import relevant_text
 
 logger = logging.getLogger(__name__)
 
-def build_insurance_recommendation_prompt() -> PromptTemplate:
-    prompt_str = r"""
+# marker phrases of the prompt, used to route only the matching passages to this node
+RELEVANCE_MARKERS = (
+    "recommend", "recommendation", "should", "cover", "coverage", "limit", "parametric",
+    "premium", "indemnity", "priority", "timeline", "bind", "insurance",
+)
+
+# node instructions, placed after the shared document prefix so the report
+# tokens form a prompt prefix common to every node
+INSURANCE_RECOMMENDATION_INSTRUCTIONS = r"""
 You are an expert insurance analyst.
 
 TASK  
-From the text block provided {cleaned_text}, identify every *distinct insurance recommendation* and extract the following four fields for each:
+From the report text above, identify every *distinct insurance recommendation* and extract the following four fields for each:
 
 1. **Coverage & Structure** – a short label that states the type of cover, limit, and any key structural features (e.g., “Parametric weather cover – £1 m per trigger”).
 2. **Business Rationale** – one or two sentences explaining *why* the cover is needed (drivers such as severity, probability, regulatory needs, etc.).
@@ -46,7 +55,27 @@ EXAMPLE OUTPUT
   }},
   …
 """
-    return PromptTemplate(input_variables=["cleaned_text"], template=prompt_str)
+
+INSURANCE_RECOMMENDATION_PROMPT = build_node_prompt(INSURANCE_RECOMMENDATION_INSTRUCTIONS)
+
+
+def build_insurance_recommendation_prompt() -> PromptTemplate:
+    """return the prompt compiled at import"""
+    return INSURANCE_RECOMMENDATION_PROMPT
+
+def build_insurance_recommendation_chain() -> Runnable:
+    """compose prompt | shared llm | json parser, built once per process"""
+    return build_insurance_recommendation_prompt() | llm_registry.llm() | JsonOutputParser()
+
+def reduce_insurance_recommendation(results: list) -> dict:
+    """merge the keyed recommendations of every section; list shaped section results are
+    concatenated under "risks", the way a single section list is wrapped"""
+    merged = merge_keyed(r for r in results if isinstance(r, dict))
+    lists = [r for r in results if isinstance(r, list)]
+    if lists:
+        merged["risks"] = merge_lists([merged.get("risks", []), *lists], "risks")["risks"]
+    return merged
+
 
 async def run_insurance_recommendation(state: dict) -> dict:
     """LangGraph node to extract insurance recommendations and merge into state"""
@@ -56,24 +85,18 @@ async def run_insurance_recommendation(state: dict) -> dict:
         logger.error("Missing 'converted_text' in state")
         raise ValueError("Missing 'converted_text' key in state dict")
 
-    prompt = build_insurance_recommendation_prompt()
-    parser = JsonOutputParser()
-
-    llm = ChatGroq(
-        model="llama-3.3-70b-versatile",
-        temperature=0.2,
-        groq_api_key=settings.GROQ_API_KEY
-    )
-
-    chain: Runnable = prompt | llm | parser
+    # reuse the pre-built chain and its pooled llm client
+    chain: Runnable = llm_registry.chain("insurance_recommendation", build_insurance_recommendation_chain)
 
     try:
-        result = await chain.ainvoke({"cleaned_text": cleaned_text})
+        # only the passages matching the markers when the relevance filter is on
+        cleaned_text = relevant_text(cleaned_text, RELEVANCE_MARKERS, "insurance_recommendation")
+        result = await map_reduce(chain, cleaned_text, reduce_insurance_recommendation)
         if isinstance(result, list):
             wrapped = {"risks": result}
         else:
             wrapped = result
-        return {"insurance_recommendation_s": result}
+        return {"insurance_recommendation_s": wrapped}
     except Exception as e:
         logger.error("Chain invocation failed: %s", e)
         raise
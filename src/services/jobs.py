@@ -0,0 +1,254 @@
+"""
+Asynchronous Analysis Jobs
+----
+job model next to the synchronous upload endpoint: the api stages the pdf, records a
+job and returns its id straight away, a pool of background workers takes the jobs off
+a bounded queue and runs them through the regular pipeline while the client polls
+
+job records live in the dynamodb `analysisJob` table, or in a local sqlite file with
+JOB_STORE=sqlite, and track the status, the progress of every pipeline stage, the
+sections already produced and finally the result or the error
+
+Key Responsibility
+---
+job_store: persistent job records, dynamodb or sqlite
+job_workers: queue + worker tasks, started and stopped in the app lifespan; on start
+the jobs left queued or running by a worker that went away are failed
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from typing import Optional
+
+from exceptions import JobQueueFullError
+from src.core.config import settings
+from src.services.db import get_job, get_stale_jobs, put_job, update_job
+from src.services.graph import variant_sections
+from src.services.ingest import StagedUpload
+from src.services.pipeline import analyse_document
+from src.services.rate_limit import BATCH, llm_priority
+
+logger = logging.getLogger(__name__)
+
+# job statuses, in lifecycle order
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class DynamoJobStore:
+    """job records in the analysisJob table"""
+
+    async def create(self, job: dict) -> None:
+        await put_job(job, settings.JOB_TTL_SECONDS)
+
+    async def update(self, job_id: str, fields: dict) -> bool:
+        return await update_job(job_id, fields)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await get_job(job_id)
+
+    async def stale(self, updated_before: int) -> list[str]:
+        jobs = await get_stale_jobs((QUEUED, RUNNING), updated_before)
+        return [job["jobID"] for job in jobs]
+
+
+class SqliteJobStore:
+    """job records as json documents in a local sqlite file, for running without aws"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs "
+            "(jobID TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at INTEGER NOT NULL)"
+        )
+        return conn
+
+    def _create(self, job: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs VALUES (?, ?, ?)",
+                (job["jobID"], json.dumps(job), int(time.time()) + settings.JOB_TTL_SECONDS),
+            )
+
+    def _update(self, job_id: str, fields: dict) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE jobID = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute(
+                "UPDATE jobs SET data = ? WHERE jobID = ?",
+                (json.dumps({**json.loads(row[0]), **fields}), job_id),
+            )
+        return True
+
+    def _get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data FROM jobs WHERE jobID = ? AND expires_at >= ?", (job_id, int(time.time()))
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _stale(self, updated_before: int) -> list[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT jobID, data FROM jobs WHERE expires_at >= ?", (int(time.time()),)
+            ).fetchall()
+        stale = []
+        for job_id, data in rows:
+            job = json.loads(data)
+            if job["status"] in (QUEUED, RUNNING) and job["updated_at"] < updated_before:
+                stale.append(job_id)
+        return stale
+
+    async def create(self, job: dict) -> None:
+        await asyncio.to_thread(self._create, job)
+
+    async def update(self, job_id: str, fields: dict) -> bool:
+        return await asyncio.to_thread(self._update, job_id, fields)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def stale(self, updated_before: int) -> list[str]:
+        """ids of the queued or running jobs last updated before `updated_before`"""
+        return await asyncio.to_thread(self._stale, updated_before)
+
+
+class JobWorkerPool:
+    """JOB_WORKERS tasks analysing the queued jobs, at most JOB_QUEUE_SIZE waiting"""
+
+    def __init__(self, store):
+        self.store = store
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._recovery: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """start the worker tasks and the stale job recovery, safe to call more than once"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.JOB_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(settings.JOB_WORKERS)]
+        self._recovery = asyncio.create_task(self._fail_stale_jobs())
+
+    async def stop(self) -> None:
+        """stop the workers, jobs still queued are failed and their files removed"""
+        tasks = [*self._workers, *([self._recovery] if self._recovery else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers, self._recovery = [], None
+        while self._queue is not None and not self._queue.empty():
+            job_id, staged, _ = self._queue.get_nowait()
+            staged.cleanup()
+            await self._set(job_id, status=FAILED, error="Worker shut down before the job started")
+
+    async def submit(self, staged: StagedUpload, variant: str) -> dict:
+        """record a queued job for a staged pdf and hand it to the workers
+
+        Raises
+        ---
+        JobQueueFullError
+            the queue is full (or the pool is not running), the staged file is removed
+        """
+        if self._queue is None or self._queue.full():
+            staged.cleanup()
+            raise JobQueueFullError("Too many queued jobs, retry later")
+
+        now = int(time.time())
+        job = {
+            "jobID": str(uuid.uuid4()),
+            "status": QUEUED,
+            "variant": variant,
+            "digest": staged.digest,
+            "filename": staged.filename,
+            "stages": {},
+            "sections": [],
+            "created_at": now,
+            "updated_at": now,
+        }
+        try:
+            await self.store.create(job)
+        except Exception:
+            staged.cleanup()
+            raise
+        self._queue.put_nowait((job["jobID"], staged, variant))
+        return job
+
+    async def _set(self, job_id: str, **fields) -> bool:
+        """update the job record, false when the store could not write it"""
+        return await self.store.update(job_id, {**fields, "updated_at": int(time.time())})
+
+    async def _fail_stale_jobs(self) -> None:
+        """fail the jobs a restarted or crashed worker left queued or running; a live job
+        updates its record with every stage and section, so JOB_STALE_SECONDS without an
+        update means nobody is working on it anymore"""
+        try:
+            stale = await self.store.stale(int(time.time()) - settings.JOB_STALE_SECONDS)
+            for job_id in stale:
+                await self._set(job_id, status=FAILED, error="Worker stopped before the job finished")
+        except Exception as e:
+            logger.error("Stale job recovery failed: %s", e)
+            return
+        if stale:
+            logger.warning("Failed %d stale jobs: %s", len(stale), stale)
+
+    async def _work(self) -> None:
+        # interactive uploads get their llm calls admitted first
+        llm_priority.set(BATCH)
+        while True:
+            job_id, staged, variant = await self._queue.get()
+            try:
+                await self._run(job_id, staged, variant)
+            except Exception as e:
+                logger.error("Job %s could not be recorded: %s", job_id, e)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, staged: StagedUpload, variant: str) -> None:
+        stages, sections, failed = {}, [], []
+
+        async def progress(event: str, data: dict) -> None:
+            if event == "stage":
+                stages[data["stage"]] = data["status"]
+                await self._set(job_id, stages=dict(stages))
+            elif event == "section":
+                sections.append(data["section"])
+                await self._set(job_id, sections=list(sections))
+            elif event == "section_failed":
+                failed.append(data)
+                await self._set(job_id, failed_sections=list(failed))
+
+        try:
+            await self._set(job_id, status=RUNNING)
+            response = await analyse_document(staged, variant, progress)
+        except Exception as e:
+            logger.error("Job %s failed: %s", job_id, e)
+            await self._set(job_id, status=FAILED, error=str(e))
+            return
+        finally:
+            # removed by analyse_document, unless recording the status failed before it ran
+            if not staged.claimed:
+                staged.cleanup()
+        failed_sections = {s for f in response.failed_sections for s in f.sections}
+        try:
+            stored = await self._set(
+                job_id, status=SUCCEEDED, result=response.model_dump_json(),
+                sections=[s for s in variant_sections(variant) if s not in failed_sections],
+            )
+        except Exception as e:
+            logger.error("Job %s result could not be stored: %s", job_id, e)
+            stored = False
+        if not stored:
+            # never leave a finished job running, the result itself stays in the result cache
+            await self._set(job_id, status=FAILED, error="The analysis finished but its result could not be stored")
+
+
+# module level singletons, the pool is started in the app lifespan
+job_store = SqliteJobStore(settings.JOB_SQLITE_PATH) if settings.JOB_STORE == "sqlite" else DynamoJobStore()
+job_workers = JobWorkerPool(job_store)
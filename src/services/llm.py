@@ -0,0 +1,142 @@
+"""
+Shared LLM Client Registry
+----
+process wide registry for the chat models used by the langgraph nodes
+
+Key Responsibility
+---
+llm: return one cached chat model per model, all of them sharing a keep-alive http pool;
+ChatGroq by default, ChatOpenAI for an openai compatible backend (LLM_PROVIDER=openai)
+prompt_cache_key: per document key sent to the openai backend so the calls sharing a
+document prefix are routed to the same prompt cache
+chain: build a node's prompt | llm | parser chain once and reuse it for every document
+slot: bound the number of in flight calls per model, admitted by priority and rate
+limit through the governor (see rate_limit)
+ainvoke: run a chain inside a slot with a timeout of NODE_TIMEOUT_SECONDS, backing off
+and retrying on provider 429s
+aclose: close the shared http pools on shutdown
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+import httpx
+from langchain_core.runnables import ConfigurableField, Runnable
+from langchain_groq import ChatGroq
+from langchain_openai import ChatOpenAI
+
+from exceptions import LLMRateLimitError
+from src.core.config import settings
+from src.services.rate_limit import estimate_call_tokens, governor, rate_limit_delay
+
+# groq completions for long reports can take a while, keep the read timeout generous
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+# set per document by the pipeline, read by every llm call of the run
+prompt_cache_key: ContextVar[Optional[str]] = ContextVar("prompt_cache_key", default=None)
+
+
+class LLMRegistry:
+    """lazily creates and caches llm clients, chains and concurrency limits"""
+
+    def __init__(self):
+        self._llms: Dict[str, Runnable] = {}
+        self._chains: Dict[str, Runnable] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+        )
+
+    def llm(self, model: Optional[str] = None) -> Runnable:
+        """return the shared chat model for `model` (defaults to settings.LLM_MODEL)"""
+        model = model or settings.LLM_MODEL
+        if model not in self._llms:
+            if self._http_async_client is None:
+                self._http_client = httpx.Client(limits=self._limits(), timeout=HTTP_TIMEOUT)
+                self._http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=HTTP_TIMEOUT)
+            if settings.LLM_PROVIDER == "openai":
+                self._llms[model] = ChatOpenAI(
+                    model=model,
+                    temperature=settings.LLM_TEMPERATURE,
+                    api_key=settings.OPENAI_API_KEY,
+                    base_url=settings.OPENAI_BASE_URL,
+                    http_client=self._http_client,
+                    http_async_client=self._http_async_client,
+                ).configurable_fields(extra_body=ConfigurableField(id="extra_body"))
+            else:
+                self._llms[model] = ChatGroq(
+                    model=model,
+                    temperature=settings.LLM_TEMPERATURE,
+                    groq_api_key=settings.GROQ_API_KEY,
+                    http_client=self._http_client,
+                    http_async_client=self._http_async_client,
+                )
+        return self._llms[model]
+
+    def chain(self, name: str, factory: Callable[[], Runnable]) -> Runnable:
+        """return the pre-built chain registered under `name`, building it on first use"""
+        if name not in self._chains:
+            self._chains[name] = factory()
+        return self._chains[name]
+
+    @asynccontextmanager
+    async def slot(self, model: Optional[str] = None, cost: int = 0):
+        """wait for the rate limits to allow `cost` tokens and for a free call slot of
+        `model` before talking to the provider"""
+        model = model or settings.LLM_MODEL
+        if model not in self._semaphores:
+            limit = settings.LLM_MODEL_CONCURRENCY.get(model, settings.LLM_MAX_CONCURRENCY)
+            self._semaphores[model] = asyncio.Semaphore(limit)
+        semaphore = self._semaphores[model]
+        async with governor.admit(model, cost):
+            await semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    async def ainvoke(self, chain: Runnable, inputs: dict, model: Optional[str] = None):
+        """invoke `chain` asynchronously inside a call slot of `model`
+
+        the call itself is bounded by NODE_TIMEOUT_SECONDS once admitted, raising
+        asyncio.TimeoutError; a 429 of the provider blocks the model for its retry-after in every worker and
+        the call is retried up to LLM_RATE_LIMIT_RETRIES times before LLMRateLimitError
+        """
+        model = model or settings.LLM_MODEL
+        config = None
+        key = prompt_cache_key.get()
+        if key and settings.LLM_PROVIDER == "openai":
+            config = {"configurable": {"extra_body": {"prompt_cache_key": key}}}
+        cost = estimate_call_tokens(chain, inputs)
+        for attempt in range(settings.LLM_RATE_LIMIT_RETRIES + 1):
+            async with self.slot(model, cost):
+                try:
+                    return await asyncio.wait_for(
+                        chain.ainvoke(inputs, config=config), settings.NODE_TIMEOUT_SECONDS,
+                    )
+                except Exception as e:
+                    delay = rate_limit_delay(e)
+                    if delay is None:
+                        raise
+                    if attempt == settings.LLM_RATE_LIMIT_RETRIES:
+                        raise LLMRateLimitError(f"Rate limited by the llm provider on {model}: {e}", delay) from e
+            await governor.penalise(model, delay)
+
+    async def aclose(self) -> None:
+        """close the shared http pools and drop every cached client"""
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_client.close()
+        self._http_client = self._http_async_client = None
+        self._llms.clear()
+        self._chains.clear()
+
+
+# module level singleton like settings
+llm_registry = LLMRegistry()
@@ -9,17 +9,26 @@ Multi-Currency Risk Extraction Service
 """
 import logging
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import JsonOutputParser
-from src.core.config import settings
+from src.services.chunking import map_reduce, merge_keyed
+from src.services.llm import llm_registry
+from src.services.prompts import build_node_prompt
+from src.services.section_index import relevant_text
 
 logger = logging.getLogger(__name__)
 
-def build_multi_currency_risk_prompt() -> PromptTemplate:
-    prompt_str = r"""
+# marker phrases of the prompt, used to route only the matching passages to this node
+RELEVANCE_MARKERS = (
+    "currency", "exchange rate", "fx", "foreign exchange", "GBP", "USD", "EUR", "fluctuation",
+    "hedge", "%", "probability", "exposure",
+)
+
+# node instructions, placed after the shared document prefix so the report
+# tokens form a prompt prefix common to every node
+MULTI_CURRENCY_RISK_INSTRUCTIONS = r"""
 You are a professional treasury-risk analyst.  
-Find every multi-currency risk factor in the text that contains a percentage, probability, frequency, or quantified FX exposure.
+Find every multi-currency risk factor in the report text above that contains a percentage, probability, frequency, or quantified FX exposure.
 
 Return **one JSON object** whose **top-level keys are the risk names** and whose values are dictionaries with exactly these keys:
 - probability
@@ -35,11 +44,18 @@ Example output:
     "notes": ""
   }}
 }}
-Here is the report excerpt to analyse:
-
-{cleaned_text}
 """
-    return PromptTemplate(input_variables=["cleaned_text"], template=prompt_str)
+
+MULTI_CURRENCY_RISK_PROMPT = build_node_prompt(MULTI_CURRENCY_RISK_INSTRUCTIONS)
+
+
+def build_multi_currency_risk_prompt() -> PromptTemplate:
+    """return the prompt compiled at import"""
+    return MULTI_CURRENCY_RISK_PROMPT
+
+def build_multi_currency_risk_chain() -> Runnable:
+    """compose prompt | shared llm | json parser, built once per process"""
+    return build_multi_currency_risk_prompt() | llm_registry.llm() | JsonOutputParser()
 
 async def run_multy_currency_risk(state: dict) -> dict:
     """LangGraph node to extract multi‑currency risks and merge into state."""
@@ -49,19 +65,13 @@ async def run_multy_currency_risk(state: dict) -> dict:
         logger.error("Missing 'converted_text' in state")
         raise ValueError("Missing 'converted_text' key in state dict")
 
-    prompt = build_multi_currency_risk_prompt()
-    parser = JsonOutputParser()
-
-    llm = ChatGroq(
-        model="llama-3.3-70b-versatile",
-        temperature=0.2,
-        groq_api_key=settings.GROQ_API_KEY
-    )
-
-    chain: Runnable = prompt | llm | parser
+    # reuse the pre-built chain and its pooled llm client
+    chain: Runnable = llm_registry.chain("multi_currency_risk", build_multi_currency_risk_chain)
 
     try:
-        result = await chain.ainvoke({"cleaned_text": cleaned_text})
+        # only the passages matching the markers when the relevance filter is on
+        cleaned_text = relevant_text(cleaned_text, RELEVANCE_MARKERS, "multi_currency_risk")
+        result = await map_reduce(chain, cleaned_text, merge_keyed)
     except Exception as e:
         logger.error("Chain invocation failed: %s", e)
         raise
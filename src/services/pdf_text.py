@@ -0,0 +1,191 @@
+"""
+Local PDF Text Layer Extraction
+----
+fast path in front of textract: born-digital pdfs already embed their text, so it is
+pulled locally with pypdf, page ranges in parallel across a process pool, and every
+page gets a quality score. only scanned or low quality pages still need ocr
+
+Key Responsibility
+---
+score_page_text: 0..1 heuristic of how usable an extracted page text is
+extract_text_layer: extract every page of a local pdf and flag the pages needing ocr
+page_count: number of pages of a local pdf, 0 if it cannot be parsed
+page_digests: content hash of every page, used to cache ocr results per page
+write_pages: copy a subset of the pages into a new in-memory pdf
+shutdown_pool: stop the worker processes on app shutdown
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from pypdf import PdfReader, PdfWriter
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# below this many characters a page with images is treated as scanned
+MIN_PAGE_CHARS = 40
+
+# glyphs pypdf emits when a font has no usable unicode mapping
+_UNMAPPED_RE = re.compile(r"\(cid:\d+\)|�")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class TextLayer:
+    """text of every page plus the (0 based) pages that still need ocr"""
+    pages: List[str]
+    low_quality: List[int] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.pages)
+
+
+def score_page_text(text: str, has_images: bool = True) -> float:
+    """score extracted page text between 0 (garbage or missing) and 1 (clean prose)
+
+    penalises unmapped glyphs, tokens that are mostly symbols and letter spaced text
+    ("T h i s") that broken font encodings produce; a page with neither text nor
+    images is blank and scores 1
+    """
+    stripped = text.strip()
+    if not stripped:
+        return 0.0 if has_images else 1.0
+    if len(stripped) < MIN_PAGE_CHARS and has_images:
+        return 0.0
+
+    tokens = stripped.split()
+    alnum_tokens = sum(1 for t in tokens if sum(c.isalnum() for c in t) >= 0.6 * len(t))
+    single_chars = sum(1 for t in tokens if len(t) == 1)
+    unmapped = len(_UNMAPPED_RE.findall(stripped))
+
+    score = alnum_tokens / len(tokens)
+    score -= unmapped / len(tokens)
+    score -= max(0.0, single_chars / len(tokens) - 0.3)
+    return max(0.0, min(1.0, score))
+
+
+def _page_count(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[tuple[str, bool]]:
+    """worker process: (text, has_images) of pages [start, stop)"""
+    reader = PdfReader(path)
+    pages = []
+    for page in reader.pages[start:stop]:
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""
+        resources = page.get("/Resources") or {}
+        has_images = "/XObject" in resources
+        pages.append((text, has_images))
+    return pages
+
+
+def _page_digest(page) -> str:
+    """hash of what is drawn on a page: content streams, images/forms and page box"""
+    sha256 = hashlib.sha256(str(page.mediabox).encode())
+    contents = page.get_contents()
+    if contents is not None:
+        sha256.update(contents.get_data())
+    xobjects = (page.get("/Resources") or {}).get("/XObject") or {}
+    for name in sorted(xobjects):
+        sha256.update(name.encode())
+        sha256.update(xobjects[name].get_object().get_data())
+    return sha256.hexdigest()
+
+
+def _page_digests(path: str) -> List[str]:
+    """worker process: digest of every page"""
+    return [_page_digest(page) for page in PdfReader(path).pages]
+
+
+def _write_pages(path: str, numbers: List[int]) -> bytes:
+    """worker process: new pdf holding the (0 based) pages `numbers`"""
+    reader = PdfReader(path)
+    writer = PdfWriter()
+    for number in numbers:
+        writer.add_page(reader.pages[number])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.PDF_EXTRACT_WORKERS)
+    return _pool
+
+
+async def extract_text_layer(path: str) -> Optional[TextLayer]:
+    """extract the embedded text of a local pdf, none if the file cannot be parsed
+
+    Parameter
+    ---
+    path: str
+        local path of the pdf
+
+    Return
+    ---
+    TextLayer
+        page texts and the pages scoring below PDF_TEXT_MIN_QUALITY
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        count = await loop.run_in_executor(pool, _page_count, path)
+        step = settings.PDF_PAGES_PER_TASK
+        ranges = await asyncio.gather(*(
+            loop.run_in_executor(pool, _extract_range, path, start, min(start + step, count))
+            for start in range(0, count, step)
+        ))
+    except Exception as e:
+        # encrypted or malformed pdf, let textract deal with it
+        logger.warning("Local pdf text extraction failed: %s", e)
+        return None
+
+    layer = TextLayer(pages=[])
+    for number, (text, has_images) in enumerate(page for chunk in ranges for page in chunk):
+        layer.pages.append(text)
+        if score_page_text(text, has_images) < settings.PDF_TEXT_MIN_QUALITY:
+            layer.low_quality.append(number)
+    logger.info("Local text layer: %d pages, %d need ocr", len(layer.pages), len(layer.low_quality))
+    return layer
+
+
+async def page_count(path: str) -> int:
+    """number of pages of a local pdf, 0 when the file cannot be parsed"""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_pool(), _page_count, path)
+    except Exception as e:
+        logger.warning("Unable to count pdf pages: %s", e)
+        return 0
+
+
+async def page_digests(path: str) -> List[str]:
+    """content digest of every page of a local pdf, computed in the process pool"""
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), _page_digests, path)
+
+
+async def write_pages(path: str, numbers: List[int]) -> bytes:
+    """bytes of a new pdf holding the (0 based) pages `numbers` of a local pdf"""
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), _write_pages, path, numbers)
+
+
+def shutdown_pool() -> None:
+    """stop the extraction worker processes"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
@@ -0,0 +1,360 @@
+"""
+Document Analysis Pipeline
+----
+runs one pdf through the whole workflow behind the upload endpoint:
+result cache -> parsed text cache or (local text layer, then s3 upload -> textract
+for the pages without usable text, fanned out per page range for large reports)
+-> langgraph dag
+
+concurrent requests for the same content hash share one computation, inside the
+worker through a SingleFlight and, when SINGLE_FLIGHT_LEASE_ENABLED is set, across
+workers through a dynamodb lease: the lease holder computes the result, renewing the
+lease for as long as it runs, while the others poll the result cache for it
+
+documents arrive as StagedUpload files (see ingest), the task that runs the analysis
+owns the staged file and deletes it once done
+
+an optional async `progress(event, data)` callback is told about every stage ("stage"
+events for the caches, s3, textract and the currency conversion) and every analysis
+section as soon as its node completes ("section" events, "section_failed" for a node
+degraded after its retries); a caller joining an analysis already in flight only
+receives the final result
+
+a run with failed sections is returned but not cached, rerun_section runs one node
+again against the document's parsed text
+
+the dag is checkpointed on a thread keyed by the result cache key: a run that raised
+after some nodes completed resumes from there on the next attempt of the same
+document and variant, and the thread is dropped once a run completes
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from exceptions import S3UploadError, TextractParseError, GraphExecutionError, LLMRateLimitError
+from src.core.config import settings
+from src.dto.UploadPdfResponse import SectionRerunResponse, UploadPdfResponse
+from src.services.db import acquire_lease, get_parsed_text, put_parsed_text, release_lease, renew_lease
+from src.services.currency_convertion import run_currency_conversion
+from src.services.checkpoint import checkpointer
+from src.services.graph import ANALYSIS_NODES, GRAPH_VARIANTS, NODE_SECTIONS, get_graph, resilient_node
+from src.services.ingest import StagedUpload
+from src.services.llm import prompt_cache_key
+from src.services.result_cache import (
+    get_cached_response, get_partial_response, promote_response, put_partial_response, result_cache_key,
+)
+from src.services.pdf_text import TextLayer, extract_text_layer, page_count
+from src.services.textract_client import parse_pdf_pages_via_textract
+from src.services.textract_fanout import ocr_pages, textract_job_slots
+from src.utils.s3 import upload_pdf_to_s3
+from src.utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# in flight analyses of this worker keyed by (digest, variant)
+_in_flight = SingleFlight()
+
+# async callback receiving (event, data) progress notifications of one analysis
+Progress = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+async def _notify(progress: Optional[Progress], event: str, **data) -> None:
+    if progress is not None:
+        await progress(event, data)
+
+
+async def analyse_document(
+    staged: StagedUpload, variant: str = "full", progress: Optional[Progress] = None,
+) -> UploadPdfResponse:
+    """analyse a staged pdf, joining any in-flight analysis of the same content
+
+    the staged file is always cleaned up, either here or by the shared task using it
+
+    Parameter
+    ----
+    staged: StagedUpload
+        the pdf staged on local disk with its digest
+    variant: str
+        graph variant to run, see GRAPH_VARIANTS
+    progress: Progress
+        optional callback notified of the stages and sections of the run
+    """
+    def start():
+        # this caller leads, the shared task now owns the staged file
+        staged.claimed = True
+        return _analyse_and_cleanup(staged, variant, progress)
+
+    try:
+        return await _in_flight.do((staged.digest, variant), start)
+    finally:
+        if not staged.claimed:
+            staged.cleanup()
+
+
+async def _analyse_and_cleanup(
+    staged: StagedUpload, variant: str, progress: Optional[Progress],
+) -> UploadPdfResponse:
+    try:
+        return await _analyse_with_lease(staged, variant, progress)
+    finally:
+        staged.cleanup()
+
+
+async def _analyse_with_lease(
+    staged: StagedUpload, variant: str, progress: Optional[Progress],
+) -> UploadPdfResponse:
+    digest = staged.digest
+    # complete analysis already cached, skip s3, textract and the dag
+    cached = await get_cached_response(digest, variant)
+    if cached is not None:
+        await _notify(progress, "stage", stage="result_cache", status="hit")
+        return cached
+
+    if not settings.SINGLE_FLIGHT_LEASE_ENABLED:
+        return await _analyse(staged, variant, progress)
+
+    lease_id = result_cache_key(digest, variant)
+    owner = str(uuid.uuid4())
+    while True:
+        if await acquire_lease(lease_id, owner, settings.SINGLE_FLIGHT_LEASE_SECONDS):
+            heartbeat = asyncio.create_task(_renew_lease(lease_id, owner))
+            try:
+                return await _analyse(staged, variant, progress)
+            finally:
+                heartbeat.cancel()
+                await asyncio.gather(heartbeat, return_exceptions=True)
+                await release_lease(lease_id, owner)
+
+        # another worker holds the lease, wait for it to publish the result
+        logger.info("Waiting on another worker for %s", lease_id)
+        await _notify(progress, "stage", stage="lease", status="waiting")
+        await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_SECONDS)
+        cached = await get_cached_response(digest, variant)
+        if cached is not None:
+            return cached
+
+
+async def _renew_lease(lease_id: str, owner: str) -> None:
+    """keep the lease of a running analysis alive, so a run longer than
+    SINGLE_FLIGHT_LEASE_SECONDS is never taken over by another worker"""
+    while True:
+        await asyncio.sleep(settings.SINGLE_FLIGHT_LEASE_SECONDS / 3)
+        try:
+            held = await renew_lease(lease_id, owner, settings.SINGLE_FLIGHT_LEASE_SECONDS)
+        except Exception as e:
+            logger.error("Failed to renew lease %s: %s", lease_id, e)
+            continue
+        if not held:
+            logger.error("Lost lease %s, another worker may analyse the same document", lease_id)
+            return
+
+
+async def _analyse(staged: StagedUpload, variant: str, progress: Optional[Progress] = None) -> UploadPdfResponse:
+    digest = staged.digest
+    # single lookup, in-process cache first then dynamodb
+    text = await get_parsed_text(digest)
+    if text is not None:
+        await _notify(progress, "stage", stage="parsed_text", status="hit")
+    else:
+        # cache miss, extract the text locally or through textract
+        text = await _extract_text(staged, progress)
+        # persist parsed text into db for caching, best effort
+        await put_parsed_text(digest, text)
+
+    # every llm call of this run shares the document prefix, route them to one prompt cache
+    prompt_cache_key.set(digest)
+
+    # langchain graph for orchestrating the workflow, compiled once at startup
+    dag = get_graph(variant)
+
+    # initial state to feed into the graph
+    initial_state = {
+        "input_text": text,
+        "converted_text": "",
+        "property_valuations_s": {},
+        "risk_percentage_s": {},
+        "business_interruption_s": {},
+        "current_insurance_s": {},
+        "multi_currency_risk_s": {},
+        "insurance_recommendation_s": {},
+        "failed_sections": [],
+    }
+
+    # checkpoint thread of this analysis, resume it when a previous attempt failed midway;
+    # checkpoints require the lease, so this worker is the only one using the thread
+    thread_id = result_cache_key(digest, variant)
+    config = {"configurable": {"thread_id": thread_id}}
+    graph_input = initial_state
+    if checkpointer is not None:
+        snapshot = await dag.aget_state(config)
+        if snapshot.next:
+            logger.info("Resuming %s before %s", thread_id, list(snapshot.next))
+            await _notify(progress, "stage", stage="checkpoint", status="resumed", pending=list(snapshot.next))
+            graph_input = None
+        elif snapshot.created_at is not None:
+            # leftover of a completed run, start over on a clean thread
+            await checkpointer.adelete_thread(thread_id)
+
+    # execute the DAG async, streaming every node's update to the progress callback
+    # as soon as the node completes, the last "values" chunk is the final state
+    if graph_input is not None:
+        await _notify(progress, "stage", stage="convert_currency", status="started")
+    final_state = initial_state
+    try:
+        async for mode, chunk in dag.astream(graph_input, config, stream_mode=["updates", "values"]):
+            if mode == "values":
+                final_state = chunk
+                continue
+            for node, update in chunk.items():
+                if node == "__metadata__":
+                    # marks updates replayed from the checkpoint on resume
+                    continue
+                if node == "convert_currency":
+                    await _notify(progress, "stage", stage="convert_currency", status="done")
+                    continue
+                update = dict(update or {})
+                failed = update.pop("failed_sections", [])
+                for failure in failed:
+                    await _notify(progress, "section_failed", **failure)
+                if failed:
+                    continue
+                for section, data in update.items():
+                    await _notify(progress, "section", node=node, section=section, data=data)
+    except LLMRateLimitError:
+        # surfaced as 429 rather than a generic graph failure
+        raise
+    except Exception as e:
+        raise GraphExecutionError(f"Error while running graph: {e}")
+
+    if checkpointer is not None:
+        # completed, nothing left to resume
+        await checkpointer.adelete_thread(thread_id)
+
+    # enforce strict schema
+    response = UploadPdfResponse(**final_state)
+    if response.failed_sections:
+        # degraded result, kept aside for rerun_section, the next upload runs the dag again
+        logger.warning(
+            "Analysis of %s degraded, failed nodes: %s",
+            digest, [failure.node for failure in response.failed_sections],
+        )
+        await put_partial_response(digest, response, variant)
+        return response
+    await promote_response(digest, response, variant)
+    return response
+
+
+async def rerun_section(digest: str, node: str, variant: str = "full") -> SectionRerunResponse:
+    """run a single analysis node again, with its retries, for a document whose text
+    was already parsed
+
+    the degraded result of the document's `variant` run, if one is stored, is patched
+    with the new sections and moved to the result cache once no node failed anymore
+
+    Raises
+    ---
+    KeyError
+        unknown node or variant, or no parsed text is stored for `digest`
+    """
+    if node not in ANALYSIS_NODES:
+        raise KeyError(f"Unknown analysis node: {node}")
+    if variant not in GRAPH_VARIANTS:
+        raise KeyError(f"Unknown graph variant: {variant}")
+    text = await get_parsed_text(digest)
+    if text is None:
+        raise KeyError(f"No parsed text for document {digest}")
+
+    prompt_cache_key.set(digest)
+    state = {"input_text": text, **await run_currency_conversion({"input_text": text})}
+    try:
+        update = await resilient_node(node, ANALYSIS_NODES[node])(state)
+    except LLMRateLimitError:
+        raise
+    except Exception as e:
+        raise GraphExecutionError(f"Error while running {node}: {e}")
+    sections = {section: update[section] for section in NODE_SECTIONS[node]}
+    failed = update.get("failed_sections", [])
+
+    result = await get_partial_response(digest, variant) if node in GRAPH_VARIANTS[variant] else None
+    if result is not None:
+        still_failed = [f.model_dump() for f in result.failed_sections if f.node != node] + failed
+        result = UploadPdfResponse(**{**result.model_dump(), **sections, "failed_sections": still_failed})
+        if result.failed_sections:
+            await put_partial_response(digest, result, variant)
+        else:
+            logger.info("Analysis of %s (%s) completed by re-running %s", digest, variant, node)
+            await promote_response(digest, result, variant)
+
+    return SectionRerunResponse(
+        digest=digest,
+        node=node,
+        sections=sections,
+        failed_sections=failed,
+        variant=variant,
+        result=result,
+    )
+
+
+async def _extract_text(staged: StagedUpload, progress: Optional[Progress] = None) -> str:
+    """text of a pdf, from its embedded text layer where usable and textract otherwise"""
+    layer = None
+    if settings.LOCAL_PDF_EXTRACTION_ENABLED:
+        layer = await extract_text_layer(staged.path)
+        if layer is not None:
+            await _notify(
+                progress, "stage", stage="local_text", status="done",
+                pages=len(layer.pages), ocr_pages=len(layer.low_quality),
+            )
+        if layer is not None and not layer.low_quality:
+            # born-digital pdf, no ocr needed
+            return layer.text
+
+    try:
+        ocr_pages = await _ocr(staged, layer, progress)
+    except (S3UploadError, TextractParseError):
+        raise
+    except Exception as e:
+        raise TextractParseError(f"Textract failed on {staged.digest}: {e}")
+
+    if layer is None:
+        text = "\n".join(ocr_pages.values())
+    else:
+        # keep the local text of good pages, take the ocr text of the others
+        pages = list(layer.pages)
+        for number in layer.low_quality:
+            pages[number] = ocr_pages.get(number + 1, "")
+        text = "\n".join(pages)
+
+    if not text.strip():
+        raise TextractParseError(f"Textract found no text in {staged.digest}")
+    return text
+
+
+async def _ocr(
+    staged: StagedUpload, layer: Optional[TextLayer], progress: Optional[Progress] = None,
+) -> Dict[int, str]:
+    """ocr the pages the local text layer could not provide, keyed by 1 based page"""
+    if settings.TEXTRACT_FANOUT_ENABLED:
+        pages = len(layer.pages) if layer is not None else await page_count(staged.path)
+        if pages >= settings.TEXTRACT_FANOUT_MIN_PAGES:
+            # large report, concurrent jobs per page range with a per page cache
+            await _notify(progress, "stage", stage="textract", status="started", fanout=True)
+            texts = await ocr_pages(staged.path, layer.low_quality if layer is not None else None)
+            await _notify(progress, "stage", stage="textract", status="done", pages=len(texts))
+            return texts
+
+    # upload to s3 (skipped if the content is already stored) for textract
+    await _notify(progress, "stage", stage="s3_upload", status="started")
+    try:
+        s3_key, s3_url = await upload_pdf_to_s3(staged.path, staged.digest)
+    except Exception as e:
+        raise S3UploadError(f"Failed to upload to S3: {e}")
+    await _notify(progress, "stage", stage="s3_upload", status="done", key=s3_key)
+
+    # run textract on the whole document
+    await _notify(progress, "stage", stage="textract", status="started", fanout=False)
+    async with textract_job_slots():
+        texts = await parse_pdf_pages_via_textract(s3_key)
+    await _notify(progress, "stage", stage="textract", status="done", pages=len(texts))
+    return texts
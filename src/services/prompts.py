@@ -0,0 +1,33 @@
+"""
+Shared Prompt Layout
+----
+every analysis prompt starts with the same document prefix and only then carries the
+node's own instructions. the six nodes of a run therefore send byte identical prompt
+prefixes, which lets the provider serve the report tokens from its prompt cache after
+the first call instead of billing and processing them six times
+
+templates are compiled once at import by the node modules, build_*_prompt only hands
+out the shared instance
+"""
+from langchain_core.prompts import PromptTemplate
+
+# identical for every node, keep it free of anything node specific
+DOCUMENT_PREFIX = """The following text was extracted from a plain-English risk assessment report for a major football stadium.
+
+Here is the extracted report text:
+
+{cleaned_text}
+----------------
+"""
+
+
+def build_node_prompt(instructions: str) -> PromptTemplate:
+    """compile the document prefix followed by a node's `instructions`
+
+    Parameter
+    ---
+    instructions: str
+        node specific task, referring to "the report text above"; literal braces
+        must be doubled as in any PromptTemplate
+    """
+    return PromptTemplate(input_variables=["cleaned_text"], template=DOCUMENT_PREFIX + instructions)
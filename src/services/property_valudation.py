@@ -10,18 +10,28 @@ This module defines two public callables:
 """
 import logging
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import JsonOutputParser
-from src.core.config import settings
+from src.services.chunking import map_reduce
+from src.services.llm import llm_registry
+from src.services.prompts import build_node_prompt
+from src.services.section_index import relevant_text
 
 logger = logging.getLogger(__name__)
 
-def build_insurance_analysis_prompt() -> PromptTemplate:
-    prompt_str = """
+# marker phrases of the prompt, used to route only the matching passages to this node
+RELEVANCE_MARKERS = (
+    "property valuation", "replacement cost", "infrastructure", "playing surface",
+    "business interruption", "match cancellations", "lost revenue", "operating costs",
+    "damage costs", "historical", "forecast", "EUR",
+)
+
+# node instructions, placed after the shared document prefix so the report
+# tokens form a prompt prefix common to every node
+PROPERTY_VALUATION_INSTRUCTIONS = """
 You are a professional insurance risk analyst with experience in commercial property, public liability, and business interruption policies.
 
-The following text was extracted from a risk assessment report for a major football stadium. Your tasks are:
+Based on the report text above, your tasks are:
 
 ---
 
@@ -36,12 +46,6 @@ The following text was extracted from a risk assessment report for a major footb
 
 **IMPORTANT**: You must output all currency values in **EUR**, even if the input contains GBP or USD.
 
-Here is the extracted report text:
-
-{cleaned_text}
-
----
-
 **Output Format:**  
 Respond *only* with a single JSON object as shown below, without any additional text, headers, or explanations:
 
@@ -49,7 +53,26 @@ Respond *only* with a single JSON object as shown below, without any additional
   "executive_summary": "..."
 }}
 """
-    return PromptTemplate(input_variables=["cleaned_text"], template=prompt_str)
+
+PROPERTY_VALUATION_PROMPT = build_node_prompt(PROPERTY_VALUATION_INSTRUCTIONS)
+
+
+def build_insurance_analysis_prompt() -> PromptTemplate:
+    """return the prompt compiled at import"""
+    return PROPERTY_VALUATION_PROMPT
+
+def build_insurance_analysis_chain() -> Runnable:
+    """compose prompt | shared llm | json parser, built once per process"""
+    return build_insurance_analysis_prompt() | llm_registry.llm() | JsonOutputParser()
+
+def reduce_property_valuation(results: list) -> dict:
+    """join the per section summaries into one executive summary"""
+    summaries = []
+    for result in results:
+        summary = result.get("executive_summary", "").strip() if isinstance(result, dict) else ""
+        if summary and summary not in summaries:
+            summaries.append(summary)
+    return {"executive_summary": "\n\n".join(summaries)}
 
 async def run_property_valuation(state: dict) -> dict:
     """LangGraph node to generate an executive summary and merge into state."""
@@ -59,19 +82,13 @@ async def run_property_valuation(state: dict) -> dict:
         logger.error("Missing 'converted_text' in state")
         raise ValueError("Missing 'converted_text' key in state dict")
 
-    prompt = build_insurance_analysis_prompt()
-    parser = JsonOutputParser()
-
-    llm = ChatGroq(
-        model="llama-3.3-70b-versatile",
-        temperature=0.2,
-        groq_api_key=settings.GROQ_API_KEY
-    )
-
-    chain: Runnable = prompt | llm | parser
+    # reuse the pre-built chain and its pooled llm client
+    chain: Runnable = llm_registry.chain("property_valuation", build_insurance_analysis_chain)
 
     try:
-        result = await chain.ainvoke({"cleaned_text": cleaned_text})
+        # only the passages matching the markers when the relevance filter is on
+        cleaned_text = relevant_text(cleaned_text, RELEVANCE_MARKERS, "property_valuation")
+        result = await map_reduce(chain, cleaned_text, reduce_property_valuation)
         return {"property_valuations_s": result}
     except Exception as e:
         logger.error("Chain invocation failed: %s", e)
@@ -0,0 +1,231 @@
+"""
+LLM Rate Limit Governor
+----
+keeps the llm calls of every gunicorn worker under the provider's requests/minute and
+tokens/minute limits instead of letting them fail with 429s
+
+every call estimates its token cost up front and is admitted through a priority gate
+(interactive uploads ahead of batch and job work) and a token bucket per model. the
+bucket state lives in a small json file guarded by an exclusive flock, so all worker
+processes of the host draw from the same budget. a 429 blocks the model's bucket for
+the retry-after the provider asked for, for every worker at once. with both limits at 0
+the file is not touched at all and a 429 only holds back the calls of this process
+
+Key Responsibility
+---
+llm_priority: context variable holding the priority of the current request
+estimate_call_tokens: token cost of a chain invocation before it is sent
+rate_limit_delay: seconds to back off when an exception is a provider rate limit
+governor: admit() / penalise() used by llm_registry around every call
+"""
+import asyncio
+import fcntl
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from src.core.config import settings
+from src.utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# lower is served first
+INTERACTIVE, BATCH = 0, 1
+
+# set to BATCH by the batch endpoint and the job workers, interactive by default
+llm_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+# "1m30.5s" / "7.66s" / "250ms" style durations of the x-ratelimit-reset-* headers
+_DURATION_RE = re.compile(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?$")
+
+
+def estimate_call_tokens(chain, inputs: dict) -> int:
+    """prompt template plus inputs plus the expected completion, in estimated tokens"""
+    template = getattr(getattr(chain, "first", None), "template", "")
+    prompt = template + "".join(str(value) for value in inputs.values())
+    return estimate_tokens(prompt) + settings.LLM_OUTPUT_TOKENS_ESTIMATE
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    match = _DURATION_RE.match(value.strip())
+    if not match or not any(match.groups()):
+        return None
+    h, m, s, ms = (float(g) if g else 0.0 for g in match.groups())
+    return h * 3600 + m * 60 + s + ms / 1000
+
+
+def rate_limit_delay(error: Exception) -> Optional[float]:
+    """seconds to wait before retrying when `error` is a 429 of the provider, else none
+
+    reads retry-after first, then groq/openai's x-ratelimit-reset-* headers and falls
+    back to LLM_RATE_LIMIT_BACKOFF_SECONDS
+    """
+    if getattr(error, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    resets = [
+        _parse_duration(headers[name])
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens") if headers.get(name)
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else settings.LLM_RATE_LIMIT_BACKOFF_SECONDS
+
+
+class FileTokenBucket:
+    """requests/minute and tokens/minute buckets per model shared through a locked file
+
+    a limit of 0 disables that bucket, the file is still used to share 429 penalties
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _update(self, model: str, change) -> float:
+        """apply `change(state, now) -> wait` to the model's state under the file lock"""
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                states = json.loads(raw) if raw else {}
+                now = time.time()
+                state = states.setdefault(model, {})
+                wait = change(state, now)
+                f.seek(0)
+                f.truncate()
+                json.dump(states, f)
+                return wait
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _refill(state: dict, now: float) -> None:
+        elapsed = max(0.0, now - state.get("updated", now))
+        for key, limit in (("requests", settings.LLM_RPM_LIMIT), ("tokens", settings.LLM_TPM_LIMIT)):
+            if limit:
+                state[key] = min(limit, state.get(key, limit) + elapsed * limit / 60)
+        state["updated"] = now
+
+    def try_acquire(self, model: str, cost: int) -> float:
+        """take one request and `cost` tokens, or return the seconds to wait for them"""
+        def change(state: dict, now: float) -> float:
+            self._refill(state, now)
+            blocked = state.get("blocked_until", 0) - now
+            if blocked > 0:
+                return blocked
+            waits = [0.0]
+            if settings.LLM_RPM_LIMIT:
+                waits.append(max(0.0, 1 - state["requests"]) * 60 / settings.LLM_RPM_LIMIT)
+            if settings.LLM_TPM_LIMIT:
+                # a call larger than the whole bucket waits for a full bucket
+                need = min(cost, settings.LLM_TPM_LIMIT)
+                waits.append(max(0.0, need - state["tokens"]) * 60 / settings.LLM_TPM_LIMIT)
+            wait = max(waits)
+            if wait <= 0:
+                if settings.LLM_RPM_LIMIT:
+                    state["requests"] -= 1
+                if settings.LLM_TPM_LIMIT:
+                    state["tokens"] -= cost
+            return wait
+
+        return self._update(model, change)
+
+    def block(self, model: str, seconds: float) -> None:
+        """stop admitting calls of `model` for `seconds`, in every process"""
+        def change(state: dict, now: float) -> float:
+            self._refill(state, now)
+            state["blocked_until"] = max(state.get("blocked_until", 0), now + seconds)
+            return 0.0
+
+        self._update(model, change)
+
+
+class _PriorityGate:
+    """lock handed to the waiter with the lowest (priority, arrival)"""
+
+    def __init__(self):
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._busy = False
+
+    async def acquire(self, priority: int) -> None:
+        if not self._busy and not self._waiters:
+            self._busy = True
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # handed the gate while being cancelled, pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._busy = False
+
+
+class RateLimitGovernor:
+    """admits llm calls by priority once the model's shared buckets allow them"""
+
+    def __init__(self, bucket: FileTokenBucket):
+        self.bucket = bucket
+        self._gates: Dict[str, _PriorityGate] = {}
+        # in-process 429 back-off per model, used when the shared buckets are disabled
+        self._blocked_until: Dict[str, float] = {}
+
+    @staticmethod
+    def _shared() -> bool:
+        return bool(settings.LLM_RPM_LIMIT or settings.LLM_TPM_LIMIT)
+
+    @asynccontextmanager
+    async def admit(self, model: str, cost: int):
+        """hold the model's gate until the buckets granted the call; the body runs while
+        the gate is held, so whatever it waits for (a call slot) is handed out in
+        priority order as well"""
+        gate = self._gates.setdefault(model, _PriorityGate())
+        await gate.acquire(llm_priority.get())
+        try:
+            if self._shared():
+                while (wait := await asyncio.to_thread(self.bucket.try_acquire, model, cost)) > 0:
+                    logger.debug("Rate limit: %s waits %.2fs for %d tokens", model, wait, cost)
+                    await asyncio.sleep(wait)
+            else:
+                while (wait := self._blocked_until.get(model, 0) - time.time()) > 0:
+                    await asyncio.sleep(wait)
+            yield
+        finally:
+            gate.release()
+
+    async def penalise(self, model: str, seconds: float) -> None:
+        """the provider answered 429, hold every worker's calls of `model` back"""
+        logger.warning("Rate limited by the provider on %s, backing off %.1fs", model, seconds)
+        self._blocked_until[model] = max(self._blocked_until.get(model, 0), time.time() + seconds)
+        if self._shared():
+            await asyncio.to_thread(self.bucket.block, model, seconds)
+
+
+# module level singleton shared by the llm registry
+governor = RateLimitGovernor(FileTokenBucket(
+    settings.LLM_RATE_LIMIT_STATE_PATH or os.path.join(tempfile.gettempdir(), "risk-mgmt-llm-rate-limit.json")
+))
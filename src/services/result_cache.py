@@ -0,0 +1,117 @@
+"""
+Analysis Result Cache
+----
+second cache tier on top of the parsed text cache: stores the final UploadPdfResponse
+so a re-submitted document skips the DAG entirely
+
+the cache key combines the document digest, the graph variant, a fingerprint of
+every build_*_prompt template, the model name and the exchange rates, so editing a
+prompt, switching model or refreshing the rates invalidates old entries on its own
+
+a degraded response (some nodes failed) is not served from the cache, it is kept under
+a `partial#` key instead so re-running its failed nodes can complete it
+"""
+import json
+import logging
+from functools import lru_cache
+from typing import Optional
+
+from src.core.config import settings
+from src.dto.UploadPdfResponse import UploadPdfResponse
+from src.services.business_interruption import build_business_interruption_prompt
+from src.services.currency_convertion import build_currency_conversion_prompt
+from src.services.current_insurance import build_current_insurance_prompt
+from src.services.db import delete_cached_result, get_cached_result, hash_text_sha256, put_cached_result
+from src.services.fused_analysis import build_fused_analysis_prompt
+from src.services.insurance_recommendation import build_insurance_recommendation_prompt
+from src.services.multi_currency_risk import build_multi_currency_risk_prompt
+from src.services.property_valudation import build_insurance_analysis_prompt
+from src.services.risk_percentages import build_risk_percentage_prompt
+
+logger = logging.getLogger(__name__)
+
+# resultID prefix of the degraded responses waiting for their failed nodes
+PARTIAL_PREFIX = "partial#"
+
+# every prompt whose wording shapes the cached output
+PROMPT_BUILDERS = (
+    build_currency_conversion_prompt,
+    build_insurance_analysis_prompt,
+    build_risk_percentage_prompt,
+    build_business_interruption_prompt,
+    build_current_insurance_prompt,
+    build_multi_currency_risk_prompt,
+    build_insurance_recommendation_prompt,
+    build_fused_analysis_prompt,
+)
+
+
+@lru_cache(maxsize=1)
+def prompt_version() -> str:
+    """fingerprint of all prompt templates, changes whenever a prompt is edited"""
+    templates = "\n".join(builder().template for builder in PROMPT_BUILDERS)
+    return hash_text_sha256(templates + settings.RESULT_CACHE_VERSION)[:16]
+
+
+def result_cache_key(digest: str, variant: str = "full") -> str:
+    """build the resultID of a document analysed with the current prompts, model, rates
+    and chunk / relevance budgets (a different split changes the reduced output)"""
+    rates = hash_text_sha256(json.dumps(settings.EXCHANGE_RATES, sort_keys=True))[:16]
+    chunking = f"{settings.CHUNK_MAX_TOKENS}-{settings.CHUNK_OVERLAP_TOKENS}"
+    if settings.RELEVANCE_FILTER_ENABLED:
+        chunking += f"-rf{settings.RELEVANCE_TOKEN_BUDGET}-{settings.RELEVANCE_PASSAGE_TOKENS}"
+    return "#".join((
+        digest, variant, prompt_version(), settings.LLM_MODEL, settings.CURRENCY_CONVERSION_MODE, rates, chunking,
+    ))
+
+
+async def get_cached_response(digest: str, variant: str = "full") -> Optional[UploadPdfResponse]:
+    """return the cached response of a document or none on a miss"""
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    cached = await get_cached_result(result_cache_key(digest, variant))
+    if cached is None:
+        return None
+    logger.info("Result cache hit for %s (%s)", digest, variant)
+    return UploadPdfResponse(**cached)
+
+
+async def put_cached_response(digest: str, response: UploadPdfResponse, variant: str = "full") -> None:
+    """persist the response of a document for RESULT_CACHE_TTL_SECONDS"""
+    if not settings.RESULT_CACHE_ENABLED:
+        return
+    await put_cached_result(
+        result_cache_key(digest, variant), digest, response.model_dump(), settings.RESULT_CACHE_TTL_SECONDS,
+    )
+
+
+async def get_partial_response(digest: str, variant: str = "full") -> Optional[UploadPdfResponse]:
+    """return the stored degraded response of a document or none"""
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    partial = await get_cached_result(PARTIAL_PREFIX + result_cache_key(digest, variant))
+    return UploadPdfResponse(**partial) if partial is not None else None
+
+
+async def put_partial_response(digest: str, response: UploadPdfResponse, variant: str = "full") -> None:
+    """keep a degraded response, with its failed_sections, until its nodes are re-run"""
+    if not settings.RESULT_CACHE_ENABLED:
+        return
+    await put_cached_result(
+        PARTIAL_PREFIX + result_cache_key(digest, variant), digest, response.model_dump(),
+        settings.RESULT_CACHE_TTL_SECONDS,
+    )
+
+
+async def promote_response(digest: str, response: UploadPdfResponse, variant: str = "full") -> None:
+    """cache a response that has no failed sections and drop its degraded version"""
+    await put_cached_response(digest, response, variant)
+    if settings.RESULT_CACHE_ENABLED:
+        await delete_cached_result(PARTIAL_PREFIX + result_cache_key(digest, variant))
+
+
+async def invalidate_cached_response(digest: str, variant: str = "full") -> None:
+    """explicitly drop the cached (and any degraded) response of a document"""
+    key = result_cache_key(digest, variant)
+    await delete_cached_result(key)
+    await delete_cached_result(PARTIAL_PREFIX + key)
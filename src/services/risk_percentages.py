@@ -10,17 +10,26 @@ This module defines two public callables:
 """
 import logging
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import JsonOutputParser
-from src.core.config import settings
+from src.services.chunking import map_reduce, merge_lists
+from src.services.llm import llm_registry
+from src.services.prompts import build_node_prompt
+from src.services.section_index import relevant_text
 
 logger = logging.getLogger(__name__)
 
+# marker phrases of the prompt, used to route only the matching passages to this node
+RELEVANCE_MARKERS = (
+    "%", "probability", "chance", "likelihood", "frequency", "in year", "per season",
+    "events", "correlation", "annually", "risk",
+)
 
-def build_risk_percentage_prompt() -> PromptTemplate:
-    prompt_str = r"""
-You are a professional insurance risk analyst. Your goal is to scan a plain‐English risk assessment report and extract **all risk factors** that mention a probability, percentage, frequency, or chance. Look for any of these markers:
+
+# node instructions, placed after the shared document prefix so the report
+# tokens form a prompt prefix common to every node
+RISK_PERCENTAGE_INSTRUCTIONS = r"""
+You are a professional insurance risk analyst. Your goal is to scan the plain‐English risk assessment report above and extract **all risk factors** that mention a probability, percentage, frequency, or chance. Look for any of these markers:
 - A numeric percentage (e.g., “23% probability…”)
 - A “X-in-Y-year” phrasing (e.g., “1-in-25-year flood event”)
 - A per-timeframe frequency (e.g., “0.3 events per season,” “1.3 postponements per season”)
@@ -35,12 +44,6 @@ Whenever you spot such a phrase, create one JSON object containing:
 
 **IMPORTANT**: You must output all currency values in **EUR**, even if the input contains GBP or USD.
 
-Here is the extracted report text:
-
-{cleaned_text}
-
----
-
 Below are two examples illustrating the expected format:
 
 **Example 1**  
@@ -55,7 +58,24 @@ _Output_:
   "notes":       ""
 }}
 """
-    return PromptTemplate(input_variables=["cleaned_text"], template=prompt_str)
+
+RISK_PERCENTAGE_PROMPT = build_node_prompt(RISK_PERCENTAGE_INSTRUCTIONS)
+
+
+def build_risk_percentage_prompt() -> PromptTemplate:
+    """return the prompt compiled at import"""
+    return RISK_PERCENTAGE_PROMPT
+
+
+def build_risk_percentage_chain() -> Runnable:
+    """compose prompt | shared llm | json parser, built once per process"""
+    return build_risk_percentage_prompt() | llm_registry.llm() | JsonOutputParser()
+
+
+def reduce_risk_percentage(results: list) -> dict:
+    """concatenate the risks found in every section, a risk repeated in the overlap of
+    two sections is kept once"""
+    return merge_lists(results, "risks", dedupe_on=("risk_name", "probability"))
 
 
 async def run_risk_percentage(state: dict) -> dict:
@@ -65,19 +85,13 @@ async def run_risk_percentage(state: dict) -> dict:
         logger.error("Missing 'converted_text' in state")
         raise ValueError("Missing 'converted_text' key in state dict")
 
-    prompt = build_risk_percentage_prompt()
-    parser = JsonOutputParser()
-
-    llm = ChatGroq(
-        model="llama-3.3-70b-versatile",
-        temperature=0.2,
-        groq_api_key=settings.GROQ_API_KEY
-    )
-
-    chain: Runnable = prompt | llm | parser
+    # reuse the pre-built chain and its pooled llm client
+    chain: Runnable = llm_registry.chain("risk_percentage", build_risk_percentage_chain)
 
     try:
-        result = await chain.ainvoke({"cleaned_text": cleaned_text})
+        # only the passages matching the markers when the relevance filter is on
+        cleaned_text = relevant_text(cleaned_text, RELEVANCE_MARKERS, "risk_percentage")
+        result = await map_reduce(chain, cleaned_text, reduce_risk_percentage)
         if isinstance(result, list):
             wrapped = {"risks": result}
         else:
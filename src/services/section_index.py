@@ -0,0 +1,155 @@
+"""
+Relevance Section Index
+----
+lightweight bm25 index over the passages of a document, so every analysis node is
+only sent the passages matching its marker phrases instead of the whole report
+
+the index is built once per converted text and kept in an in-process LRU keyed by
+the text digest, the six nodes of a run share it
+
+Key Responsibility
+---
+SectionIndex: passages of a text plus their bm25 statistics
+get_section_index: cached index of a text
+relevant_text: top scoring passages of a text for a node within RELEVANCE_TOKEN_BUDGET
+"""
+import logging
+import math
+import re
+from collections import Counter
+from typing import Iterable, List
+
+from src.core.config import settings
+from src.services.db import hash_text_sha256
+from src.utils.cache import LRUCache
+from src.utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# bm25 free parameters, the usual defaults
+K1 = 1.5
+B = 0.75
+
+# words, numbers and the percent sign, which the risk nodes look for
+_TOKEN_RE = re.compile(r"[a-z]+|\d+(?:[.,]\d+)*|%")
+
+section_index_cache = LRUCache(
+    max_bytes=settings.PARSED_TEXT_CACHE_MAX_BYTES,
+    ttl_seconds=settings.PARSED_TEXT_CACHE_TTL_SECONDS,
+    sizeof=lambda index: index.size,
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """lower cased terms of `text` with a naive plural strip"""
+    terms = []
+    for term in _TOKEN_RE.findall(text.lower()):
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+def split_passages(text: str, max_tokens: int) -> List[str]:
+    """group lines into passages, cut at blank lines or once `max_tokens` is reached
+
+    textract output has no blank lines, so the token cap is what bounds most passages
+    """
+    passages, current, used = [], [], 0
+    for line in text.split("\n"):
+        if not line.strip() or (current and used + estimate_tokens(line) > max_tokens):
+            if current:
+                passages.append("\n".join(current))
+            current, used = [], 0
+        if line.strip():
+            current.append(line)
+            used += estimate_tokens(line)
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+class SectionIndex:
+    """bm25 statistics of the passages of one document"""
+
+    def __init__(self, text: str, passage_tokens: int):
+        self.passages = split_passages(text, passage_tokens)
+        self.terms = [Counter(tokenize(p)) for p in self.passages]
+        self.lengths = [sum(t.values()) for t in self.terms]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.doc_freq = Counter(term for terms in self.terms for term in terms)
+        # rough footprint for the byte bounded cache
+        self.size = 3 * len(text)
+
+    def scores(self, query: Iterable[str]) -> List[float]:
+        """bm25 score of every passage for the query terms"""
+        count = len(self.passages)
+        query = set(query)
+        idf = {
+            q: math.log(1 + (count - self.doc_freq[q] + 0.5) / (self.doc_freq[q] + 0.5))
+            for q in query if q in self.doc_freq
+        }
+        scores = []
+        for terms, length in zip(self.terms, self.lengths):
+            norm = K1 * (1 - B + B * length / self.avg_length) if self.avg_length else K1
+            scores.append(sum(
+                weight * terms[q] * (K1 + 1) / (terms[q] + norm)
+                for q, weight in idf.items() if q in terms
+            ))
+        return scores
+
+    def select(self, markers: Iterable[str], budget_tokens: int) -> List[int]:
+        """indices of the best matching passages fitting `budget_tokens`, in document order"""
+        query = [term for marker in markers for term in tokenize(marker)]
+        scores = self.scores(query)
+        picked, used = [], 0
+        for i in sorted(range(len(scores)), key=scores.__getitem__, reverse=True):
+            if scores[i] <= 0:
+                break
+            cost = estimate_tokens(self.passages[i])
+            if used + cost > budget_tokens:
+                continue
+            picked.append(i)
+            used += cost
+        return sorted(picked)
+
+
+def get_section_index(text: str) -> SectionIndex:
+    """index of `text`, built on first use and shared through section_index_cache"""
+    key = hash_text_sha256(text)
+    index = section_index_cache.get(key)
+    if index is None:
+        index = SectionIndex(text, settings.RELEVANCE_PASSAGE_TOKENS)
+        section_index_cache.set(key, index)
+    return index
+
+
+def relevant_text(text: str, markers: Iterable[str], node: str) -> str:
+    """passages of `text` relevant to a node's `markers`, or `text` itself when the
+    filter is off, the text already fits the budget or nothing matches
+
+    Parameter
+    ---
+    text: str
+        converted text of the document
+    markers: iterable of str
+        marker phrases of the node, usually the ones listed in its prompt
+    node: str
+        node name, for logging
+    """
+    total = estimate_tokens(text)
+    if not settings.RELEVANCE_FILTER_ENABLED or total <= settings.RELEVANCE_TOKEN_BUDGET:
+        return text
+
+    index = get_section_index(text)
+    picked = index.select(markers, settings.RELEVANCE_TOKEN_BUDGET)
+    if not picked:
+        logger.warning("Relevance filter %s: no passage matched, sending the full text", node)
+        return text
+
+    filtered = "\n".join(index.passages[i] for i in picked)
+    logger.info(
+        "Relevance filter %s: %d -> %d tokens (%d of %d passages)",
+        node, total, estimate_tokens(filtered), len(picked), len(index.passages),
+    )
+    return filtered
@@ -1,51 +1,255 @@
 """
 Amazon Textract PDF Parsing Utility
 ---
-this helper module provides synchronous and asynchronous wrappers around StartDocumentTextDetection
+this helper module provides asynchronous wrappers around StartDocumentTextDetection
 for extracting text from PDF files already stored
 in S3
+
+Key Responsibility
+---
+TextractJobManager: starts a job, waits for it with exponential backoff + jitter up
+to a deadline, and pages through every GetDocumentTextDetection result via NextToken
+TextractNotificationListener: optional background consumer of the sns -> sqs
+completion notifications, waking the waiting job as soon as textract is done
+parse_pdf_via_textract: one call helper returning the whole text
+parse_pdf_pages_via_textract: one call helper returning the text of every page
 """
 import asyncio
+import json
+import logging
+import os
+import random
 import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
 
-import boto3
-import aioboto3
+from exceptions import TextractParseError
+from src.core.aws import aws
 from src.core.config import settings
 
-textract = boto3.client("textract", region_name=settings.AWS_REGION)
+logger = logging.getLogger(__name__)
+
+# statuses after which a job will not change anymore
+FINISHED_STATUSES = ("SUCCEEDED", "FAILED", "PARTIAL_SUCCESS")
+
+# job ids remembered after their wait ended, to drop their late notifications
+RECENT_JOBS = 1024
+
+
+class TextractNotificationListener:
+    """long polls the textract completion queue and wakes the matching waiter
+
+    every job is started with this worker's JobTag. a message is deleted once it woke
+    its waiter, when it belongs to a job of this worker nobody waits for anymore, or
+    when it is older than a status poll interval, by then the owning worker's poll has
+    seen the job finish (or the owner is gone). only fresh messages of other workers'
+    jobs are made visible again, after which the consumer backs off briefly
+    """
+
+    def __init__(self):
+        self._waiters: Dict[str, asyncio.Event] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        # [a-zA-Z0-9_.\-:]{1,64} as textract requires
+        self.tag = f"worker-{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.TEXTRACT_SQS_QUEUE_URL)
+
+    def start(self) -> None:
+        """start the background consumer, no-op without a configured queue"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._consume())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def wait(self, job_id: str, timeout: float) -> None:
+        """return when the completion of `job_id` is notified or after `timeout` seconds"""
+        event = self._waiters.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def forget(self, job_id: str) -> None:
+        """stop waiting for `job_id`, a notification arriving later is dropped"""
+        self._waiters.pop(job_id, None)
+        self._finished[job_id] = None
+        while len(self._finished) > RECENT_JOBS:
+            self._finished.popitem(last=False)
+
+    async def _consume(self) -> None:
+        while True:
+            try:
+                response = await aws.sqs.receive_message(
+                    QueueUrl=settings.TEXTRACT_SQS_QUEUE_URL, MaxNumberOfMessages=10, WaitTimeSeconds=20,
+                    AttributeNames=["SentTimestamp"],
+                )
+                messages = response.get("Messages", [])
+                handled = [await self._dispatch(message) for message in messages]
+                if messages and not any(handled):
+                    # only other workers' notifications, give them a chance to take them
+                    await asyncio.sleep(settings.TEXTRACT_POLL_INITIAL_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Textract notification polling failed: %s", e)
+                await asyncio.sleep(settings.TEXTRACT_POLL_MAX_SECONDS)
+
+    def _is_stale(self, message: dict) -> bool:
+        sent = message.get("Attributes", {}).get("SentTimestamp")
+        return sent is not None and time.time() - int(sent) / 1000 > 2 * settings.TEXTRACT_POLL_MAX_SECONDS
+
+    async def _dispatch(self, message: dict) -> bool:
+        """wake or drop the message's job, false when it was left for another worker"""
+        body = json.loads(message["Body"])
+        # sns wraps the textract payload unless raw message delivery is enabled
+        payload = json.loads(body["Message"]) if "Message" in body else body
+        job_id = payload.get("JobId")
+        event = self._waiters.get(job_id)
+        if event is not None:
+            event.set()
+        elif job_id not in self._finished and payload.get("JobTag") != self.tag and not self._is_stale(message):
+            await aws.sqs.change_message_visibility(
+                QueueUrl=settings.TEXTRACT_SQS_QUEUE_URL,
+                ReceiptHandle=message["ReceiptHandle"],
+                VisibilityTimeout=0,
+            )
+            return False
+        await aws.sqs.delete_message(
+            QueueUrl=settings.TEXTRACT_SQS_QUEUE_URL, ReceiptHandle=message["ReceiptHandle"],
+        )
+        return True
+
+
+# module level singleton, started in the app lifespan
+textract_notifications = TextractNotificationListener()
 
-def parse_pdf_via_textract(s3_key: str) -> str:
+
+class TextractJobManager:
+    """runs one text detection job from start to the last result page"""
+
+    def __init__(self, notifications: TextractNotificationListener = textract_notifications):
+        self.notifications = notifications
+        # number of textract api calls made, handy for logging cost per document
+        self.api_calls = 0
+
+    async def start(self, s3_key: str) -> str:
+        """start a text detection job on an object of settings.S3_BUCKET and return its id"""
+        params = {"DocumentLocation": {"S3Object": {"Bucket": settings.S3_BUCKET, "Name": s3_key}}}
+        if self.notifications.enabled:
+            params["NotificationChannel"] = {
+                "SNSTopicArn": settings.TEXTRACT_SNS_TOPIC_ARN,
+                "RoleArn": settings.TEXTRACT_SNS_ROLE_ARN,
+            }
+            # tells the listener which worker the completion notification is for
+            params["JobTag"] = self.notifications.tag
+        job = await aws.textract.start_document_text_detection(**params)
+        self.api_calls += 1
+        return job["JobId"]
+
+    async def wait(self, job_id: str) -> dict:
+        """wait for the job to finish and return its first result page
+
+        sleeps grow exponentially with full jitter up to TEXTRACT_POLL_MAX_SECONDS; with
+        notifications enabled a sleep ends early as soon as the job completion arrives,
+        the status poll then only acts as a safety net for lost messages
+        """
+        deadline = time.monotonic() + settings.TEXTRACT_TIMEOUT_SECONDS
+        delay = settings.TEXTRACT_POLL_INITIAL_SECONDS
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TextractParseError(
+                        f"Textract job {job_id} did not finish within {settings.TEXTRACT_TIMEOUT_SECONDS}s"
+                    )
+                # yield the event loop to other requests while textract works
+                sleep = min(remaining, random.uniform(delay / 2, delay))
+                if self.notifications.enabled:
+                    await self.notifications.wait(job_id, sleep)
+                else:
+                    await asyncio.sleep(sleep)
+                delay = min(delay * 2, settings.TEXTRACT_POLL_MAX_SECONDS)
+
+                result = await aws.textract.get_document_text_detection(JobId=job_id, MaxResults=1000)
+                self.api_calls += 1
+                if result["JobStatus"] in FINISHED_STATUSES:
+                    break
+        finally:
+            self.notifications.forget(job_id)
+
+        if result["JobStatus"] == "FAILED":
+            raise TextractParseError(f"Textract job {job_id} failed: {result.get('StatusMessage', '')}")
+        if result["JobStatus"] == "PARTIAL_SUCCESS":
+            logger.warning("Textract job %s only partially succeeded: %s", job_id, result.get("Warnings"))
+        return result
+
+    async def blocks(self, job_id: str, first_page: dict) -> list[dict]:
+        """return every block of the job, following NextToken past the first page"""
+        blocks = list(first_page.get("Blocks", []))
+        next_token = first_page.get("NextToken")
+        while next_token:
+            page = await aws.textract.get_document_text_detection(
+                JobId=job_id, MaxResults=1000, NextToken=next_token,
+            )
+            self.api_calls += 1
+            blocks.extend(page.get("Blocks", []))
+            next_token = page.get("NextToken")
+        return blocks
+
+    async def detect_pages(self, s3_key: str) -> Dict[int, str]:
+        """run a job end to end and return the LINE blocks of each (1 based) page"""
+        job_id = await self.start(s3_key)
+        first_page = await self.wait(job_id)
+        blocks = await self.blocks(job_id, first_page)
+        logger.info("Textract job %s done in %d api calls", job_id, self.api_calls)
+        pages: Dict[int, list[str]] = {}
+        for block in blocks:
+            if block["BlockType"] == "LINE":
+                pages.setdefault(block.get("Page", 1), []).append(block["Text"])
+        return {number: "\n".join(lines) for number, lines in sorted(pages.items())}
+
+    async def detect_text(self, s3_key: str) -> str:
+        """run a job end to end and return the LINE blocks joined by newlines"""
+        pages = await self.detect_pages(s3_key)
+        return "\n".join(pages.values())
+
+
+async def parse_pdf_via_textract(s3_key: str) -> str:
     """Run Textract document‑text detection and return plain text.
 
         Parameters
         ----------
         s3_key : str
             Key of the PDF object inside settings.S3_BUCKET
-        timeout : int, optional
-            Maximum seconds to wait for job completion
-        poll_interval : float, optional
-            Seconds between GetDocumentTextDetection polls
 
         Returns
         -------
         str
-            Concatenated text detected by Textract
+            Concatenated text detected by Textract, across every result page
+    """
+    text = await TextractJobManager().detect_text(s3_key)
+    if not text:
+        raise TextractParseError(f"Textract found no text in {s3_key}")
+    return text
+
+
+async def parse_pdf_pages_via_textract(s3_key: str) -> Dict[int, str]:
+    """Run Textract document‑text detection and return the text of each page.
+
+        Returns
+        -------
+        dict
+            1 based page number -> text of its LINE blocks, pages without text are absent
     """
-    job = textract.start_document_text_detection(
-        DocumentLocation={"S3Object": {"Bucket": settings.S3_BUCKET, "Name": s3_key}}
-    )
-    # print(job)
-    job_id = job["JobId"]
-
-    while True:
-        result = textract.get_document_text_detection(JobId=job_id)
-        # print(result)
-        if result["JobStatus"] in ["SUCCEEDED", "FAILED"]:
-            break
-        time.sleep(1)
-
-    # print(result)
-    lines = [b["Text"] for b in result.get("Blocks", []) if b["BlockType"] == "LINE"]
-    text = "\n".join(lines)
-    # print(text)
-    return text or(f"AWS Textract error: {str(e)}")
\ No newline at end of file
+    return await TextractJobManager().detect_pages(s3_key)
@@ -0,0 +1,97 @@
+"""
+Textract Page Range Fan-out
+----
+large reports are split into page ranges that are ocr'd by concurrent textract jobs
+and reassembled in page order, instead of waiting on one job for the whole document
+
+every page's text is cached in the parseText table under `page#{page digest}`, so an
+edited re-upload of a report only re-ocrs the pages that actually changed
+
+Key Responsibility
+---
+textract_job_slots: worker wide semaphore bounding the textract jobs in flight
+ocr_pages: text of the requested pages, from the page cache or textract
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from src.core.config import settings
+from src.services.db import get_parsed_texts, hash_text_sha256, put_parsed_texts
+from src.services.pdf_text import page_digests, write_pages
+from src.services.textract_client import TextractJobManager
+from src.utils.s3 import upload_bytes_to_s3
+
+logger = logging.getLogger(__name__)
+
+# textID prefix of the per page ocr results
+PAGE_TEXT_PREFIX = "page#"
+
+_job_slots: Optional[asyncio.Semaphore] = None
+
+
+def textract_job_slots() -> asyncio.Semaphore:
+    """semaphore of TEXTRACT_MAX_CONCURRENT_JOBS slots shared by every document"""
+    global _job_slots
+    if _job_slots is None:
+        _job_slots = asyncio.Semaphore(settings.TEXTRACT_MAX_CONCURRENT_JOBS)
+    return _job_slots
+
+
+def page_ranges(numbers: Iterable[int], size: int) -> List[List[int]]:
+    """group sorted page numbers into runs of consecutive pages of at most `size` pages"""
+    ranges: List[List[int]] = []
+    for number in sorted(numbers):
+        if ranges and number == ranges[-1][-1] + 1 and len(ranges[-1]) < size:
+            ranges[-1].append(number)
+        else:
+            ranges.append([number])
+    return ranges
+
+
+async def _ocr_range(path: str, numbers: List[int], digests: List[str]) -> Dict[int, str]:
+    """ocr one page range and return its text keyed by (1 based) page of the range"""
+    # deterministic key so a retried range reuses the uploaded object
+    key = f"pages/{hash_text_sha256(''.join(digests[n] for n in numbers))}.pdf"
+    async with textract_job_slots():
+        data = await write_pages(path, numbers)
+        await upload_bytes_to_s3(data, key)
+        return await TextractJobManager().detect_pages(key)
+
+
+async def ocr_pages(path: str, numbers: Optional[Iterable[int]] = None) -> Dict[int, str]:
+    """ocr the (0 based) pages `numbers` of a local pdf, all pages by default
+
+    Parameter
+    ---
+    path: str
+        local path of the pdf
+    numbers: iterable of int
+        pages to ocr
+
+    Return
+    ---
+    dict
+        1 based page number -> text, same shape as parse_pdf_pages_via_textract
+    """
+    digests = await page_digests(path)
+    numbers = list(range(len(digests)) if numbers is None else numbers)
+    cache_ids = {n: PAGE_TEXT_PREFIX + digests[n] for n in numbers}
+
+    cached = await get_parsed_texts(list(cache_ids.values()))
+    texts = {n + 1: cached[cache_ids[n]] for n in numbers if cache_ids[n] in cached}
+    missing = [n for n in numbers if cache_ids[n] not in cached]
+    ranges = page_ranges(missing, settings.TEXTRACT_PAGES_PER_JOB)
+    logger.info("Page ocr: %d cached, %d pages in %d textract jobs", len(texts), len(missing), len(ranges))
+
+    results = await asyncio.gather(*(_ocr_range(path, r, digests) for r in ranges))
+
+    fresh = {}
+    for numbers_in_range, range_texts in zip(ranges, results):
+        for offset, number in enumerate(numbers_in_range):
+            text = range_texts.get(offset + 1, "")
+            texts[number + 1] = text
+            fresh[cache_ids[number]] = text
+    if fresh:
+        await put_parsed_texts(fresh)
+    return dict(sorted(texts.items()))
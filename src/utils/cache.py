@@ -0,0 +1,91 @@
+"""
+in-process cache utility
+--
+bounded LRU cache with a per entry TTL, sized by bytes rather than entry count so a
+few very large parsed reports cannot blow the worker memory
+"""
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """least recently used cache bounded by total value size in bytes
+
+    Parameter
+    ----
+    max_bytes: int
+        upper bound of the summed `sizeof` of all values
+    ttl_seconds: float
+        lifetime of an entry, expired entries are dropped on access
+    sizeof: callable
+        size estimate of a value, defaults to sys.getsizeof
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, sizeof: Callable[[Any], int] = sys.getsizeof):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sizeof = sizeof
+        # key -> (expires_at, size, value), oldest first
+        self._items: "OrderedDict[Hashable, tuple[float, int, Any]]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """return the cached value of `key` or none, refreshing its recency"""
+        entry = self._items.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, _, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """cache `value`, evicting the least recently used entries to make room"""
+        size = self._sizeof(value)
+        if key in self._items:
+            self._remove(key)
+        if size > self.max_bytes:
+            # would evict everything and still not fit
+            return
+        while self.current_bytes + size > self.max_bytes:
+            oldest = next(iter(self._items))
+            self._remove(oldest)
+            self.evictions += 1
+        self._items[key] = (time.monotonic() + self.ttl_seconds, size, value)
+        self.current_bytes += size
+
+    def pop(self, key: Hashable) -> None:
+        """drop `key` if cached"""
+        if key in self._items:
+            self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._items.pop(key)
+        self.current_bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict:
+        """hit, miss and eviction counters plus the current footprint"""
+        return {
+            "entries": len(self._items),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -2,23 +2,48 @@
 s3 upload utility
 --
 helper module for centralising all the s3 functionalities
+
+pdfs are stored content addressed under `uploads/{sha256}.pdf`, so the same document
+is only ever uploaded once, and streamed from the staged file with a multipart upload
+so large documents are never fully loaded in memory
 """
-import boto3
-import uuid
+from typing import BinaryIO
+
+from botocore.exceptions import ClientError
 
+from src.core.aws import aws
 from src.core.config import settings
 
-# Initialize S3 client using region from settings
-s3 = boto3.client("s3", region_name=settings.AWS_REGION)
 
-def upload_pdf_to_s3(file_content: bytes, filename: str) -> tuple[str, str]:
-    """Upload a pdf byte to s3 and returns its key and url
+def pdf_key(digest: str) -> str:
+    """content addressed s3 key of a pdf from its sha-256 digest"""
+    return f"uploads/{digest}.pdf"
+
+
+def object_url(key: str) -> str:
+    """construct a https url to an object of the bucket"""
+    return f"https://{settings.S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
+
+
+async def object_exists(key: str) -> bool:
+    """cheap HEAD request telling whether `key` is already in the bucket"""
+    try:
+        await aws.s3.head_object(Bucket=settings.S3_BUCKET, Key=key)
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+async def upload_pdf_to_s3(file_path: str, digest: str) -> tuple[str, str]:
+    """Stream a staged pdf to s3 unless already stored and returns its key and url
     Parameter
     ----
-    file_content: bytes
-        in-memory pdf payload
-    filename:
-        original filename from client
+    file_path: str
+        local path of the staged pdf
+    digest:
+        sha-256 of the file, used as object key
 
     Return:
     ---
@@ -26,17 +51,59 @@ def upload_pdf_to_s3(file_content: bytes, filename: str) -> tuple[str, str]:
         (key,url) where key is s3 object path adn url is http url
     """
 
-    # generate unique key based on filename
-    key = f"uploads/{uuid.uuid4()}_{filename}"
+    # key derived from the content, identical pdfs map to the same object
+    key = pdf_key(digest)
+
+    # perform the actual upload to s3 only for unknown content
+    if not await object_exists(key):
+        with open(file_path, "rb") as f:
+            first_part = f.read(settings.S3_MULTIPART_PART_BYTES)
+            if len(first_part) < settings.S3_MULTIPART_PART_BYTES:
+                # fits in a single part, plain put
+                await aws.s3.put_object(
+                    Bucket=settings.S3_BUCKET,
+                    Key=key,
+                    Body=first_part,
+                    ContentType="application/pdf"
+                )
+            else:
+                await _multipart_upload(f, key, first_part)
+
+    return key, object_url(key)
+
+
+async def upload_bytes_to_s3(data: bytes, key: str) -> str:
+    """upload a small in-memory pdf (e.g. a page range) unless `key` exists and return key"""
+    if not await object_exists(key):
+        await aws.s3.put_object(
+            Bucket=settings.S3_BUCKET,
+            Key=key,
+            Body=data,
+            ContentType="application/pdf"
+        )
+    return key
+
 
-    # perform the actual upload to s3
-    s3.put_object(
-        Bucket=settings.S3_BUCKET,
-        Key=key,
-        Body=file_content,
-        ContentType="application/pdf"
+async def _multipart_upload(f: BinaryIO, key: str, first_part: bytes) -> None:
+    """upload `f` part by part, only one part is held in memory at a time"""
+    upload = await aws.s3.create_multipart_upload(
+        Bucket=settings.S3_BUCKET, Key=key, ContentType="application/pdf"
     )
+    upload_id = upload["UploadId"]
+    parts = []
+    try:
+        part, number = first_part, 1
+        while part:
+            response = await aws.s3.upload_part(
+                Bucket=settings.S3_BUCKET, Key=key, UploadId=upload_id, PartNumber=number, Body=part,
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": number})
+            part, number = f.read(settings.S3_MULTIPART_PART_BYTES), number + 1
 
-    # construct a https url to uploaded object
-    url = f"https://{settings.S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
-    return key, url
+        await aws.s3.complete_multipart_upload(
+            Bucket=settings.S3_BUCKET, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts},
+        )
+    except BaseException:
+        # do not leave orphaned parts billed in the bucket
+        await aws.s3.abort_multipart_upload(Bucket=settings.S3_BUCKET, Key=key, UploadId=upload_id)
+        raise
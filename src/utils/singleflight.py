@@ -0,0 +1,46 @@
+"""
+single-flight utility
+--
+collapses concurrent calls sharing a key into one execution, every caller awaits the
+same task and receives its result (or its exception)
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """in-process deduplication of concurrent work keyed by e.g. a content digest"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """run `fn` unless a call for `key` is already in flight, then wait for that one
+
+        the work runs in its own task, so a disconnecting caller does not cancel it for
+        the others still waiting
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            logger.info("Joining in-flight call for %s", key)
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # mark the exception as retrieved even if every caller went away
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("In-flight call for %s failed: %s", key, task.exception())
+
+    def in_flight(self) -> int:
+        """number of keys currently being computed"""
+        return len(self._calls)
@@ -0,0 +1,15 @@
+"""
+server-sent events utility
+--
+formats events for a StreamingResponse with media type text/event-stream
+"""
+import json
+from typing import Any
+
+# headers keeping proxies (nginx, alb) from buffering the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_event(event: str, data: Any) -> str:
+    """one sse frame, `data` serialised as a single json line"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,14 @@
+"""
+token estimate utility
+--
+cheap token count used for budgeting prompts and rate limits, without a tokenizer
+dependency
+"""
+
+# llama/gpt style tokenizers average roughly four characters of english per token
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """rough token count of `text`"""
+    return -(-len(text) // CHARS_PER_TOKEN)
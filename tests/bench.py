@@ -0,0 +1,278 @@
+"""
+helpers of the stub-backed benchmarks in this folder
+
+every bench_*.py script swaps aws, textract or the llm provider for an in-process stub
+with a configurable latency and prints its measurements as a table; run one from the
+repository root with `python -m tests.bench_<name>`. pytest does not collect them
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, Optional, Union
+
+from botocore.exceptions import ClientError
+
+from src.core.aws import aws
+from src.core.config import settings
+from src.utils.tokens import estimate_tokens
+
+# exchange rates of the benchmarks, same as the test suite
+RATES = {"EUR": 1.0, "USD": 0.91, "GBP": 1.18}
+
+
+def offline_settings(**overrides) -> None:
+    """answer the ssm backed settings locally so no benchmark ever reaches aws"""
+    settings.__dict__.update({
+        "S3_BUCKET": "bench-bucket",
+        "AWS_REGION": "eu-central-1",
+        "GROQ_API_KEY": "bench",
+        "OPENAI_API_KEY": "bench",
+        "EXCHANGE_RATES": dict(RATES),
+    })
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+
+class _Latency:
+    """a network round-trip, awaited like aioboto3 or blocking the loop like boto3"""
+
+    def __init__(self, latency: float, blocking: bool = False):
+        self.latency = latency
+        self.blocking = blocking
+        self.calls = 0
+
+    async def _wait(self) -> None:
+        self.calls += 1
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+
+
+class StubS3(_Latency):
+    """the s3 calls of src.utils.s3 and the offloaded texts, objects kept in memory"""
+
+    def __init__(self, latency: float, blocking: bool = False):
+        super().__init__(latency, blocking)
+        self.objects: dict = {}
+        self.parts: dict = {}
+
+    async def head_object(self, Bucket, Key):
+        await self._wait()
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {}
+
+    async def put_object(self, Bucket, Key, Body, **kwargs):
+        await self._wait()
+        self.objects[Key] = len(Body)
+
+    async def create_multipart_upload(self, Bucket, Key, **kwargs):
+        await self._wait()
+        self.parts[Key] = 0
+        return {"UploadId": Key}
+
+    async def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        await self._wait()
+        self.parts[Key] += len(Body)
+        return {"ETag": str(PartNumber)}
+
+    async def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        await self._wait()
+        self.objects[Key] = self.parts.pop(Key)
+
+    async def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.parts.pop(Key, None)
+
+
+class StubTable(_Latency):
+    """a dynamodb table resource keyed by `key`, items kept in memory"""
+
+    def __init__(self, key: str, latency: float, blocking: bool = False):
+        super().__init__(latency, blocking)
+        self.key = key
+        self.items: dict = {}
+
+    async def get_item(self, Key, **kwargs):
+        await self._wait()
+        item = self.items.get(Key[self.key])
+        return {"Item": dict(item)} if item is not None else {}
+
+    async def put_item(self, Item, **kwargs):
+        await self._wait()
+        self.items[Item[self.key]] = dict(Item)
+        return {}
+
+
+def stub_aws(latency: float, blocking: bool = False) -> None:
+    """replace the shared aws clients by stubs of the given round-trip latency"""
+    aws.s3 = StubS3(latency, blocking)
+    aws.parse_text_table = StubTable("textID", latency, blocking)
+    aws.analysis_result_table = StubTable("resultID", latency, blocking)
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.fake.lock:
+            self.server.fake.connections += 1
+
+    def do_POST(self):
+        fake = self.server.fake
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with fake.lock:
+            fake.requests.append(body)
+        latency = fake.latency(body) if callable(fake.latency) else fake.latency
+        time.sleep(latency)
+        content = fake.reply(body)
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in body.get("messages", []))
+        completion_tokens = estimate_tokens(content)
+        payload = json.dumps({
+            "id": "bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "bench"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeChatServer:
+    """openai compatible chat completions endpoint on localhost, for groq and openai
+    clients alike; answers every POST with `reply(body)` after `latency` seconds (or
+    `latency(body)`) and records the requests and the tcp connections opened"""
+
+    def __init__(
+        self,
+        latency: Union[float, Callable[[dict], float]] = 0.0,
+        reply: Callable[[dict], str] = lambda body: "{}",
+    ):
+        self.latency = latency
+        self.reply = reply
+        self.requests: list[dict] = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> "FakeChatServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _ChatHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_WORDS = (
+    "stadium roof inspection structural engineer season flood risk insurance premium "
+    "liability property valuation business interruption revenue loss currency exposure "
+    "policy limit deductible exclusion terrorism cyber fire sprinkler evacuation crowd "
+    "turnstile pitch drainage floodlight generator contract supplier sponsor broadcast"
+).split()
+
+
+def report_lines(pages: int, lines_per_page: int = 40, seed: int = 0) -> list[list[str]]:
+    """deterministic pseudo report prose, `lines_per_page` lines of ~10 words per page"""
+    rng = random.Random(seed)
+    return [
+        [" ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 12))).capitalize() + "."
+         for _ in range(lines_per_page)]
+        for _ in range(pages)
+    ]
+
+
+def synthetic_pdf(pages: list[list[str]], scanned: Iterable[int] = ()) -> bytes:
+    """a pdf drawing each page's lines as real text, except the (0 based) `scanned`
+    pages which only hold an image, like a scan without ocr layer"""
+    scanned = set(scanned)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    # 1x1 grey image standing in for a scanned page
+    objects.append(b"<< /Type /XObject /Subtype /Image /Width 1 /Height 1 /ColorSpace /DeviceGray "
+                   b"/BitsPerComponent 8 /Length 1 >>\nstream\n\x80\nendstream")
+    kids = []
+    for number, lines in enumerate(pages):
+        if number in scanned:
+            content = b"q 595 0 0 842 0 0 cm /Im1 Do Q"
+            resources = b"<< /XObject << /Im1 4 0 R >> >>"
+        else:
+            escaped = (line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines)
+            content = ("BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET").encode()
+            resources = b"<< /Font << /F1 3 0 R >> >>"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources " + resources
+            + b" /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % len(kids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def percentile(samples: Iterable[float], q: float) -> float:
+    """nearest rank percentile, q in [0, 100]"""
+    ordered = sorted(samples)
+    if not ordered:
+        return math.nan
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def print_table(title: str, rows: list[dict], note: Optional[str] = None) -> None:
+    """print rows of {column: value} aligned under their column names"""
+    print(f"\n{title}")
+    if note:
+        print(note)
+    if not rows:
+        return
+    columns = list(rows[0])
+    cells = [[_cell(row.get(c)) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(v.rjust(w) for v, w in zip(r, widths)))
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.4g}" if abs(value) < 1000 else f"{value:.0f}"
+    return str(value)
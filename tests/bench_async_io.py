@@ -0,0 +1,68 @@
+"""
+concurrent upload throughput with blocking vs awaited aws calls
+
+every simulated request runs the i/o of a cold upload through the real helpers:
+parsed text lookup (miss), s3 existence check and put, parsed text write. the stub
+clients either block the event loop for each round-trip, as the synchronous boto3
+calls did, or await it like the shared aioboto3 clients
+
+    python -m tests.bench_async_io --requests 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from src.services import db
+from src.utils.s3 import upload_pdf_to_s3
+from tests.bench import offline_settings, print_table, stub_aws
+
+
+async def _request(i: int, path: str) -> None:
+    digest = f"bench-{i}"
+    if await db.get_parsed_text(digest) is None:
+        await upload_pdf_to_s3(path, digest)
+        await db.put_parsed_text(digest, "parsed text")
+
+
+async def _run(requests: int, path: str) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(_request(i, path) for i in range(requests)))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per aws round-trip")
+    args = parser.parse_args()
+
+    offline_settings()
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "report.pdf")
+        with open(path, "wb") as f:
+            f.write(b"%PDF-1.4\n" + os.urandom(64 * 1024))
+
+        for label, blocking in (("blocking (before)", True), ("async (after)", False)):
+            stub_aws(args.latency, blocking)
+            for i in range(args.requests):
+                db.parsed_text_cache.pop(f"bench-{i}")
+            seconds = asyncio.run(_run(args.requests, path))
+            rows.append({
+                "client": label,
+                "requests": args.requests,
+                "wall s": seconds,
+                "req/s": args.requests / seconds,
+            })
+
+    print_table(
+        "cold upload i/o, all requests concurrent",
+        rows,
+        f"4 aws round-trips per request at {args.latency * 1000:.0f} ms each",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+portfolio throughput in documents per minute, one upload at a time vs the batch endpoint
+
+every document's pipeline is replaced by a stub that holds a textract job slot for
+--ocr-seconds, then makes the currency conversion and six analysis calls, each holding
+an llm_registry slot for --llm-seconds; the worker wide bounds are the real ones. a
+tenth of every portfolio repeats an earlier document. "one by one" analyses the
+documents in turn as a client posting them to /upload would; "batch" is analyse_batch.
+durations are multiplied by --time-scale and the table scales them back
+
+    python -m tests.bench_batch --documents 10 50 200
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from src.core.config import settings
+from src.services import batch, textract_fanout
+from src.services.batch import analyse_batch
+from src.services.ingest import StagedUpload
+from src.services.llm import llm_registry
+from src.services.textract_fanout import textract_job_slots
+from tests.bench import offline_settings, print_table
+
+ANALYSIS_CALLS = 6
+
+
+def _stub_pipeline(ocr: float, llm: float, counts: dict) -> None:
+    async def llm_call() -> None:
+        async with llm_registry.slot():
+            counts["llm calls"] += 1
+            await asyncio.sleep(llm)
+
+    async def analyse_document(staged: StagedUpload, variant: str = "full"):
+        async with textract_job_slots():
+            await asyncio.sleep(ocr)
+        await llm_call()
+        await asyncio.gather(*(llm_call() for _ in range(ANALYSIS_CALLS)))
+        return SimpleNamespace(model_dump=lambda: {"digest": staged.digest})
+
+    batch.analyse_document = analyse_document
+
+
+def _portfolio(documents: int) -> list[StagedUpload]:
+    # every tenth upload repeats the document before it
+    return [
+        StagedUpload(path=f"/nonexistent/{n}.pdf", digest=f"doc-{n - (n % 10 == 9)}", size=0, filename=f"{n}.pdf")
+        for n in range(documents)
+    ]
+
+
+async def _one_by_one(documents: list[StagedUpload]) -> int:
+    for staged in documents:
+        await batch.analyse_document(staged)
+    return len(documents)
+
+
+async def _batch(documents: list[StagedUpload]) -> int:
+    events = [event async for event, _ in analyse_batch(documents)]
+    return events.count("document")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--ocr-seconds", type=float, default=20.0)
+    parser.add_argument("--llm-seconds", type=float, default=8.0)
+    parser.add_argument("--time-scale", type=float, default=0.002)
+    args = parser.parse_args()
+
+    scale = args.time_scale
+    offline_settings(LLM_RPM_LIMIT=0, LLM_TPM_LIMIT=0)
+    rows = []
+    for documents in args.documents:
+        for label, run in (("one by one (before)", _one_by_one), ("batch (after)", _batch)):
+            counts = {"llm calls": 0}
+            _stub_pipeline(args.ocr_seconds * scale, args.llm_seconds * scale, counts)
+            # the worker wide slots belong to the event loop of the previous run
+            batch._document_slots = textract_fanout._job_slots = None
+            llm_registry._semaphores.clear()
+            start = time.perf_counter()
+            analysed = asyncio.run(run(_portfolio(documents)))
+            minutes = (time.perf_counter() - start) / scale / 60
+            rows.append({
+                "documents": documents,
+                "ingest": label,
+                "analysed": analysed,
+                "llm calls": counts["llm calls"],
+                "minutes (unscaled)": minutes,
+                "documents/min": documents / minutes,
+            })
+
+    print_table(
+        "portfolio analysis throughput",
+        rows,
+        f"ocr {args.ocr_seconds:g} s, {1 + ANALYSIS_CALLS} llm calls of {args.llm_seconds:g} s per document; "
+        f"{settings.BATCH_MAX_CONCURRENT_DOCUMENTS} documents, {settings.LLM_MAX_CONCURRENCY} llm calls and "
+        f"{settings.TEXTRACT_MAX_CONCURRENT_JOBS} textract jobs in flight; run at {scale:g}x time",
+    )
+
+
+if __name__ == "__main__":
+    main()
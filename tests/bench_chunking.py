@@ -0,0 +1,89 @@
+"""
+end-to-end node latency and token usage of long reports, one prompt vs map-reduce
+
+the business interruption node analyses synthetic reports of 10 to 200 pages against
+a fake completions server whose latency grows with the prompt: --base-seconds plus
+--token-seconds per input token. "one prompt" sends the whole text in a single call
+as the nodes used to; "map-reduce" is the node as shipped, CHUNK_MAX_TOKENS sections
+in parallel. a prompt above --context-tokens would be rejected by the provider
+
+    python -m tests.bench_chunking --pages 10 50 200
+"""
+import argparse
+import asyncio
+import gc
+import os
+import time
+
+from src.core.config import settings
+from src.services.business_interruption import build_business_interruption_chain, run_business_interruption
+from src.services.llm import llm_registry
+from src.utils.tokens import estimate_tokens
+from tests.bench import FakeChatServer, offline_settings, print_table, report_lines
+
+
+def _prompt_tokens(body: dict) -> int:
+    return sum(estimate_tokens(str(m.get("content", ""))) for m in body.get("messages", []))
+
+
+async def _one_prompt(text: str) -> dict:
+    chain = llm_registry.chain("business_interruption", build_business_interruption_chain)
+    return await llm_registry.ainvoke(chain, {"cleaned_text": text})
+
+
+async def _map_reduce(text: str) -> dict:
+    return await run_business_interruption({"converted_text": text})
+
+
+async def _run(server: FakeChatServer, pages_list: list[int], context_tokens: int) -> list[dict]:
+    rows = []
+    for pages in pages_list:
+        text = "\n".join(line for page in report_lines(pages, seed=pages) for line in page)
+        for label, node in (("one prompt (before)", _one_prompt), ("map-reduce (after)", _map_reduce)):
+            sent = len(server.requests)
+            start = time.perf_counter()
+            await node(text)
+            seconds = time.perf_counter() - start
+            prompts = [_prompt_tokens(body) for body in server.requests[sent:]]
+            rows.append({
+                "pages": pages,
+                "node": label,
+                "calls": len(prompts),
+                "input tokens": sum(prompts),
+                "largest prompt": max(prompts),
+                "fits context": max(prompts) <= context_tokens,
+                "wall s": seconds,
+            })
+    await llm_registry.aclose()
+    gc.collect()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--base-seconds", type=float, default=0.3)
+    parser.add_argument("--token-seconds", type=float, default=1e-5)
+    parser.add_argument("--context-tokens", type=int, default=128_000)
+    args = parser.parse_args()
+
+    offline_settings(LLM_PROVIDER="groq", LLM_RPM_LIMIT=0, LLM_TPM_LIMIT=0, RELEVANCE_FILTER_ENABLED=False)
+
+    def latency(body: dict) -> float:
+        return args.base_seconds + args.token_seconds * _prompt_tokens(body)
+
+    with FakeChatServer(latency) as server:
+        # the groq sdk reads its endpoint from the environment
+        os.environ["GROQ_BASE_URL"] = server.url
+        rows = asyncio.run(_run(server, args.pages, args.context_tokens))
+
+    print_table(
+        "business interruption node on long reports",
+        rows,
+        f"completion latency {args.base_seconds:g} s + {args.token_seconds:g} s per input token, "
+        f"{settings.CHUNK_MAX_TOKENS} token sections, {args.context_tokens} token context",
+    )
+
+
+if __name__ == "__main__":
+    main()
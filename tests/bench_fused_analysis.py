@@ -0,0 +1,144 @@
+"""
+cost and latency of an analysis run, six fan-out calls vs one fused call
+
+the "full" and "fused" graphs run against a fake completions server answering every
+node with a section of --section-tokens tokens. a completion takes --base-seconds plus
+--input-seconds per prompt token plus --output-seconds per generated token, so the
+fused call pays the report once but generates all six sections in sequence. cost uses
+--input-price and --output-price in usd per million tokens; the currency conversion is
+stubbed out since it is the same call in both graphs
+
+    python -m tests.bench_fused_analysis --pages 10 50
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import time
+
+from src.services import graph
+from src.services.business_interruption import BUSINESS_INTERRUPTION_INSTRUCTIONS
+from src.services.current_insurance import CURRENT_INSURANCE_INSTRUCTIONS
+from src.services.fused_analysis import FUSED_ANALYSIS_INSTRUCTIONS
+from src.services.graph import get_graph, variant_sections
+from src.services.insurance_recommendation import INSURANCE_RECOMMENDATION_INSTRUCTIONS
+from src.services.llm import llm_registry
+from src.services.multi_currency_risk import MULTI_CURRENCY_RISK_INSTRUCTIONS
+from src.services.property_valudation import PROPERTY_VALUATION_INSTRUCTIONS
+from src.services.risk_percentages import RISK_PERCENTAGE_INSTRUCTIONS
+from src.utils.tokens import estimate_tokens
+from tests.bench import FakeChatServer, offline_settings, print_table, report_lines
+
+
+def _sections(tokens: int) -> dict:
+    """one finding per section, its free text padded to about `tokens` tokens"""
+    pad = "detail " * (tokens * 4 // 7)
+    return {
+        "executive_summary": pad,
+        "risk_percentages": [{"risk_name": "pitch flood", "probability": "15%", "context": "annual", "notes": pad}],
+        "business_interruption": {
+            "closure": {"amount_eur": 450000, "timeframe": "per match", "quote": "closure", "notes": pad},
+        },
+        "current_insurance_gaps": [{"gap_name": "flood exclusion", "issue": "excluded", "quote": "excludes", "notes": pad}],
+        "multi_currency_risk": {"usd sponsorship": {"probability": "30%", "context": "annual", "notes": pad}},
+        "insurance_recommendations": {
+            "parametric_cover": {"coverage": "flood", "rationale": pad, "timeline": "renewal", "financial_impact": "low"},
+        },
+    }
+
+
+def _reply(tokens: int):
+    sections = _sections(tokens)
+    by_node = {
+        PROPERTY_VALUATION_INSTRUCTIONS: {"executive_summary": sections["executive_summary"]},
+        RISK_PERCENTAGE_INSTRUCTIONS: {"risks": sections["risk_percentages"]},
+        BUSINESS_INTERRUPTION_INSTRUCTIONS: sections["business_interruption"],
+        CURRENT_INSURANCE_INSTRUCTIONS: {"current_insurance_gaps": sections["current_insurance_gaps"]},
+        MULTI_CURRENCY_RISK_INSTRUCTIONS: sections["multi_currency_risk"],
+        INSURANCE_RECOMMENDATION_INSTRUCTIONS: sections["insurance_recommendations"],
+        FUSED_ANALYSIS_INSTRUCTIONS: sections,
+    }
+
+    # the prompts end with the node instructions, their doubled braces rendered
+    by_node = {instructions.replace("{{", "{").replace("}}", "}"): out for instructions, out in by_node.items()}
+
+    def reply(body: dict) -> str:
+        prompt = body["messages"][-1]["content"]
+        return json.dumps(next(out for instructions, out in by_node.items() if prompt.endswith(instructions)))
+
+    return reply
+
+
+def _stub_conversion() -> None:
+    async def convert(state: dict) -> dict:
+        return {"converted_text": state["input_text"]}
+
+    graph.run_currency_conversion = convert
+
+
+async def _run(server: FakeChatServer, pages_list: list[int], args) -> list[dict]:
+    rows = []
+    for pages in pages_list:
+        text = "\n".join(line for page in report_lines(pages, seed=pages) for line in page)
+        results = {}
+        for variant, label in (("full", "fan-out (before)"), ("fused", "fused (after)")):
+            sent = len(server.requests)
+            start = time.perf_counter()
+            state = await get_graph(variant).ainvoke({"input_text": text, "failed_sections": []})
+            seconds = time.perf_counter() - start
+            bodies = server.requests[sent:]
+            prompt = sum(estimate_tokens(m["content"]) for body in bodies for m in body["messages"])
+            completion = sum(estimate_tokens(server.reply(body)) for body in bodies)
+            results[variant] = {s: state[s] for s in variant_sections(variant)}
+            rows.append({
+                "pages": pages,
+                "graph": label,
+                "calls": len(bodies),
+                "input tokens": prompt,
+                "output tokens": completion,
+                "cost usd": (prompt * args.input_price + completion * args.output_price) / 1e6,
+                "wall s": seconds,
+                "degraded": len(state["failed_sections"]),
+                "same sections": None,
+            })
+        rows[-1]["same sections"] = results["fused"] == results["full"]
+    await llm_registry.aclose()
+    gc.collect()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--section-tokens", type=int, default=300)
+    parser.add_argument("--base-seconds", type=float, default=0.2)
+    parser.add_argument("--input-seconds", type=float, default=5e-6)
+    parser.add_argument("--output-seconds", type=float, default=2e-3)
+    parser.add_argument("--input-price", type=float, default=0.59)
+    parser.add_argument("--output-price", type=float, default=0.79)
+    args = parser.parse_args()
+
+    offline_settings(LLM_PROVIDER="groq", LLM_RPM_LIMIT=0, LLM_TPM_LIMIT=0, RELEVANCE_FILTER_ENABLED=False)
+    _stub_conversion()
+    reply = _reply(args.section_tokens)
+
+    def latency(body: dict) -> float:
+        prompt = sum(estimate_tokens(m["content"]) for m in body["messages"])
+        return args.base_seconds + args.input_seconds * prompt + args.output_seconds * estimate_tokens(reply(body))
+
+    with FakeChatServer(latency, reply) as server:
+        # the groq sdk reads its endpoint from the environment
+        os.environ["GROQ_BASE_URL"] = server.url
+        rows = asyncio.run(_run(server, args.pages, args))
+
+    print_table(
+        "analysis run, fan-out vs fused",
+        rows,
+        f"completion {args.base_seconds:g} s + {args.input_seconds:g} s/input token + {args.output_seconds:g} s/output "
+        f"token, {args.section_tokens} tokens per section, usd {args.input_price:g}/{args.output_price:g} per M tokens",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+request overhead of compiling the langgraph dag per request vs once per worker
+
+the conversion and analysis nodes are replaced by stubs answering after --latency,
+so the measured difference is the compilation alone. every request either builds
+its graph (build_graph) as the endpoint used to, or takes the shared one (get_graph)
+
+    python -m tests.bench_graph_compile --requests 100 --concurrency 20
+"""
+import argparse
+import asyncio
+import time
+
+from src.services import graph
+from src.services.graph import ANALYSIS_NODES, GRAPH_VARIANTS, NODE_SECTIONS, build_graph, get_graph
+from tests.bench import offline_settings, percentile, print_table
+
+STATE = {
+    "input_text": "report",
+    "converted_text": "",
+    "property_valuations_s": {},
+    "risk_percentage_s": {},
+    "business_interruption_s": {},
+    "current_insurance_s": {},
+    "multi_currency_risk_s": {},
+    "insurance_recommendation_s": {},
+    "failed_sections": [],
+}
+
+
+def _stub_nodes(latency: float) -> None:
+    async def convert(state: dict) -> dict:
+        await asyncio.sleep(latency)
+        return {"converted_text": state["input_text"]}
+
+    def analysis(name: str):
+        async def run(state: dict) -> dict:
+            await asyncio.sleep(latency)
+            return {section: {"stub": name} for section in NODE_SECTIONS[name]}
+        return run
+
+    graph.run_currency_conversion = convert
+    for name in ANALYSIS_NODES:
+        ANALYSIS_NODES[name] = analysis(name)
+
+
+async def _request(compile_per_request: bool) -> float:
+    start = time.perf_counter()
+    dag = build_graph(GRAPH_VARIANTS["full"]) if compile_per_request else get_graph("full")
+    await dag.ainvoke(dict(STATE))
+    return time.perf_counter() - start
+
+
+async def _run(compile_per_request: bool, requests: int, concurrency: int) -> tuple[list[float], float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded() -> float:
+        async with semaphore:
+            return await _request(compile_per_request)
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(bounded() for _ in range(requests)))
+    return latencies, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per stub node")
+    args = parser.parse_args()
+
+    offline_settings()
+    _stub_nodes(args.latency)
+    rows = []
+    for label, per_request in (("per request (before)", True), ("once per worker (after)", False)):
+        latencies, wall = asyncio.run(_run(per_request, args.requests, args.concurrency))
+        rows.append({
+            "graph": label,
+            "p50 ms": 1000 * percentile(latencies, 50),
+            "p99 ms": 1000 * percentile(latencies, 99),
+            "req/s": args.requests / wall,
+        })
+
+    print_table(
+        "full variant with stub nodes",
+        rows,
+        f"{args.requests} requests, {args.concurrency} concurrent, {args.latency * 1000:.0f} ms per stub node",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+per document llm setup overhead, per-node clients vs the shared registry
+
+every simulated document runs the six analysis chains concurrently against a local
+fake chat completions server. "per node" builds a fresh PromptTemplate, ChatGroq and
+parser for every node of every document as the nodes used to; "registry" takes the
+pre-built chains and pooled client of llm_registry
+
+    python -m tests.bench_llm_registry --documents 20 --latency 0.05
+"""
+import argparse
+import asyncio
+import gc
+import os
+import time
+
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_groq import ChatGroq
+
+from src.core.config import settings
+from src.services.business_interruption import build_business_interruption_chain, build_business_interruption_prompt
+from src.services.current_insurance import build_current_insurance_chain, build_current_insurance_prompt
+from src.services.insurance_recommendation import (
+    build_insurance_recommendation_chain, build_insurance_recommendation_prompt,
+)
+from src.services.llm import llm_registry
+from src.services.multi_currency_risk import build_multi_currency_risk_chain, build_multi_currency_risk_prompt
+from src.services.property_valudation import build_insurance_analysis_chain, build_insurance_analysis_prompt
+from src.services.risk_percentages import build_risk_percentage_chain, build_risk_percentage_prompt
+from tests.bench import FakeChatServer, offline_settings, percentile, print_table
+
+# (registry name, chain factory, prompt) of the six analysis nodes
+NODES = [
+    ("property_valuation", build_insurance_analysis_chain, build_insurance_analysis_prompt),
+    ("risk_percentage", build_risk_percentage_chain, build_risk_percentage_prompt),
+    ("business_interruption", build_business_interruption_chain, build_business_interruption_prompt),
+    ("current_insurance", build_current_insurance_chain, build_current_insurance_prompt),
+    ("multi_currency_risk", build_multi_currency_risk_chain, build_multi_currency_risk_prompt),
+    ("insurance_recommendation", build_insurance_recommendation_chain, build_insurance_recommendation_prompt),
+]
+
+TEXT = "The stadium roof was inspected in March and no defects were reported. " * 50
+
+
+async def _per_node_document() -> float:
+    """one document with the clients built inside every node, returns the setup seconds"""
+    start = time.perf_counter()
+    chains = []
+    for _, _, prompt in NODES:
+        template = prompt()
+        llm = ChatGroq(
+            model=settings.LLM_MODEL, temperature=settings.LLM_TEMPERATURE, groq_api_key=settings.GROQ_API_KEY,
+        )
+        chains.append(PromptTemplate(input_variables=["cleaned_text"], template=template.template) | llm | JsonOutputParser())
+    setup = time.perf_counter() - start
+    await asyncio.gather(*(chain.ainvoke({"cleaned_text": TEXT}) for chain in chains))
+    return setup
+
+
+async def _registry_document() -> float:
+    """one document through the shared registry, returns the setup seconds"""
+    start = time.perf_counter()
+    chains = [llm_registry.chain(name, factory) for name, factory, _ in NODES]
+    setup = time.perf_counter() - start
+    await asyncio.gather(*(llm_registry.ainvoke(chain, {"cleaned_text": TEXT}) for chain in chains))
+    return setup
+
+
+async def _run(server: FakeChatServer, documents: int) -> list[dict]:
+    rows = []
+    for label, document in (("per node (before)", _per_node_document), ("registry (after)", _registry_document)):
+        connections = server.connections
+        setups, walls = [], []
+        for _ in range(documents):
+            start = time.perf_counter()
+            setups.append(await document())
+            walls.append(time.perf_counter() - start)
+        rows.append({
+            "clients": label,
+            "documents": documents,
+            "setup ms/doc": 1000 * sum(setups) / len(setups),
+            "p50 doc s": percentile(walls, 50),
+            "p99 doc s": percentile(walls, 99),
+            "connections": server.connections - connections,
+        })
+    await llm_registry.aclose()
+    # let the per node clients close their connections while the loop still runs
+    gc.collect()
+    await asyncio.sleep(0.1)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per completion")
+    args = parser.parse_args()
+
+    offline_settings(LLM_PROVIDER="groq", LLM_RPM_LIMIT=0, LLM_TPM_LIMIT=0)
+    with FakeChatServer(args.latency) as server:
+        # the groq sdk reads its endpoint from the environment
+        os.environ["GROQ_BASE_URL"] = server.url
+        rows = asyncio.run(_run(server, args.documents))
+
+    print_table(
+        "six analysis chains per document against a fake completions server",
+        rows,
+        f"{args.latency * 1000:.0f} ms per completion, documents run one after the other",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+hot parsed text lookup latency with and without the in-process front cache
+
+a working set of parsed reports is looked up repeatedly through get_parsed_text,
+with a local dynamodb stand-in answering after --latency; "dynamodb only" sizes the
+front cache to zero bytes so every lookup is a round-trip
+
+    python -m tests.bench_parsed_text_cache --lookups 2000 --documents 50
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from src.core.aws import aws
+from src.services import db
+from tests.bench import offline_settings, percentile, print_table, stub_aws
+
+
+async def _lookups(ids: list[str], lookups: int) -> list[float]:
+    # warm up, the measured lookups are all hot
+    for text_id in ids:
+        await db.get_parsed_text(text_id)
+    samples = []
+    for _ in range(lookups):
+        text_id = random.choice(ids)
+        start = time.perf_counter()
+        assert await db.get_parsed_text(text_id) is not None
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--text-bytes", type=int, default=200_000)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per dynamodb round-trip")
+    args = parser.parse_args()
+
+    offline_settings()
+    stub_aws(args.latency)
+    ids = [f"doc-{i}" for i in range(args.documents)]
+    for text_id in ids:
+        aws.parse_text_table.items[text_id] = {"textID": text_id, "parseText": "x" * args.text_bytes}
+
+    rows = []
+    max_bytes = db.parsed_text_cache.max_bytes
+    for label, cache_bytes in (("dynamodb only (before)", 0), ("front cache (after)", max_bytes)):
+        db.parsed_text_cache.max_bytes = cache_bytes
+        calls = aws.parse_text_table.calls
+        samples = asyncio.run(_lookups(ids, args.lookups))
+        rows.append({
+            "lookup": label,
+            "p50 us": 1e6 * percentile(samples, 50),
+            "p99 us": 1e6 * percentile(samples, 99),
+            "dynamodb calls": aws.parse_text_table.calls - calls,
+        })
+
+    print_table(
+        "hot get_parsed_text lookups",
+        rows,
+        f"{args.lookups} lookups over {args.documents} documents of {args.text_bytes // 1000} kB, "
+        f"{args.latency * 1000:.0f} ms per dynamodb round-trip",
+    )
+
+
+if __name__ == "__main__":
+    main()
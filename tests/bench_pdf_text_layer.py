@@ -0,0 +1,83 @@
+"""
+local text layer fast path: latency and text fidelity against textract output
+
+a corpus of synthetic reports, born digital, mixed (a quarter of the pages scanned)
+and fully scanned, goes through the real extract_text_layer. textract is modelled
+as --base-seconds plus --page-seconds per page and returns the exact source lines,
+so those lines are the reference the local text is compared with (word level
+similarity, digital pages only)
+
+    python -m tests.bench_pdf_text_layer --pages 20 200
+"""
+import argparse
+import asyncio
+import difflib
+import os
+import tempfile
+import time
+from typing import Optional
+
+from src.services.pdf_text import extract_text_layer, shutdown_pool
+from tests.bench import offline_settings, print_table, report_lines, synthetic_pdf
+
+KINDS = {"digital": 0.0, "mixed": 0.25, "scanned": 1.0}
+
+
+def _similarity(extracted: str, reference: list[str]) -> float:
+    return difflib.SequenceMatcher(None, extracted.split(), " ".join(reference).split(), autojunk=False).ratio()
+
+
+async def _measure(path: str, lines: list[list[str]], scanned: set[int]) -> tuple[float, list[int], Optional[float]]:
+    start = time.perf_counter()
+    layer = await extract_text_layer(path)
+    seconds = time.perf_counter() - start
+    digital = [n for n in range(len(lines)) if n not in scanned]
+    fidelity = sum(_similarity(layer.pages[n], lines[n]) for n in digital) / len(digital) if digital else None
+    return seconds, layer.low_quality, fidelity
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 200])
+    parser.add_argument("--base-seconds", type=float, default=5.0)
+    parser.add_argument("--page-seconds", type=float, default=0.2)
+    args = parser.parse_args()
+
+    offline_settings()
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            for kind, share in KINDS.items():
+                lines = report_lines(pages, seed=pages)
+                scanned = set(range(0, pages, round(1 / share))) if share else set()
+                path = os.path.join(tmp, f"{kind}-{pages}.pdf")
+                with open(path, "wb") as f:
+                    f.write(synthetic_pdf(lines, scanned))
+
+                # first run warms the process pool up
+                asyncio.run(_measure(path, lines, scanned))
+                seconds, low_quality, fidelity = asyncio.run(_measure(path, lines, scanned))
+                textract = args.base_seconds + args.page_seconds * pages
+                ocr = args.base_seconds + args.page_seconds * len(low_quality) if low_quality else 0.0
+                rows.append({
+                    "pdf": kind,
+                    "pages": pages,
+                    "ocr pages": len(low_quality),
+                    "flagged right": set(low_quality) == scanned,
+                    "local s": seconds,
+                    "textract only s": textract,
+                    "fast path s": seconds + ocr,
+                    "fidelity %": 100 * fidelity if fidelity is not None else None,
+                })
+    shutdown_pool()
+
+    print_table(
+        "local text layer vs textract",
+        rows,
+        f"textract modelled at {args.base_seconds:g} s + {args.page_seconds:g} s/page; "
+        "fast path = local extraction + textract on the flagged pages only",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+time to first token and billed input tokens, instructions first vs shared document prefix
+
+the six analysis prompts of one report go to a fake openai compatible server that
+models a prefix cache: a prompt sharing a prefix of at least --cache-min-tokens with a
+prompt it has already prefilled, under the same prompt_cache_key, only prefills the
+rest, in --cache-block-tokens blocks. time to first token is --base-seconds plus
+--input-seconds per uncached token, cached tokens bill at --cached-price of the
+normal rate. "instructions first" is the old layout of the node prompts, "document
+prefix" the shared one of src.services.prompts
+
+the nodes are sent all at once as the graph does, and one after the other as the
+per node jobs do; keep --pages below a single CHUNK_MAX_TOKENS section
+
+    python -m tests.bench_prompt_prefix --pages 20
+"""
+import argparse
+import asyncio
+import gc
+import os
+import threading
+import time
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from src.services.business_interruption import BUSINESS_INTERRUPTION_INSTRUCTIONS
+from src.services.current_insurance import CURRENT_INSURANCE_INSTRUCTIONS
+from src.services.insurance_recommendation import INSURANCE_RECOMMENDATION_INSTRUCTIONS
+from src.services.llm import llm_registry, prompt_cache_key
+from src.services.multi_currency_risk import MULTI_CURRENCY_RISK_INSTRUCTIONS
+from src.services.prompts import build_node_prompt
+from src.services.property_valudation import PROPERTY_VALUATION_INSTRUCTIONS
+from src.services.risk_percentages import RISK_PERCENTAGE_INSTRUCTIONS
+from src.utils.tokens import estimate_tokens
+from tests.bench import FakeChatServer, offline_settings, percentile, print_table, report_lines
+
+INSTRUCTIONS = (
+    PROPERTY_VALUATION_INSTRUCTIONS, RISK_PERCENTAGE_INSTRUCTIONS, BUSINESS_INTERRUPTION_INSTRUCTIONS,
+    CURRENT_INSURANCE_INSTRUCTIONS, MULTI_CURRENCY_RISK_INSTRUCTIONS, INSURANCE_RECOMMENDATION_INSTRUCTIONS,
+)
+
+# the node prompts before the shared prefix: instructions, then the report
+LAYOUTS = {
+    "instructions first (before)": [
+        PromptTemplate.from_template(i + "\nHere is the extracted report text:\n\n{cleaned_text}\n") for i in INSTRUCTIONS
+    ],
+    "document prefix (after)": [build_node_prompt(i) for i in INSTRUCTIONS],
+}
+
+
+class _PrefixCache:
+    """prompts prefilled per cache key, each usable once its prefill is over"""
+
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.entries: list[tuple[str, str, float]] = []
+        self.calls: list[dict] = []
+
+    def _cached_tokens(self, key: str, prompt: str, now: float) -> int:
+        best = 0
+        for entry_key, entry, ready_at in self.entries:
+            if entry_key == key and ready_at <= now:
+                best = max(best, estimate_tokens(os.path.commonprefix([prompt, entry])))
+        if best < self.args.cache_min_tokens:
+            return 0
+        return best - best % self.args.cache_block_tokens
+
+    def latency(self, body: dict) -> float:
+        prompt = "".join(m["content"] for m in body["messages"])
+        key = body.get("prompt_cache_key", "")
+        tokens = estimate_tokens(prompt)
+        with self.lock:
+            now = time.monotonic()
+            cached = self._cached_tokens(key, prompt, now)
+            ttft = self.args.base_seconds + self.args.input_seconds * (tokens - cached)
+            self.entries.append((key, prompt, now + ttft))
+            self.calls.append({"tokens": tokens, "cached": cached, "ttft": ttft})
+        return ttft
+
+
+async def _analyse(prompts: list[PromptTemplate], text: str, concurrent: bool) -> None:
+    chains = [prompt | llm_registry.llm() | StrOutputParser() for prompt in prompts]
+    if concurrent:
+        await asyncio.gather(*(llm_registry.ainvoke(chain, {"cleaned_text": text}) for chain in chains))
+    else:
+        for chain in chains:
+            await llm_registry.ainvoke(chain, {"cleaned_text": text})
+
+
+async def _run(cache: _PrefixCache, pages: int, cached_price: float) -> list[dict]:
+    text = "\n".join(line for page in report_lines(pages, seed=pages) for line in page)
+    rows = []
+    for concurrent, schedule in ((True, "all at once"), (False, "one by one")):
+        for label, prompts in LAYOUTS.items():
+            # a fresh document digest per run, nothing carried over between rows
+            prompt_cache_key.set(f"{label}-{schedule}")
+            sent = len(cache.calls)
+            await _analyse(prompts, text, concurrent)
+            calls = cache.calls[sent:]
+            tokens = sum(c["tokens"] for c in calls)
+            cached = sum(c["cached"] for c in calls)
+            rows.append({
+                "nodes sent": schedule,
+                "prompt layout": label,
+                "input tokens": tokens,
+                "cached %": 100 * cached / tokens,
+                "billed tokens": tokens - cached + cached_price * cached,
+                "ttft p50 s": percentile([c["ttft"] for c in calls], 50),
+                "ttft sum s": sum(c["ttft"] for c in calls),
+            })
+    await llm_registry.aclose()
+    gc.collect()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--base-seconds", type=float, default=0.2)
+    parser.add_argument("--input-seconds", type=float, default=2e-5)
+    parser.add_argument("--cache-min-tokens", type=int, default=1024)
+    parser.add_argument("--cache-block-tokens", type=int, default=128)
+    parser.add_argument("--cached-price", type=float, default=0.5)
+    args = parser.parse_args()
+
+    cache = _PrefixCache(args)
+    with FakeChatServer(cache.latency) as server:
+        offline_settings(
+            LLM_PROVIDER="openai", OPENAI_BASE_URL=f"{server.url}/v1",
+            LLM_RPM_LIMIT=0, LLM_TPM_LIMIT=0, RELEVANCE_FILTER_ENABLED=False,
+        )
+        rows = asyncio.run(_run(cache, args.pages, args.cached_price))
+
+    print_table(
+        f"six analysis prompts of a {args.pages} page report",
+        rows,
+        f"ttft {args.base_seconds:g} s + {args.input_seconds:g} s per uncached token; cache from "
+        f"{args.cache_min_tokens} tokens in {args.cache_block_tokens} token blocks, cached tokens billed at "
+        f"{args.cached_price:g}x",
+    )
+
+
+if __name__ == "__main__":
+    main()
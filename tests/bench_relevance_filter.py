@@ -0,0 +1,104 @@
+"""
+relevance filter: recall of the passages each node needs and prompt tokens per document
+
+synthetic reports of 10 to 200 pages of risk vocabulary prose, with two planted
+sentences per analysis node spread across the pages. every node filters the text
+with its RELEVANCE_MARKERS through relevant_text; recall is the share of its planted
+sentences that survive, tokens are the node's prompt text with the filter off and on
+
+    python -m tests.bench_relevance_filter --pages 10 50 200
+"""
+import argparse
+import time
+
+from src.core.config import settings
+from src.services import (
+    business_interruption, current_insurance, insurance_recommendation, multi_currency_risk,
+    property_valudation, risk_percentages,
+)
+from src.services.section_index import relevant_text
+from src.utils.tokens import estimate_tokens
+from tests.bench import offline_settings, print_table, report_lines
+
+PLANTED = {
+    current_insurance: [
+        "The existing policy excludes flood damage to the training ground.",
+        "Coverage limits are insufficient for a full stadium rebuild.",
+    ],
+    business_interruption: [
+        "A closure of the stadium would cause lost revenue of 450,000 EUR per match.",
+        "Alternate venue costs during the disruption are estimated at 80,000 EUR per week.",
+    ],
+    risk_percentages: [
+        "There is a 15% probability of a pitch flood in any given year.",
+        "The likelihood of two such events per season is low, with a 2% chance annually.",
+    ],
+    property_valudation: [
+        "The replacement cost of the main stand infrastructure is 32,000,000 EUR.",
+        "The playing surface property valuation is 1,200,000 EUR based on historical data.",
+    ],
+    multi_currency_risk: [
+        "Sponsorship income is paid in USD and GBP, exposing the club to exchange rate fluctuation.",
+        "No foreign exchange hedge is in place for the currency exposure.",
+    ],
+    insurance_recommendation: [
+        "We recommend parametric cover with a higher limit on the indemnity period.",
+        "The club should bind the new coverage before the premium renewal timeline.",
+    ],
+}
+
+
+def _report(pages: int) -> str:
+    lines = report_lines(pages, seed=pages)
+    planted = [s for sentences in PLANTED.values() for s in sentences]
+    for i, sentence in enumerate(planted):
+        page = lines[i * pages // len(planted)]
+        page.insert((i * 7) % len(page), sentence)
+    return "\n\n".join("\n".join(page) for page in lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+
+    offline_settings(RELEVANCE_FILTER_ENABLED=True)
+    nodes, documents = [], []
+    for pages in args.pages:
+        text = _report(pages)
+        start = time.perf_counter()
+        found = off = on = 0
+        for node, sentences in PLANTED.items():
+            name = node.__name__.rsplit(".", 1)[-1]
+            filtered = relevant_text(text, node.RELEVANCE_MARKERS, name)
+            kept = sum(s in filtered for s in sentences)
+            found += kept
+            off += estimate_tokens(text)
+            on += estimate_tokens(filtered)
+            nodes.append({
+                "pages": pages,
+                "node": name,
+                "recall %": 100 * kept / len(sentences),
+                "tokens off": estimate_tokens(text),
+                "tokens on": estimate_tokens(filtered),
+            })
+        documents.append({
+            "pages": pages,
+            "recall %": 100 * found / sum(map(len, PLANTED.values())),
+            "tokens off": off,
+            "tokens on": on,
+            "saved %": 100 * (1 - on / off),
+            "filter ms": 1000 * (time.perf_counter() - start),
+        })
+
+    print_table("recall and prompt tokens per node", nodes)
+    print_table(
+        "prompt tokens per document, six nodes",
+        documents,
+        f"{settings.RELEVANCE_TOKEN_BUDGET} token budget per node, {settings.RELEVANCE_PASSAGE_TOKENS} token passages; "
+        "filter ms includes building the index once",
+    )
+
+
+if __name__ == "__main__":
+    main()
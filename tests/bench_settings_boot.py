@@ -0,0 +1,104 @@
+"""
+cold start cost of the ssm backed settings, eager per parameter vs lazy batched and file cached
+
+ssm is replaced by a stub answering every call after --latency seconds, pages of
+get_parameters_by_path holding 10 parameters as in ssm. "eager" replays the old
+Settings constructor, one get_parameter per value at import; "lazy" is Settings
+from src.core.config, loading every parameter in one batch on first access and
+keeping them in the cache file that the next --boots worker starts read instead
+
+    python -m tests.bench_settings_boot --boots 8 --latency 0.08
+"""
+import argparse
+import math
+import os
+import tempfile
+import time
+
+from src.core import config
+from src.core.config import SSM_PARAMETER_PATH, Settings
+from tests.bench import RATES, print_table
+
+PARAMETERS = {
+    "groq_api_key": "bench",
+    "s3_bucket": "bench-bucket",
+    "aws_region": "eu-central-1",
+    "openai_api_key": "bench",
+    **{f"exchange_rate_{currency.lower()}": str(rate) for currency, rate in RATES.items()},
+}
+
+
+class _StubSSM:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def get_parameter(self, name: str, with_decryption: bool = True) -> str:
+        self.calls += 1
+        time.sleep(self.latency)
+        return PARAMETERS[name.rsplit("/", 1)[-1]]
+
+    def get_parameters_by_path(self, path: str, with_decryption: bool = True) -> dict:
+        pages = math.ceil(len(PARAMETERS) / 10)
+        self.calls += pages
+        time.sleep(self.latency * pages)
+        return dict(PARAMETERS)
+
+
+def _eager() -> tuple[float, float]:
+    """the constructor before lazy loading, every value fetched at import"""
+    start = time.perf_counter()
+    get = config.get_parameter
+    get(SSM_PARAMETER_PATH + "groq_api_key")
+    get(SSM_PARAMETER_PATH + "s3_bucket")
+    get(SSM_PARAMETER_PATH + "aws_region")
+    for currency in RATES:
+        float(get(SSM_PARAMETER_PATH + f"exchange_rate_{currency.lower()}"))
+    boot = time.perf_counter() - start
+    return boot, boot
+
+
+def _lazy() -> tuple[float, float]:
+    """seconds to import the settings and to first read every ssm value"""
+    start = time.perf_counter()
+    settings = Settings()
+    boot = time.perf_counter() - start
+    settings.GROQ_API_KEY, settings.S3_BUCKET, settings.AWS_REGION, settings.EXCHANGE_RATES
+    return boot, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--boots", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.08, help="seconds per ssm call")
+    args = parser.parse_args()
+
+    ssm = _StubSSM(args.latency)
+    config.get_parameter = ssm.get_parameter
+    config.get_parameters_by_path = ssm.get_parameters_by_path
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SSM_CACHE_PATH"] = os.path.join(tmp, "ssm-cache.json")
+        os.environ["LLM_PROVIDER"] = "groq"
+        for label, start_worker in (("eager, per parameter (before)", _eager), ("lazy, batched + file cache (after)", _lazy)):
+            ssm.calls = 0
+            boots, ready = zip(*(start_worker() for _ in range(args.boots)))
+            rows.append({
+                "settings": label,
+                "boots": args.boots,
+                "ssm calls": ssm.calls,
+                "first boot ms": 1000 * boots[0],
+                "first ready ms": 1000 * ready[0],
+                "later boots ready ms": 1000 * sum(ready[1:]) / max(len(ready) - 1, 1),
+            })
+
+    print_table(
+        "ssm settings at worker start",
+        rows,
+        f"{args.latency * 1000:g} ms per ssm call, {len(PARAMETERS)} parameters; boot = import of the settings, "
+        "ready = every ssm value read",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+ocr latency of large scanned reports, one textract job vs page range fan-out
+
+scanned synthetic reports of 100 to 500 pages are ocr'd by a stub textract whose job
+takes --base-seconds plus --page-seconds per page of the submitted pdf. "one job"
+uploads the whole pdf and waits on a single job; "fan-out" is ocr_pages with
+TEXTRACT_PAGES_PER_JOB pages per job and at most TEXTRACT_MAX_CONCURRENT_JOBS in
+flight. textract durations are multiplied by --time-scale and the table divides the
+wall time back; the local page splitting is real time, so it is overstated by the
+same factor and the fan-out figures are conservative
+
+    python -m tests.bench_textract_fanout --pages 100 300 500
+"""
+import argparse
+import asyncio
+import io
+import os
+import tempfile
+import time
+
+from pypdf import PdfReader
+
+from src.core.aws import aws
+from src.core.config import settings
+from src.services import textract_fanout
+from src.services.pdf_text import shutdown_pool
+from src.services.textract_client import parse_pdf_pages_via_textract
+from src.services.textract_fanout import ocr_pages
+from src.utils.s3 import upload_pdf_to_s3
+from tests.bench import StubS3, offline_settings, print_table, report_lines, synthetic_pdf
+
+
+class _StubS3(StubS3):
+    """keeps the object bytes so textract can count their pages"""
+
+    async def put_object(self, Bucket, Key, Body, **kwargs):
+        await self._wait()
+        self.objects[Key] = Body
+
+
+class _StubTextract:
+    def __init__(self, s3: _StubS3, base: float, per_page: float):
+        self.s3 = s3
+        self.base = base
+        self.per_page = per_page
+        self.jobs = 0
+        self._pending: dict = {}
+
+    async def start_document_text_detection(self, DocumentLocation, **params):
+        key = DocumentLocation["S3Object"]["Name"]
+        pages = await asyncio.to_thread(lambda: len(PdfReader(io.BytesIO(self.s3.objects[key])).pages))
+        job_id = f"job-{self.jobs}"
+        self.jobs += 1
+        self._pending[job_id] = (time.monotonic() + self.base + self.per_page * pages, pages)
+        return {"JobId": job_id}
+
+    async def get_document_text_detection(self, JobId, MaxResults=1000, NextToken=None):
+        done_at, pages = self._pending[JobId]
+        if time.monotonic() < done_at:
+            return {"JobStatus": "IN_PROGRESS"}
+        blocks = [{"BlockType": "LINE", "Page": page, "Text": f"ocr text {page}"} for page in range(1, pages + 1)]
+        return {"JobStatus": "SUCCEEDED", "Blocks": blocks}
+
+
+def _stub_page_cache() -> None:
+    cache = {}
+
+    async def get_parsed_texts(text_ids):
+        return {t: cache[t] for t in text_ids if t in cache}
+
+    async def put_parsed_texts(texts):
+        cache.update(texts)
+
+    textract_fanout.get_parsed_texts = get_parsed_texts
+    textract_fanout.put_parsed_texts = put_parsed_texts
+
+
+async def _one_job(path: str, digest: str) -> dict:
+    key, _ = await upload_pdf_to_s3(path, digest)
+    return await parse_pdf_pages_via_textract(key)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 300, 500])
+    parser.add_argument("--base-seconds", type=float, default=5.0)
+    parser.add_argument("--page-seconds", type=float, default=0.2)
+    parser.add_argument("--time-scale", type=float, default=0.1)
+    args = parser.parse_args()
+
+    scale = args.time_scale
+    offline_settings(
+        TEXTRACT_POLL_INITIAL_SECONDS=settings.TEXTRACT_POLL_INITIAL_SECONDS * scale,
+        TEXTRACT_POLL_MAX_SECONDS=settings.TEXTRACT_POLL_MAX_SECONDS * scale,
+        TEXTRACT_TIMEOUT_SECONDS=settings.TEXTRACT_TIMEOUT_SECONDS * scale,
+    )
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = os.path.join(tmp, f"scan-{pages}.pdf")
+            with open(path, "wb") as f:
+                f.write(synthetic_pdf(report_lines(pages, lines_per_page=1), scanned=range(pages)))
+
+            ocr = (("one job (before)", lambda: _one_job(path, f"scan-{pages}")), ("fan-out (after)", lambda: ocr_pages(path)))
+            for label, run in ocr:
+                aws.s3 = _StubS3(0.0)
+                aws.textract = _StubTextract(aws.s3, args.base_seconds * scale, args.page_seconds * scale)
+                _stub_page_cache()
+                # the job slots belong to the event loop of the previous run
+                textract_fanout._job_slots = None
+                start = time.perf_counter()
+                texts = asyncio.run(run())
+                seconds = time.perf_counter() - start
+                rows.append({
+                    "pages": pages,
+                    "ocr": label,
+                    "textract jobs": aws.textract.jobs,
+                    "pages returned": len(texts),
+                    "wall s (unscaled)": seconds / scale,
+                })
+    shutdown_pool()
+
+    print_table(
+        "ocr of fully scanned reports",
+        rows,
+        f"job time {args.base_seconds:g} s + {args.page_seconds:g} s/page, {settings.TEXTRACT_PAGES_PER_JOB} pages per "
+        f"fan-out job, {settings.TEXTRACT_MAX_CONCURRENT_JOBS} jobs in flight, run at {scale:g}x time",
+    )
+
+
+if __name__ == "__main__":
+    main()
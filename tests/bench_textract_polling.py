@@ -0,0 +1,108 @@
+"""
+textract api calls, wall time and text coverage per document size
+
+a stub textract finishes a job after --base-seconds plus --page-seconds per page and
+serves its LINE blocks 1000 per result page. "fixed poll" replays the old client, a
+status poll every second keeping only the first result page; "paged, backoff" is
+TextractJobManager. every duration is multiplied by --time-scale so a run takes
+seconds rather than minutes
+
+    python -m tests.bench_textract_polling --pages 10 100 500
+"""
+import argparse
+import asyncio
+import time
+
+from src.core.aws import aws
+from src.core.config import settings
+from src.services.textract_client import TextractJobManager
+from tests.bench import offline_settings, print_table
+
+LINES_PER_PAGE = 40
+
+
+class _StubTextract:
+    def __init__(self, pages: int, duration: float):
+        self.duration = duration
+        self.calls = 0
+        self._done_at: dict = {}
+        self._blocks = [
+            {"BlockType": "LINE", "Page": page, "Text": f"page {page} line {line}"}
+            for page in range(1, pages + 1) for line in range(LINES_PER_PAGE)
+        ]
+
+    async def start_document_text_detection(self, **params):
+        self.calls += 1
+        job_id = f"job-{len(self._done_at)}"
+        self._done_at[job_id] = time.monotonic() + self.duration
+        return {"JobId": job_id}
+
+    async def get_document_text_detection(self, JobId, MaxResults=1000, NextToken=None):
+        self.calls += 1
+        if time.monotonic() < self._done_at[JobId]:
+            return {"JobStatus": "IN_PROGRESS"}
+        offset = int(NextToken or 0)
+        page = {"JobStatus": "SUCCEEDED", "Blocks": self._blocks[offset:offset + MaxResults]}
+        if offset + MaxResults < len(self._blocks):
+            page["NextToken"] = str(offset + MaxResults)
+        return page
+
+
+async def _fixed_poll(s3_key: str, interval: float) -> str:
+    """the client before pagination and backoff"""
+    job = await aws.textract.start_document_text_detection(
+        DocumentLocation={"S3Object": {"Bucket": settings.S3_BUCKET, "Name": s3_key}}
+    )
+    while True:
+        result = await aws.textract.get_document_text_detection(JobId=job["JobId"])
+        if result["JobStatus"] in ["SUCCEEDED", "FAILED"]:
+            break
+        await asyncio.sleep(interval)
+    return "\n".join(b["Text"] for b in result.get("Blocks", []) if b["BlockType"] == "LINE")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--base-seconds", type=float, default=5.0)
+    parser.add_argument("--page-seconds", type=float, default=0.2)
+    parser.add_argument("--time-scale", type=float, default=0.01)
+    args = parser.parse_args()
+
+    scale = args.time_scale
+    offline_settings(
+        TEXTRACT_POLL_INITIAL_SECONDS=settings.TEXTRACT_POLL_INITIAL_SECONDS * scale,
+        TEXTRACT_POLL_MAX_SECONDS=settings.TEXTRACT_POLL_MAX_SECONDS * scale,
+        TEXTRACT_TIMEOUT_SECONDS=settings.TEXTRACT_TIMEOUT_SECONDS * scale,
+    )
+    rows = []
+    for pages in args.pages:
+        duration = (args.base_seconds + args.page_seconds * pages) * scale
+        clients = (
+            ("fixed poll (before)", lambda: _fixed_poll("report.pdf", 1.0 * scale)),
+            ("paged, backoff (after)", lambda: TextractJobManager().detect_text("report.pdf")),
+        )
+        for label, detect in clients:
+            aws.textract = _StubTextract(pages, duration)
+            start = time.perf_counter()
+            text = asyncio.run(detect())
+            seconds = time.perf_counter() - start
+            rows.append({
+                "pages": pages,
+                "client": label,
+                "api calls": aws.textract.calls,
+                "wall s (unscaled)": seconds / scale,
+                "job s (unscaled)": duration / scale,
+                "lines kept %": 100 * len(text.splitlines()) / (pages * LINES_PER_PAGE),
+            })
+
+    print_table(
+        "textract text detection per document size",
+        rows,
+        f"job time {args.base_seconds:g} s + {args.page_seconds:g} s/page, {LINES_PER_PAGE} lines per page, "
+        f"run at {scale:g}x time",
+    )
+
+
+if __name__ == "__main__":
+    main()
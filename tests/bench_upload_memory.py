@@ -0,0 +1,99 @@
+"""
+peak memory of concurrent large uploads, read whole vs streamed
+
+every simulated upload is a synthetic pdf served chunk by chunk like a multipart
+UploadFile, then hashed and sent to a stub s3. "read whole" does file.read() and a
+single put_object as the endpoint used to; "streamed" goes through stage_upload and
+upload_pdf_to_s3. the peak is the python heap high-water mark from tracemalloc
+
+    python -m tests.bench_upload_memory --uploads 4 --megabytes 32
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import tracemalloc
+
+from src.core.aws import aws
+from src.core.config import settings
+from src.services.ingest import stage_upload
+from src.utils.s3 import pdf_key, upload_pdf_to_s3
+from tests.bench import offline_settings, print_table, stub_aws
+
+
+class _SyntheticUpload:
+    """UploadFile stand-in producing `size` bytes on demand"""
+
+    def __init__(self, size: int, filename: str):
+        self.filename = filename
+        self.remaining = size
+        self.first = True
+
+    async def read(self, size: int = -1) -> bytes:
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        self.remaining -= size
+        # let the other uploads interleave like network reads would
+        await asyncio.sleep(0)
+        chunk = bytes(size)
+        if self.first and size:
+            self.first = False
+            chunk = b"%PDF" + os.urandom(16) + chunk[20:]
+        return chunk
+
+
+async def _read_whole(upload: _SyntheticUpload) -> None:
+    contents = await upload.read()
+    digest = hashlib.sha256(contents).hexdigest()
+    await aws.s3.put_object(Bucket=settings.S3_BUCKET, Key=pdf_key(digest), Body=contents)
+
+
+async def _streamed(upload: _SyntheticUpload) -> None:
+    staged = await stage_upload(upload)
+    try:
+        await upload_pdf_to_s3(staged.path, staged.digest)
+    finally:
+        staged.cleanup()
+
+
+async def _run(ingest, uploads: int, size: int) -> None:
+    await asyncio.gather(*(ingest(_SyntheticUpload(size, f"report-{i}.pdf")) for i in range(uploads)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--megabytes", type=int, default=32)
+    args = parser.parse_args()
+
+    size = args.megabytes * 1024 * 1024
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        offline_settings(UPLOAD_STAGING_DIR=tmp)
+        for label, ingest in (("read whole (before)", _read_whole), ("streamed (after)", _streamed)):
+            stub_aws(0.001)
+            tracemalloc.start()
+            start = time.perf_counter()
+            asyncio.run(_run(ingest, args.uploads, size))
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rows.append({
+                "ingest": label,
+                "peak MB": peak / 1024 / 1024,
+                "MB per upload": peak / 1024 / 1024 / args.uploads,
+                "wall s": seconds,
+                "s3 calls": aws.s3.calls,
+            })
+
+    print_table(
+        "concurrent uploads of large synthetic pdfs",
+        rows,
+        f"{args.uploads} uploads of {args.megabytes} MB, {settings.UPLOAD_CHUNK_BYTES // 1024} kB read chunks, "
+        f"{settings.S3_MULTIPART_PART_BYTES // 1024 // 1024} MB s3 parts",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import pytest
+
+from src.core.config import settings
+
+RATES = {"EUR": 1.0, "USD": 0.91, "GBP": 1.18}
+
+
+@pytest.fixture
+def exchange_rates(monkeypatch):
+    """fixed rates in place of the ssm backed settings.EXCHANGE_RATES"""
+    monkeypatch.setitem(settings.__dict__, "EXCHANGE_RATES", dict(RATES))
+    return RATES
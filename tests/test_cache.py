@@ -0,0 +1,54 @@
+from src.utils.cache import LRUCache
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = LRUCache(max_bytes=10, ttl_seconds=60, sizeof=len)
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    assert cache.get("a") == "aaaa"  # a is now the most recent
+
+    cache.set("c", "cccc")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+    assert cache.current_bytes == 8
+    assert cache.evictions == 1
+
+
+def test_one_large_value_evicts_several_small_ones():
+    cache = LRUCache(max_bytes=10, ttl_seconds=60, sizeof=len)
+    for key in "abcde":
+        cache.set(key, "xx")
+    cache.set("big", "x" * 9)
+
+    assert len(cache) == 1
+    assert cache.current_bytes == 9
+    assert cache.evictions == 5
+
+
+def test_value_larger_than_the_cache_is_not_stored():
+    cache = LRUCache(max_bytes=10, ttl_seconds=60, sizeof=len)
+    cache.set("a", "aaaa")
+    cache.set("huge", "x" * 11)
+
+    assert cache.get("huge") is None
+    assert cache.get("a") == "aaaa"
+
+
+def test_replacing_a_key_accounts_its_new_size():
+    cache = LRUCache(max_bytes=10, ttl_seconds=60, sizeof=len)
+    cache.set("a", "aaaa")
+    cache.set("a", "aaaaaaaa")
+
+    assert len(cache) == 1
+    assert cache.current_bytes == 8
+
+
+def test_expired_entries_are_dropped_on_access():
+    cache = LRUCache(max_bytes=10, ttl_seconds=-1, sizeof=len)
+    cache.set("a", "aaaa")
+
+    assert cache.get("a") is None
+    assert cache.current_bytes == 0
+    assert cache.expirations == 1
@@ -0,0 +1,116 @@
+import asyncio
+from typing import TypedDict
+
+import pytest
+from langgraph.graph import END, StateGraph
+
+from src.core.config import Settings, settings
+from src.services.checkpoint import LatestCheckpointSaver, SqliteCheckpointSaver, build_checkpointer
+
+
+class _State(TypedDict):
+    a: int
+    b: int
+
+
+def _graph(saver, calls: dict, fail_b: list):
+    async def node_a(state):
+        calls["a"] += 1
+        return {"a": 1}
+
+    async def node_b(state):
+        calls["b"] += 1
+        if fail_b:
+            fail_b.pop()
+            raise RuntimeError("provider down")
+        return {"b": state["a"] + 1}
+
+    graph = StateGraph(_State)
+    graph.add_node("node_a", node_a)
+    graph.add_node("node_b", node_b)
+    graph.set_entry_point("node_a")
+    graph.add_edge("node_a", "node_b")
+    graph.add_edge("node_b", END)
+    return graph.compile(checkpointer=saver)
+
+
+class _BrokenSaver(LatestCheckpointSaver):
+    """a store whose table is missing"""
+
+    async def _load(self, thread_id, checkpoint_ns):
+        raise RuntimeError("ResourceNotFoundException")
+
+    async def _store(self, thread_id, checkpoint_ns, record):
+        raise RuntimeError("ResourceNotFoundException")
+
+    async def _store_writes(self, thread_id, checkpoint_ns, checkpoint_id, writes, overwrite):
+        raise RuntimeError("ResourceNotFoundException")
+
+    async def _delete_thread(self, thread_id):
+        raise RuntimeError("ResourceNotFoundException")
+
+
+def test_base_saver_is_abstract():
+    with pytest.raises(TypeError):
+        LatestCheckpointSaver()
+
+    class Partial(LatestCheckpointSaver):
+        async def _load(self, thread_id, checkpoint_ns):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+@pytest.mark.parametrize("store, lease, expected", [
+    ("off", True, None),
+    ("sqlite", False, None),
+    ("dynamodb", False, None),
+    ("sqlite", True, SqliteCheckpointSaver),
+])
+def test_checkpoints_need_a_store_and_the_lease(monkeypatch, store, lease, expected):
+    monkeypatch.setattr(settings, "CHECKPOINT_STORE", store)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_LEASE_ENABLED", lease)
+    saver = build_checkpointer()
+    assert saver is None if expected is None else isinstance(saver, expected)
+
+
+def test_checkpoints_are_off_by_default(monkeypatch):
+    monkeypatch.delenv("CHECKPOINT_STORE", raising=False)
+    assert Settings().CHECKPOINT_STORE == "off"
+
+
+def test_failing_store_runs_without_checkpoints():
+    calls = {"a": 0, "b": 0}
+    dag = _graph(_BrokenSaver(), calls, fail_b=[])
+    config = {"configurable": {"thread_id": "t1"}}
+
+    async def scenario():
+        snapshot = await dag.aget_state(config)
+        assert not snapshot.next
+        result = await dag.ainvoke({"a": 0, "b": 0}, config)
+        await dag.checkpointer.adelete_thread("t1")
+        return result
+
+    assert asyncio.run(scenario()) == {"a": 1, "b": 2}
+
+
+def test_sqlite_resume_skips_completed_nodes(tmp_path):
+    calls = {"a": 0, "b": 0}
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite3"))
+    dag = _graph(saver, calls, fail_b=[True])
+    config = {"configurable": {"thread_id": "t1"}}
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await dag.ainvoke({"a": 0, "b": 0}, config)
+        snapshot = await dag.aget_state(config)
+        assert snapshot.next == ("node_b",)
+        result = await dag.ainvoke(None, config)
+        await saver.adelete_thread("t1")
+        return result, await dag.aget_state(config)
+
+    result, after = asyncio.run(scenario())
+    assert result == {"a": 1, "b": 2}
+    assert calls == {"a": 1, "b": 2}
+    assert after.created_at is None
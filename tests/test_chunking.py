@@ -0,0 +1,97 @@
+from src.services.chunking import merge_keyed, merge_lists, split_text
+from src.utils.tokens import estimate_tokens
+
+
+def _paragraphs(count: int) -> list[str]:
+    # 40 characters, 10 tokens each
+    return [f"paragraph {i:03d} " + "x" * 26 for i in range(count)]
+
+
+def test_short_text_is_one_section():
+    text = "\n".join(_paragraphs(3))
+    assert split_text(text, max_tokens=1000, overlap_tokens=100) == [text]
+
+
+def test_sections_respect_the_budget_and_cover_the_text_in_order():
+    paragraphs = _paragraphs(30)
+    sections = split_text("\n".join(paragraphs), max_tokens=60, overlap_tokens=0)
+
+    assert len(sections) > 1
+    assert all(estimate_tokens(s) <= 60 for s in sections)
+    assert [p for s in sections for p in s.split("\n")] == paragraphs
+
+
+def test_consecutive_sections_share_the_overlap():
+    paragraphs = _paragraphs(30)
+    sections = split_text("\n".join(paragraphs), max_tokens=60, overlap_tokens=22)
+
+    assert all(estimate_tokens(s) <= 60 for s in sections)
+    for previous, current in zip(sections, sections[1:]):
+        previous_lines, current_lines = previous.split("\n"), current.split("\n")
+        # two paragraphs of 11 tokens (10 + separator) fit the overlap
+        assert current_lines[:2] == previous_lines[-2:]
+    # nothing is lost: every paragraph is in some section
+    seen = {p for s in sections for p in s.split("\n")}
+    assert seen == set(paragraphs)
+
+
+def test_oversized_paragraph_is_cut():
+    text = "word " * 400
+    sections = split_text(text, max_tokens=50, overlap_tokens=0)
+    assert all(estimate_tokens(s) <= 50 for s in sections)
+    assert "".join(sections) == text
+
+
+def test_merge_keyed_drops_repeats_and_skips_non_dicts():
+    merged = merge_keyed([
+        {"fire": {"percent": 10}},
+        "not json",
+        {"fire": {"percent": 10}, "flood": {"percent": 5, "quote": "River flooding"}},
+        {"flood": {"percent": 6, "quote": " river FLOODING"}},
+    ])
+    assert merged == {"fire": {"percent": 10}, "flood": {"percent": 5, "quote": "River flooding"}}
+
+
+def test_merge_keyed_keeps_different_findings_under_a_repeated_label():
+    merged = merge_keyed([
+        {"Lost revenue": {"amount_eur": 100, "quote": "EUR 100 lost in Q1"}},
+        {"Lost revenue": {"amount_eur": 250, "quote": "EUR 250 lost in Q3"}},
+        {"Lost revenue": {"amount_eur": 250, "quote": "EUR 250 lost in Q3"}, "Fines": {"amount_eur": 5}},
+        {"Lost revenue": {"amount_eur": 900}},
+    ])
+    assert merged == {
+        "Lost revenue": {"amount_eur": 100, "quote": "EUR 100 lost in Q1"},
+        "Lost revenue (2)": {"amount_eur": 250, "quote": "EUR 250 lost in Q3"},
+        "Fines": {"amount_eur": 5},
+        "Lost revenue (3)": {"amount_eur": 900},
+    }
+
+
+def test_merge_lists_accepts_every_shape_and_drops_overlap_duplicates():
+    merged = merge_lists(
+        [
+            {"gaps": [{"quote": "No flood cover"}, {"quote": "Terrorism excluded"}]},
+            [{"quote": "  no flood COVER "}],
+            {"quote": "Cyber limit too low"},
+            None,
+        ],
+        "gaps",
+    )
+    assert [g["quote"] for g in merged["gaps"]] == ["No flood cover", "Terrorism excluded", "Cyber limit too low"]
+
+
+def test_merge_lists_without_dedupe_fields_compares_whole_entries():
+    merged = merge_lists([[{"a": 1}, {"a": 2}], [{"a": 1}]], "items", dedupe_on=("quote",))
+    assert merged == {"items": [{"a": 1}, {"a": 2}]}
+
+
+def test_insurance_recommendation_keeps_list_shaped_sections():
+    from src.services.insurance_recommendation import reduce_insurance_recommendation
+
+    merged = reduce_insurance_recommendation([
+        {"parametric_cover": {"priority": "high"}},
+        [{"quote": "Add flood cover"}, {"quote": "Raise BI limit"}],
+        [{"quote": "add flood cover "}, {"quote": "Cyber cover"}],
+    ])
+    assert merged["parametric_cover"] == {"priority": "high"}
+    assert [r["quote"] for r in merged["risks"]] == ["Add flood cover", "Raise BI limit", "Cyber cover"]
@@ -0,0 +1,89 @@
+import os
+import stat
+
+import pytest
+
+from src.core import config
+from src.core.config import ParameterStore
+
+
+@pytest.fixture
+def ssm(monkeypatch):
+    """fake get_parameters_by_path counting the calls that would reach ssm"""
+    calls = []
+    values = {"s3_bucket": "bucket-1", "groq_api_key": "secret"}
+
+    def fetch(path, with_decryption=True):
+        calls.append(path)
+        return dict(values)
+
+    monkeypatch.setattr(config, "get_parameters_by_path", fetch)
+    return calls, values
+
+
+def test_first_access_loads_every_parameter_in_one_call(ssm, tmp_path):
+    calls, _ = ssm
+    store = ParameterStore("/svc/", str(tmp_path / "cache.json"), ttl_seconds=60)
+
+    assert store.get("s3_bucket") == "bucket-1"
+    assert store.get("groq_api_key") == "secret"
+    assert calls == ["/svc/"]
+
+
+def test_cache_file_serves_the_next_process_and_is_owner_only(ssm, tmp_path):
+    calls, _ = ssm
+    cache_path = str(tmp_path / "cache.json")
+    ParameterStore("/svc/", cache_path, ttl_seconds=60).get("s3_bucket")
+
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+    assert ParameterStore("/svc/", cache_path, ttl_seconds=60).get("s3_bucket") == "bucket-1"
+    assert len(calls) == 1
+
+
+def test_expired_cache_file_is_refetched(ssm, tmp_path):
+    calls, _ = ssm
+    cache_path = str(tmp_path / "cache.json")
+    ParameterStore("/svc/", cache_path, ttl_seconds=60).get("s3_bucket")
+    old = os.stat(cache_path).st_mtime - 120
+    os.utime(cache_path, (old, old))
+
+    ParameterStore("/svc/", cache_path, ttl_seconds=60).get("s3_bucket")
+    assert len(calls) == 2
+
+
+def test_cache_of_another_path_is_ignored(ssm, tmp_path):
+    calls, _ = ssm
+    cache_path = str(tmp_path / "cache.json")
+    ParameterStore("/other/", cache_path, ttl_seconds=60).get("s3_bucket")
+    ParameterStore("/svc/", cache_path, ttl_seconds=60).get("s3_bucket")
+    assert calls == ["/other/", "/svc/"]
+
+
+def test_refresh_picks_up_new_values(ssm, tmp_path):
+    calls, values = ssm
+    cache_path = str(tmp_path / "cache.json")
+    store = ParameterStore("/svc/", cache_path, ttl_seconds=60)
+    store.get("s3_bucket")
+
+    values["s3_bucket"] = "bucket-2"
+    assert store.get("s3_bucket") == "bucket-1"
+    store.refresh()
+    assert store.get("s3_bucket") == "bucket-2"
+    assert ParameterStore("/svc/", cache_path, ttl_seconds=60).get("s3_bucket") == "bucket-2"
+    assert len(calls) == 2
+
+
+def test_zero_ttl_disables_the_cache_file(ssm, tmp_path):
+    calls, _ = ssm
+    cache_path = tmp_path / "cache.json"
+    ParameterStore("/svc/", str(cache_path), ttl_seconds=0).get("s3_bucket")
+    ParameterStore("/svc/", str(cache_path), ttl_seconds=0).get("s3_bucket")
+
+    assert not cache_path.exists()
+    assert len(calls) == 2
+
+
+def test_missing_parameter(ssm, tmp_path):
+    store = ParameterStore("/svc/", str(tmp_path / "cache.json"), ttl_seconds=60)
+    with pytest.raises(KeyError):
+        store.get("nope")
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from src.core.config import settings
+from src.services import currency_convertion
+from src.services.currency_convertion import run_currency_conversion
+from src.services.llm import llm_registry
+
+LLM_LATENCY = 0.2
+
+
+def test_simultaneous_conversions_overlap(monkeypatch, exchange_rates):
+    """N uploads converting at once take about one llm round-trip, not N of them"""
+    monkeypatch.setattr(settings, "CURRENCY_CONVERSION_MODE", "llm")
+    monkeypatch.setattr(settings, "CONVERTED_TEXT_CACHE_ENABLED", False)
+    monkeypatch.setattr(llm_registry, "chain", lambda name, factory: object())
+    active = peak = 0
+
+    async def slow_llm(chain, inputs, model=None):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(LLM_LATENCY)
+        active -= 1
+        return inputs["input_text"].replace("£1m", "1,180,000.00 EUR")
+
+    monkeypatch.setattr(llm_registry, "ainvoke", slow_llm)
+    uploads = 8
+
+    async def scenario():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            run_currency_conversion({"input_text": f"report {i}: loss of £1m"}) for i in range(uploads)
+        ))
+        return time.perf_counter() - started, results
+
+    elapsed, results = asyncio.run(scenario())
+    assert peak == uploads
+    assert elapsed < 2 * LLM_LATENCY
+    assert results[3] == {"converted_text": "report 3: loss of 1,180,000.00 EUR"}
+
+
+def test_local_conversion_never_calls_the_llm(monkeypatch, exchange_rates):
+    monkeypatch.setattr(settings, "CURRENCY_CONVERSION_MODE", "local")
+    monkeypatch.setattr(settings, "CONVERTED_TEXT_CACHE_ENABLED", False)
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("llm called")
+
+    monkeypatch.setattr(llm_registry, "ainvoke", no_llm)
+    monkeypatch.setattr(currency_convertion, "_convert_lines_with_llm", no_llm)
+
+    result = asyncio.run(run_currency_conversion({"input_text": "a loss of $2,000"}))
+    assert result == {"converted_text": "a loss of 1,820.00 EUR"}
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from src.services.currency_normalisation import find_amounts, format_rates, normalise_currency
+
+from tests.conftest import RATES
+
+# report sentences with their hand checked EUR rewrite at RATES
+CORPUS = json.loads((Path(__file__).parent / "data" / "currency_corpus.json").read_text())
+
+
+def convert(text: str) -> str:
+    return normalise_currency(text, RATES).text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("£1.5M", "1,770,000.00 EUR"),
+    ("£1.5m", "1,770,000.00 EUR"),
+    ("$10 Million", "9,100,000.00 EUR"),
+    ("€ 3.5 Mn", "3,500,000.00 EUR"),
+    ("£250k", "295,000.00 EUR"),
+    ("USD 2K", "1,820.00 EUR"),
+    ("600 thousand pounds", "708,000.00 EUR"),
+    ("$4bn", "3,640,000,000.00 EUR"),
+    ("€1 billion", "1,000,000,000.00 EUR"),
+])
+def test_multipliers_in_any_case(text, expected):
+    assert convert(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("£5", "5.90 EUR"),
+    ("US$100", "91.00 EUR"),
+    ("$100", "91.00 EUR"),
+    ("€100", "100.00 EUR"),
+    ("GBP 100", "118.00 EUR"),
+    ("100 USD", "91.00 EUR"),
+    ("EUR 1,250.50", "1,250.50 EUR"),
+    ("20 euros", "20.00 EUR"),
+    ("3 dollars", "2.73 EUR"),
+])
+def test_symbols_iso_codes_and_words(text, expected):
+    assert convert(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("£2m-3m", "2,360,000.00-3,540,000.00 EUR"),
+    ("£2-3m", "2,360,000.00-3,540,000.00 EUR"),
+    ("£5-10", "5.90-11.80 EUR"),
+    ("$40,000 to $55,000", "36,400.00 to 50,050.00 EUR"),
+    ("£5 to 10 million", "5,900,000.00 to 11,800,000.00 EUR"),
+    ("5 to 8 EUR", "5.00 to 8.00 EUR"),
+])
+def test_ranges(text, expected):
+    assert convert(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("£5 million to 10 sites", "5,900,000.00 EUR to 10 sites"),
+    ("$5 to 10 people", "4.55 EUR to 10 people"),
+    ("£5 - 10 people", "5.90 EUR - 10 people"),
+])
+def test_unrelated_trailing_number_is_not_a_range(text, expected):
+    assert convert(text) == expected
+
+
+@pytest.mark.parametrize("text", ["12% in 2024", "52,000 seats", "3 claims per year", "page 4 of 10"])
+def test_bare_numbers_are_left_alone(text):
+    assert find_amounts(text) == []
+    assert convert(text) == text
+
+
+def test_unknown_and_conflicting_currencies_are_unresolved():
+    result = normalise_currency("fees of 40,000 CHF and £5 USD", RATES)
+
+    assert result.text == "fees of 40,000 CHF and £5 USD"
+    assert [s.text for s in result.unresolved] == ["40,000 CHF", "£5 USD"]
+    assert result.unresolved[0].currency == "CHF"
+    assert result.unresolved[1].currency is None
+
+
+def test_unresolved_offsets_point_into_the_converted_text():
+    result = normalise_currency("£1m then 7 CHF", RATES)
+    span = result.unresolved[0]
+    assert result.text[span.start:span.end] == "7 CHF"
+
+
+def test_rates_are_relative_to_the_eur_entry():
+    assert normalise_currency("$100", {"EUR": 2.0, "USD": 1.82}).text == "91.00 EUR"
+    assert format_rates({"EUR": 2.0, "USD": 1.82}) == "   - 1 USD = 0.91 EUR"
+
+
+def test_corpus_accuracy_and_latency():
+    started = time.perf_counter()
+    outputs = [convert(case["text"]) for case in CORPUS]
+    elapsed = time.perf_counter() - started
+
+    correct = sum(out == case["expected"] for out, case in zip(outputs, CORPUS))
+    assert correct == len(CORPUS)
+    # the whole corpus in well under one llm round-trip
+    assert elapsed < 0.1
+
+
+@pytest.mark.skipif(not os.getenv("CURRENCY_LLM_BENCHMARK"), reason="set CURRENCY_LLM_BENCHMARK to call the llm")
+def test_corpus_against_the_llm_pass(capsys):
+    """latency and accuracy of the llm pre-pass on the same corpus, needs the groq key"""
+    from src.services.currency_convertion import build_currency_conversion_chain
+
+    chain = build_currency_conversion_chain()
+
+    async def run():
+        return await asyncio.gather(*(
+            chain.ainvoke({"input_text": case["text"], "rates": format_rates(RATES)}) for case in CORPUS
+        ))
+
+    started = time.perf_counter()
+    outputs = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    correct = sum(out.strip() == case["expected"] for out, case in zip(outputs, CORPUS))
+
+    local_started = time.perf_counter()
+    for case in CORPUS:
+        convert(case["text"])
+    local_elapsed = time.perf_counter() - local_started
+
+    with capsys.disabled():
+        print(f"\nllm:   {correct}/{len(CORPUS)} exact, {elapsed:.2f}s")
+        print(f"local: {len(CORPUS)}/{len(CORPUS)} exact, {local_elapsed * 1000:.2f}ms")
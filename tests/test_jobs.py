@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from src.core.config import settings
+from src.dto.UploadPdfResponse import FailedSection, UploadPdfResponse
+from src.services import jobs
+from src.services.ingest import StagedUpload
+from src.services.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobWorkerPool, SqliteJobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SqliteJobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def _staged(tmp_path) -> StagedUpload:
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    return StagedUpload(path=str(path), digest="d1", size=8, filename="report.pdf")
+
+
+def _job(job_id: str, status: str, updated_at: int) -> dict:
+    return {"jobID": job_id, "status": status, "updated_at": updated_at, "stages": {}, "sections": []}
+
+
+def test_subset_variant_reports_only_its_sections(store, tmp_path, monkeypatch):
+    async def analyse(staged, variant, progress):
+        return UploadPdfResponse(
+            property_valuations_s={}, risk_percentage_s={}, business_interruption_s={},
+            current_insurance_s={}, multi_currency_risk_s={}, insurance_recommendation_s={"a": {}},
+            failed_sections=[FailedSection(node="current_insurance", sections=["current_insurance_s"], error="x")],
+        )
+
+    monkeypatch.setattr(jobs, "analyse_document", analyse)
+    pool = JobWorkerPool(store)
+
+    async def scenario():
+        await store.create(_job("j1", QUEUED, int(time.time())))
+        await pool._run("j1", _staged(tmp_path), "coverage")
+        return await store.get("j1")
+
+    job = asyncio.run(scenario())
+    assert job["status"] == SUCCEEDED
+    assert job["sections"] == ["insurance_recommendation_s"]
+
+
+def test_job_is_failed_when_its_result_cannot_be_stored(store, tmp_path, monkeypatch):
+    async def analyse(staged, variant, progress):
+        return UploadPdfResponse(
+            property_valuations_s={}, risk_percentage_s={}, business_interruption_s={},
+            current_insurance_s={}, multi_currency_risk_s={}, insurance_recommendation_s={},
+        )
+
+    class OversizedResultStore(SqliteJobStore):
+        async def update(self, job_id, fields):
+            # like a dynamodb item above 400 KB
+            return False if "result" in fields else await super().update(job_id, fields)
+
+    monkeypatch.setattr(jobs, "analyse_document", analyse)
+    store = OversizedResultStore(str(tmp_path / "jobs.sqlite3"))
+
+    async def scenario():
+        await store.create(_job("j1", QUEUED, int(time.time())))
+        await JobWorkerPool(store)._run("j1", _staged(tmp_path), "full")
+        return await store.get("j1")
+
+    job = asyncio.run(scenario())
+    assert job["status"] == FAILED
+    assert "result could not be stored" in job["error"]
+    assert "result" not in job
+
+
+def test_staged_file_is_removed_when_the_status_update_fails(store, tmp_path):
+    class BrokenStore:
+        async def update(self, job_id, fields):
+            raise RuntimeError("db down")
+
+    staged = _staged(tmp_path)
+    with pytest.raises(RuntimeError):
+        asyncio.run(JobWorkerPool(BrokenStore())._run("j1", staged, "full"))
+    assert not (tmp_path / "report.pdf").exists()
+
+
+def test_stale_queued_and_running_jobs_are_failed_on_start(store, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_STALE_SECONDS", 600)
+    monkeypatch.setattr(settings, "JOB_WORKERS", 1)
+    now = int(time.time())
+
+    async def scenario():
+        await store.create(_job("old-running", RUNNING, now - 3600))
+        await store.create(_job("old-queued", QUEUED, now - 3600))
+        await store.create(_job("live", RUNNING, now - 10))
+        await store.create(_job("done", SUCCEEDED, now - 3600))
+        pool = JobWorkerPool(store)
+        pool.start()
+        await pool._recovery
+        await pool.stop()
+        return {job_id: (await store.get(job_id))["status"] for job_id in ("old-running", "old-queued", "live", "done")}
+
+    assert asyncio.run(scenario()) == {
+        "old-running": FAILED, "old-queued": FAILED, "live": RUNNING, "done": SUCCEEDED,
+    }
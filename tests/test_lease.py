@@ -0,0 +1,97 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.core.config import settings
+from src.services import pipeline
+
+LEASE_SECONDS = 0.06
+
+
+@pytest.fixture
+def leases(monkeypatch, exchange_rates):
+    """in-memory processingLease table with the conditions of the db helpers"""
+    table = {}
+
+    async def acquire(lease_id, owner, ttl_seconds):
+        lease = table.get(lease_id)
+        if lease is not None and lease["expires_at"] >= time.monotonic():
+            return False
+        table[lease_id] = {"owner": owner, "expires_at": time.monotonic() + ttl_seconds, "renewals": 0}
+        return True
+
+    async def renew(lease_id, owner, ttl_seconds):
+        lease = table.get(lease_id)
+        if lease is None or lease["owner"] != owner:
+            return False
+        lease["expires_at"] = time.monotonic() + ttl_seconds
+        lease["renewals"] += 1
+        return True
+
+    async def release(lease_id, owner):
+        if table.get(lease_id, {}).get("owner") == owner:
+            del table[lease_id]
+
+    monkeypatch.setattr(pipeline, "acquire_lease", acquire)
+    monkeypatch.setattr(pipeline, "renew_lease", renew)
+    monkeypatch.setattr(pipeline, "release_lease", release)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_LEASE_ENABLED", True)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_LEASE_SECONDS", LEASE_SECONDS)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_POLL_SECONDS", 0.01)
+    return table
+
+
+@pytest.fixture
+def analysis(monkeypatch):
+    """an analysis running five lease lifetimes, publishing its result to the cache"""
+    published, runs = {}, []
+
+    async def cached(digest, variant):
+        return published.get((digest, variant))
+
+    async def analyse(staged, variant, progress):
+        runs.append(staged.digest)
+        await asyncio.sleep(5 * LEASE_SECONDS)
+        published[(staged.digest, variant)] = f"result of {staged.digest}"
+        return published[(staged.digest, variant)]
+
+    monkeypatch.setattr(pipeline, "get_cached_response", cached)
+    monkeypatch.setattr(pipeline, "_analyse", analyse)
+    return runs
+
+
+def test_long_analysis_keeps_its_lease_and_runs_once_across_workers(leases, analysis):
+    staged = SimpleNamespace(digest="d1")
+
+    async def scenario():
+        # two workers, each with its own in-process single flight
+        first = asyncio.create_task(pipeline._analyse_with_lease(staged, "full", None))
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        second = asyncio.create_task(pipeline._analyse_with_lease(staged, "full", None))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == ["result of d1", "result of d1"]
+    assert analysis == ["d1"]
+    # released once done
+    assert leases == {}
+
+
+def test_heartbeat_stops_with_the_analysis(leases, analysis):
+    staged = SimpleNamespace(digest="d2")
+    renewals = []
+
+    async def scenario():
+        task = asyncio.create_task(pipeline._analyse_with_lease(staged, "full", None))
+        while not leases:
+            await asyncio.sleep(0)
+        lease = next(iter(leases.values()))
+        await task
+        renewals.append(lease["renewals"])
+        await asyncio.sleep(2 * LEASE_SECONDS)
+        renewals.append(lease["renewals"])
+
+    asyncio.run(scenario())
+    assert renewals[0] >= 3
+    assert renewals[1] == renewals[0]
@@ -0,0 +1,140 @@
+"""simulation of the governor in front of a fake rate limited provider"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from src.core.config import settings
+from src.services import rate_limit
+from src.services.llm import llm_registry
+from src.services.rate_limit import BATCH, INTERACTIVE, FileTokenBucket, governor, llm_priority
+
+RPM = 600  # 10 calls per second
+# the provider enforces the same limit as the governor, with enough slack that
+# event loop jitter between admission and the call is never counted as a breach
+PROVIDER_RPM = RPM * 1.2
+PROVIDER_BURST = 2
+
+
+class _RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__("429 too many requests")
+        self.response = type("Response", (), {"headers": {"retry-after": str(retry_after)}})()
+
+
+class FakeProvider:
+    """answers rpm requests per minute with a small burst, 429 beyond that"""
+
+    def __init__(self, rpm: int, burst: float = 1.5, latency: float = 0.01):
+        self.rate = rpm / 60
+        self.burst = burst
+        self.latency = latency
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.served: list[str] = []
+        self.rejected = 0
+
+    async def ainvoke(self, inputs: dict, config=None):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            self.rejected += 1
+            raise _RateLimitError(retry_after=(1 - self.tokens) / self.rate)
+        self.tokens -= 1
+        await asyncio.sleep(self.latency)
+        self.served.append(inputs["name"])
+        return inputs["name"]
+
+
+@pytest.fixture
+def limits(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RPM_LIMIT", RPM)
+    monkeypatch.setattr(settings, "LLM_TPM_LIMIT", 0)
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_RETRIES", 20)
+    monkeypatch.setattr(governor, "bucket", FileTokenBucket(str(tmp_path / "buckets.json")))
+    monkeypatch.setattr(governor, "_gates", {})
+    monkeypatch.setattr(governor, "_blocked_until", {})
+    monkeypatch.setattr(llm_registry, "_semaphores", {})
+    return tmp_path / "buckets.json"
+
+
+def _drain(path, model: str) -> None:
+    """start from an empty bucket, as after a burst, so the simulation runs at the refill rate"""
+    path.write_text(json.dumps({model: {"requests": 0, "updated": time.time()}}))
+
+
+async def _call(provider, name: str, model: str, priority: int = INTERACTIVE):
+    llm_priority.set(priority)
+    return await llm_registry.ainvoke(provider, {"name": name}, model=model)
+
+
+def test_governed_calls_stay_under_the_provider_limit(limits):
+    _drain(limits, "sim-governed")
+    provider = FakeProvider(PROVIDER_RPM, burst=PROVIDER_BURST)
+
+    async def scenario():
+        await asyncio.gather(*(_call(provider, f"c{i}", "sim-governed") for i in range(15)))
+
+    asyncio.run(scenario())
+    assert len(provider.served) == 15
+    assert provider.rejected == 0
+
+
+def test_ungoverned_calls_hit_the_limit_and_recover_by_retry_after(limits, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RPM_LIMIT", 0)
+    provider = FakeProvider(RPM)
+    to_thread = []
+    monkeypatch.setattr(rate_limit.asyncio, "to_thread", lambda *a, **k: to_thread.append(a))
+
+    async def scenario():
+        await asyncio.gather(*(_call(provider, f"c{i}", "sim-ungoverned") for i in range(15)))
+
+    asyncio.run(scenario())
+    assert len(provider.served) == 15
+    assert provider.rejected > 0
+    # limits off: the shared bucket file is never locked
+    assert to_thread == []
+    assert not limits.exists()
+
+
+def test_interactive_calls_overtake_queued_batch_calls(limits):
+    _drain(limits, "sim-priority")
+    provider = FakeProvider(PROVIDER_RPM, burst=PROVIDER_BURST)
+
+    async def scenario():
+        batch = [asyncio.create_task(_call(provider, f"batch{i}", "sim-priority", BATCH)) for i in range(10)]
+        await asyncio.sleep(0.15)
+        interactive = [asyncio.create_task(_call(provider, f"ui{i}", "sim-priority")) for i in range(3)]
+        await asyncio.gather(*batch, *interactive)
+
+    asyncio.run(scenario())
+    order = provider.served
+    last_interactive = max(order.index(f"ui{i}") for i in range(3))
+    # the interactive calls are served as soon as the bucket allows, ahead of the batch backlog
+    assert last_interactive < 7
+
+
+def test_node_timeout_does_not_count_time_queued_for_admission(limits, monkeypatch):
+    monkeypatch.setattr(settings, "NODE_TIMEOUT_SECONDS", 0.15)
+    _drain(limits, "sim-timeout")
+    provider = FakeProvider(RPM, burst=100)
+
+    async def scenario():
+        # ten calls through a 10/s bucket: the last one is admitted after ~1s, well past
+        # the timeout, yet each provider call itself is fast
+        return await asyncio.gather(*(_call(provider, f"c{i}", "sim-timeout") for i in range(10)))
+
+    assert len(asyncio.run(scenario())) == 10
+
+
+def test_slow_provider_call_times_out(limits, monkeypatch):
+    monkeypatch.setattr(settings, "NODE_TIMEOUT_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "LLM_RPM_LIMIT", 0)
+    provider = FakeProvider(RPM, burst=100, latency=1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(_call(provider, "slow", "sim-slow"))
@@ -0,0 +1,85 @@
+import asyncio
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+from src.core.aws import aws
+from src.core.config import settings
+from src.services import db
+
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self):
+        return self._data
+
+
+class _FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    async def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    async def get_object(self, Bucket, Key):
+        return {"Body": _Body(self.objects[Key])}
+
+
+class _FakeTable:
+    def __init__(self, fail_puts=False):
+        self.items = {}
+        self.fail_puts = fail_puts
+
+    async def put_item(self, Item):
+        if self.fail_puts:
+            raise ClientError(
+                {"Error": {"Code": "ValidationException", "Message": "Item size has exceeded the maximum"}},
+                "PutItem",
+            )
+        self.items[Item["textID"]] = dict(Item)
+        return {}
+
+    async def get_item(self, Key):
+        item = self.items.get(Key["textID"])
+        return {"Item": dict(item)} if item else {}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(aws, "s3", _FakeS3())
+    monkeypatch.setattr(aws, "parse_text_table", _FakeTable())
+    monkeypatch.setattr(settings, "PARSED_TEXT_INLINE_MAX_BYTES", 1024)
+    # cached_property, set it on the instance so ssm is never asked
+    monkeypatch.setitem(settings.__dict__, "S3_BUCKET", "bucket")
+    db.parsed_text_cache.pop("digest")
+    yield aws
+    db.parsed_text_cache.pop("digest")
+
+
+@pytest.mark.parametrize("text, attribute", [
+    ("short report", "parseText"),
+    ("a repetitive risk report " * 200, "parseTextZ"),
+    (os.urandom(4096).hex(), "parseTextS3Key"),
+], ids=["inline", "compressed", "s3"])
+def test_parsed_text_round_trips_whatever_its_size(store, text, attribute):
+    asyncio.run(db.put_parsed_text("digest", text))
+    assert set(store.parse_text_table.items["digest"]) == {"textID", attribute}
+
+    db.parsed_text_cache.pop("digest")
+    assert asyncio.run(db.get_parsed_text("digest")) == text
+
+
+def test_failed_parsed_text_write_does_not_fail_the_analysis(store):
+    store.parse_text_table.fail_puts = True
+    assert asyncio.run(db.put_parsed_text("digest", "ocr output")) is None
+    # the worker still serves the text it paid for
+    assert asyncio.run(db.get_parsed_text("digest")) == "ocr output"
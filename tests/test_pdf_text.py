@@ -0,0 +1,30 @@
+from src.services.pdf_text import score_page_text
+
+PROSE = (
+    "The stadium roof was inspected in March and the structural engineer reported "
+    "no defects that would affect the coming season."
+)
+
+
+def test_clean_prose_scores_high():
+    assert score_page_text(PROSE) > 0.9
+
+
+def test_missing_text_scores_by_images():
+    assert score_page_text("   ", has_images=True) == 0.0
+    assert score_page_text("", has_images=False) == 1.0
+
+
+def test_short_text_on_an_image_page_is_treated_as_scanned():
+    assert score_page_text("Page 12", has_images=True) == 0.0
+    assert score_page_text("Page 12", has_images=False) > 0.9
+
+
+def test_unmapped_glyphs_score_low():
+    garbage = " ".join(["(cid:12)(cid:7)"] * 20)
+    assert score_page_text(garbage) < 0.5
+
+
+def test_letter_spaced_text_scores_low():
+    spaced = " ".join(PROSE.replace(" ", ""))
+    assert score_page_text(spaced) < score_page_text(PROSE) - 0.5
@@ -0,0 +1,116 @@
+import pytest
+
+from src.core.config import settings
+from src.services import rate_limit
+from src.services.rate_limit import FileTokenBucket, _parse_duration, rate_limit_delay
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(settings, "LLM_RPM_LIMIT", 60)
+    monkeypatch.setattr(settings, "LLM_TPM_LIMIT", 6000)
+    return FileTokenBucket(str(tmp_path / "buckets.json"))
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("7.66s", 7.66),
+    ("1m30.5s", 90.5),
+    ("250ms", 0.25),
+    ("2h", 7200.0),
+    ("1m", 60.0),
+    ("1m250ms", 60.25),
+    (" 12s ", 12.0),
+])
+def test_parse_duration(value, seconds):
+    assert _parse_duration(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("value", ["", "soon", "12", "s"])
+def test_parse_duration_rejects_garbage(value):
+    assert _parse_duration(value) is None
+
+
+class _RateLimited(Exception):
+    def __init__(self, headers, status_code=429):
+        super().__init__("rate limited")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers})()
+
+
+def test_rate_limit_delay_prefers_retry_after():
+    error = _RateLimited({"retry-after": "3", "x-ratelimit-reset-tokens": "20s"})
+    assert rate_limit_delay(error) == 3.0
+
+
+def test_rate_limit_delay_takes_the_longest_reset():
+    error = _RateLimited({"x-ratelimit-reset-requests": "2s", "x-ratelimit-reset-tokens": "1m0.5s"})
+    assert rate_limit_delay(error) == pytest.approx(60.5)
+
+
+def test_rate_limit_delay_falls_back_and_ignores_other_errors(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_BACKOFF_SECONDS", 10)
+    assert rate_limit_delay(_RateLimited({})) == 10
+    assert rate_limit_delay(_RateLimited({}, status_code=500)) is None
+    assert rate_limit_delay(ValueError()) is None
+
+
+def test_full_bucket_admits_and_charges(bucket):
+    assert bucket.try_acquire("m", 1000) == 0.0
+    assert bucket.try_acquire("m", 4000) == 0.0
+    # 1000 tokens left, 500 more are refilled in 5 seconds at 6000/min
+    assert bucket.try_acquire("m", 1500) == pytest.approx(5.0)
+
+
+def test_bucket_refills_with_time(bucket, clock):
+    assert bucket.try_acquire("m", 6000) == 0.0
+    assert bucket.try_acquire("m", 3000) == pytest.approx(30.0)
+    clock.now += 30
+    assert bucket.try_acquire("m", 3000) == 0.0
+
+
+def test_refill_is_capped_at_the_limit(bucket, clock):
+    clock.now += 3600
+    assert bucket.try_acquire("m", 6000) == 0.0
+    assert bucket.try_acquire("m", 1) > 0
+
+
+def test_call_larger_than_the_bucket_waits_for_a_full_bucket(bucket, clock):
+    assert bucket.try_acquire("m", 3000) == 0.0
+    assert bucket.try_acquire("m", 9000) == pytest.approx(30.0)
+    clock.now += 30
+    assert bucket.try_acquire("m", 9000) == 0.0
+
+
+def test_requests_per_minute(bucket, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RPM_LIMIT", 2)
+    assert bucket.try_acquire("m", 1) == 0.0
+    assert bucket.try_acquire("m", 1) == 0.0
+    assert bucket.try_acquire("m", 1) == pytest.approx(30.0)
+
+
+def test_models_have_separate_buckets(bucket):
+    assert bucket.try_acquire("a", 6000) == 0.0
+    assert bucket.try_acquire("b", 6000) == 0.0
+
+
+def test_block_stops_admission_for_every_bucket_user(bucket, clock, tmp_path):
+    bucket.block("m", 12)
+    other_process = FileTokenBucket(bucket.path)
+    assert other_process.try_acquire("m", 1) == pytest.approx(12.0)
+    clock.now += 12
+    assert other_process.try_acquire("m", 1) == 0.0
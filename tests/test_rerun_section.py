@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from src.dto.UploadPdfResponse import UploadPdfResponse
+from src.services import pipeline, result_cache
+from src.services.result_cache import PARTIAL_PREFIX, get_cached_response, put_partial_response, result_cache_key
+
+SECTIONS = (
+    "property_valuations_s", "risk_percentage_s", "business_interruption_s",
+    "current_insurance_s", "multi_currency_risk_s", "insurance_recommendation_s",
+)
+
+
+@pytest.fixture
+def results(monkeypatch, exchange_rates):
+    """in-memory analysisResult table"""
+    table = {}
+
+    async def get(result_id):
+        return table.get(result_id)
+
+    async def put(result_id, text_id, result, ttl_seconds):
+        table[result_id] = result
+
+    async def delete(result_id):
+        table.pop(result_id, None)
+
+    monkeypatch.setattr(result_cache, "get_cached_result", get)
+    monkeypatch.setattr(result_cache, "put_cached_result", put)
+    monkeypatch.setattr(result_cache, "delete_cached_result", delete)
+    return table
+
+
+@pytest.fixture
+def document(monkeypatch):
+    async def parsed_text(digest):
+        return "report text" if digest == "d1" else None
+
+    async def convert(state):
+        return {"converted_text": state["input_text"]}
+
+    outcomes = {}
+
+    def node(name):
+        async def run(state):
+            outcome = outcomes[name]
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return run
+
+    monkeypatch.setattr(pipeline, "get_parsed_text", parsed_text)
+    monkeypatch.setattr(pipeline, "run_currency_conversion", convert)
+    monkeypatch.setattr(pipeline, "ANALYSIS_NODES", {n: node(n) for n in pipeline.ANALYSIS_NODES})
+    monkeypatch.setattr(pipeline.settings, "NODE_RETRIES", 0)
+    return outcomes
+
+
+def _degraded(*failed_nodes: str) -> UploadPdfResponse:
+    failed = [{"node": n, "sections": [f"{n}_s"], "error": "timed out"} for n in failed_nodes]
+    return UploadPdfResponse(
+        **{s: ({} if s[:-2] in failed_nodes else {"ok": {}}) for s in SECTIONS}, failed_sections=failed,
+    )
+
+
+def test_rerun_patches_the_partial_and_promotes_it_when_complete(results, document):
+    document["current_insurance"] = {"current_insurance_s": {"gap": {"quote": "no flood cover"}}}
+    document["multi_currency_risk"] = {"multi_currency_risk_s": {"fx": {}}}
+
+    async def scenario():
+        await put_partial_response("d1", _degraded("current_insurance", "multi_currency_risk"))
+
+        first = await pipeline.rerun_section("d1", "current_insurance")
+        assert await get_cached_response("d1") is None
+        second = await pipeline.rerun_section("d1", "multi_currency_risk")
+        return first, second, await get_cached_response("d1")
+
+    first, second, cached = asyncio.run(scenario())
+    assert [f.node for f in first.result.failed_sections] == ["multi_currency_risk"]
+    assert first.result.current_insurance_s == {"gap": {"quote": "no flood cover"}}
+    assert second.result.failed_sections == []
+    assert cached == second.result
+    assert cached.property_valuations_s == {"ok": {}}
+    assert PARTIAL_PREFIX + result_cache_key("d1") not in results
+
+
+def test_failed_rerun_keeps_the_partial(results, document):
+    document["current_insurance"] = RuntimeError("still down")
+
+    async def scenario():
+        await put_partial_response("d1", _degraded("current_insurance"))
+        return await pipeline.rerun_section("d1", "current_insurance")
+
+    rerun = asyncio.run(scenario())
+    assert [f.node for f in rerun.failed_sections] == ["current_insurance"]
+    assert [f.error for f in rerun.result.failed_sections] == ["still down"]
+    assert PARTIAL_PREFIX + result_cache_key("d1") in results
+    assert result_cache_key("d1") not in results
+
+
+def test_rerun_without_a_partial_only_returns_the_sections(results, document):
+    document["risk_percentage"] = {"risk_percentage_s": {"risks": []}}
+
+    rerun = asyncio.run(pipeline.rerun_section("d1", "risk_percentage"))
+    assert rerun.sections == {"risk_percentage_s": {"risks": []}}
+    assert rerun.result is None
+    assert results == {}
+
+
+@pytest.mark.parametrize("digest, node, variant", [
+    ("d1", "nope", "full"), ("d1", "risk_percentage", "nope"), ("missing", "risk_percentage", "full"),
+])
+def test_unknown_node_variant_or_document(results, document, digest, node, variant):
+    with pytest.raises(KeyError):
+        asyncio.run(pipeline.rerun_section(digest, node, variant))
@@ -0,0 +1,82 @@
+import pytest
+
+from src.core.config import settings
+from src.services import (
+    business_interruption, current_insurance, insurance_recommendation, multi_currency_risk,
+    property_valudation, risk_percentages,
+)
+from src.services.section_index import get_section_index, relevant_text
+from src.utils.tokens import estimate_tokens
+
+# passages each node has to see, as a full text run would
+EXPECTED = {
+    current_insurance: [
+        "The existing policy excludes flood damage to the training ground.",
+        "Coverage limits are insufficient for a full stadium rebuild.",
+    ],
+    business_interruption: [
+        "A closure of the stadium would cause lost revenue of 450,000 EUR per match.",
+        "Alternate venue costs during the disruption are estimated at 80,000 EUR per week.",
+    ],
+    risk_percentages: [
+        "There is a 15% probability of a pitch flood in any given year.",
+        "The likelihood of two such events per season is low, with a 2% chance annually.",
+    ],
+    property_valudation: [
+        "The replacement cost of the main stand infrastructure is 32,000,000 EUR.",
+        "The playing surface property valuation is 1,200,000 EUR based on historical data.",
+    ],
+    multi_currency_risk: [
+        "Sponsorship income is paid in USD and GBP, exposing the club to exchange rate fluctuation.",
+        "No foreign exchange hedge is in place for the currency exposure.",
+    ],
+    insurance_recommendation: [
+        "We recommend parametric cover with a higher limit on the indemnity period.",
+        "The club should bind the new coverage before the premium renewal timeline.",
+    ],
+}
+
+
+def _filler(n: int) -> str:
+    return (
+        f"The north stand holds {n * 131} seats and its concourse was repainted during spring. "
+        f"Stewards at gate {n} reported smooth entry and the catering kiosks opened early. "
+        "Ticket scanning ran without queues and the public address system was tested twice."
+    )
+
+
+@pytest.fixture
+def report(monkeypatch):
+    monkeypatch.setattr(settings, "RELEVANCE_FILTER_ENABLED", True)
+    monkeypatch.setattr(settings, "RELEVANCE_TOKEN_BUDGET", 400)
+    monkeypatch.setattr(settings, "RELEVANCE_PASSAGE_TOKENS", 150)
+    passages = [_filler(n) for n in range(120)]
+    for i, expected in enumerate(p for ps in EXPECTED.values() for p in ps):
+        passages.insert(7 + i * 9, expected)
+    return "\n\n".join(passages)
+
+
+@pytest.mark.parametrize("node", list(EXPECTED), ids=lambda m: m.__name__.rsplit(".", 1)[-1])
+def test_filtered_text_keeps_every_relevant_passage(report, node):
+    filtered = relevant_text(report, node.RELEVANCE_MARKERS, node.__name__)
+
+    recall = sum(p in filtered for p in EXPECTED[node]) / len(EXPECTED[node])
+    assert recall == 1.0
+    # an order of magnitude fewer prompt tokens than the full text
+    assert estimate_tokens(filtered) * 10 <= estimate_tokens(report)
+
+
+def test_index_is_built_once_per_text(report):
+    assert get_section_index(report) is get_section_index(report)
+
+
+def test_short_text_or_disabled_filter_sends_the_full_text(report, monkeypatch):
+    short = "The existing policy excludes flood damage."
+    assert relevant_text(short, current_insurance.RELEVANCE_MARKERS, "current_insurance") == short
+
+    monkeypatch.setattr(settings, "RELEVANCE_FILTER_ENABLED", False)
+    assert relevant_text(report, current_insurance.RELEVANCE_MARKERS, "current_insurance") == report
+
+
+def test_no_match_sends_the_full_text(report):
+    assert relevant_text(report, ("zeppelin",), "none") == report
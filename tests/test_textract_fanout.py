@@ -0,0 +1,13 @@
+from src.services.textract_fanout import page_ranges
+
+
+def test_page_ranges_groups_consecutive_pages():
+    assert page_ranges([7, 1, 2, 3, 5, 8], size=10) == [[1, 2, 3], [5], [7, 8]]
+
+
+def test_page_ranges_caps_the_range_size():
+    assert page_ranges(range(7), size=3) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_page_ranges_empty():
+    assert page_ranges([], size=3) == []
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from src.core.aws import aws
+from src.core.config import settings
+from src.services.textract_client import TextractNotificationListener
+
+
+class _FakeSQS:
+    def __init__(self):
+        self.deleted = []
+        self.released = []
+
+    async def delete_message(self, QueueUrl, ReceiptHandle):
+        self.deleted.append(ReceiptHandle)
+
+    async def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout):
+        self.released.append(ReceiptHandle)
+
+
+@pytest.fixture
+def sqs(monkeypatch):
+    fake = _FakeSQS()
+    monkeypatch.setattr(aws, "sqs", fake)
+    monkeypatch.setattr(settings, "TEXTRACT_SQS_QUEUE_URL", "https://sqs.example/queue")
+    monkeypatch.setattr(settings, "TEXTRACT_POLL_MAX_SECONDS", 15)
+    return fake
+
+
+def _message(handle: str, job_id: str, tag: str, age: float = 0.0) -> dict:
+    payload = {"JobId": job_id, "Status": "SUCCEEDED", "JobTag": tag}
+    return {
+        "ReceiptHandle": handle,
+        "Body": json.dumps({"Message": json.dumps(payload)}),
+        "Attributes": {"SentTimestamp": str(int((time.time() - age) * 1000))},
+    }
+
+
+def test_waiting_job_is_woken_and_its_message_deleted(sqs):
+    listener = TextractNotificationListener()
+
+    async def scenario():
+        waiter = asyncio.create_task(listener.wait("job-1", timeout=5))
+        await asyncio.sleep(0)
+        handled = await listener._dispatch(_message("h1", "job-1", listener.tag))
+        await asyncio.wait_for(waiter, 1)
+        return handled
+
+    assert asyncio.run(scenario()) is True
+    assert sqs.deleted == ["h1"]
+
+
+def test_late_notification_of_a_forgotten_job_is_deleted(sqs):
+    listener = TextractNotificationListener()
+    listener.forget("job-1")
+
+    assert asyncio.run(listener._dispatch(_message("h1", "job-1", "other-worker"))) is True
+    assert sqs.deleted == ["h1"]
+
+
+def test_own_job_without_a_waiter_is_deleted(sqs):
+    listener = TextractNotificationListener()
+
+    assert asyncio.run(listener._dispatch(_message("h1", "job-9", listener.tag))) is True
+    assert sqs.deleted == ["h1"]
+
+
+def test_fresh_message_of_another_worker_is_released(sqs):
+    listener = TextractNotificationListener()
+
+    assert asyncio.run(listener._dispatch(_message("h1", "job-2", "other-worker"))) is False
+    assert sqs.released == ["h1"]
+    assert sqs.deleted == []
+
+
+def test_stale_message_of_another_worker_is_deleted(sqs):
+    listener = TextractNotificationListener()
+
+    assert asyncio.run(listener._dispatch(_message("h1", "job-2", "other-worker", age=60))) is True
+    assert sqs.deleted == ["h1"]
+
+
+def test_remembered_jobs_are_bounded(sqs, monkeypatch):
+    from src.services import textract_client
+    monkeypatch.setattr(textract_client, "RECENT_JOBS", 3)
+    listener = TextractNotificationListener()
+    for i in range(5):
+        listener.forget(f"job-{i}")
+
+    assert list(listener._finished) == ["job-2", "job-3", "job-4"]